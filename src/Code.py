@@ -21,7 +21,28 @@ import pygame
 import subprocess
 import time
 import shutil
-from threading import Thread
+import sqlite3
+import struct
+import hashlib
+import zlib
+import zipfile
+import queue
+import bisect
+import heapq
+import math
+import functools
+import contextlib
+import collections
+import concurrent.futures
+import re
+import json
+import signal
+import errno
+import fcntl
+import selectors
+import ctypes
+import ctypes.util
+from threading import Thread, Lock, Event, get_native_id
 import sys
 import pyudev
 
@@ -32,6 +53,16 @@ ROM_DIR = "/home/ccjpmmGaming/Retroconsole/roms"
 SPLASH_IMAGE = "/home/ccjpmmGaming/Retroconsole/splash/logo.png"
 SPLASH_SOUND = "/home/ccjpmmGaming/Retroconsole/splash/sound.wav"
 EMULATOR_CMD = "/usr/games/mednafen"
+CATALOG_DB = "/home/ccjpmmGaming/Retroconsole/catalog.db"
+COVERS_DIR = "/home/ccjpmmGaming/Retroconsole/covers"
+
+# Mapeo de extensiones de ROM a consolas
+CONSOLE_MAP = {
+    '.gba': 'GBA',
+    '.nes': 'NES',
+    '.smc': 'SNES',
+    '.sfc': 'SNES'
+}
 
 # Paleta de colores para la interfaz
 COLOR_BG = (21, 67, 96)            # Color de fondo principal
@@ -45,6 +76,132 @@ COLOR_KEY_PRESSED = (100, 100, 100)# Teclas presionadas
 COLOR_SEARCH_BG = (30, 80, 110)    # Fondo de búsqueda
 COLOR_SEARCH_HIGHLIGHT = (100, 150, 200) # Resultados destacados
 
+# Extensiones de imagen soportadas para carátulas
+COVER_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp')
+
+# Miniaturas de carátulas: tamaños de los recuadros, carpeta en disco
+# (junto a las carátulas) y memoria máxima de la caché de superficies
+MENU_COVER_SIZE = (165, 150)
+SEARCH_COVER_SIZE = (200, 150)
+COVER_THUMBS_DIRNAME = ".thumbs"
+COVER_CACHE_BYTES = 16 * 1024 * 1024
+
+# Precarga de carátulas vecinas: hilos de trabajo y entradas por delante
+# (en la dirección de desplazamiento) y por detrás de la seleccionada
+COVER_PREFETCH_WORKERS = 2
+COVER_PREFETCH_AHEAD = 6
+COVER_PREFETCH_BEHIND = 2
+
+# Evento de pygame publicado cuando una carátula precargada está lista
+COVER_READY_EVENT = pygame.USEREVENT + 1
+
+# Eventos para despertar al bucle principal desde otros hilos
+UI_WAKE_EVENT = pygame.USEREVENT + 2        # Notificación USB o cambios en la biblioteca
+EMULATOR_EXIT_EVENT = pygame.USEREVENT + 3  # El proceso del emulador terminó
+
+# Bucle de eventos: rueda de temporizadores
+TIMER_WHEEL_RESOLUTION = 0.01  # Segundos por ranura de la rueda
+TIMER_WHEEL_SLOTS = 256        # Ranuras (una vuelta = 2.56 s)
+
+# Acciones lógicas producidas por el despachador de entrada
+INPUT_ACTION_EVENT = pygame.USEREVENT + 4
+ACTION_UP = 'up'
+ACTION_DOWN = 'down'
+ACTION_LEFT = 'left'
+ACTION_RIGHT = 'right'
+ACTION_ACCEPT = 'accept'                  # Botón A
+ACTION_BACK = 'back'                      # Botón B
+ACTION_ERASE = 'erase'                    # Botón X
+ACTION_SPACE = 'space'                    # Botón Y
+ACTION_START = 'start'                    # Botón START
+ACTION_SHUTDOWN_CHORD = 'shutdown_chord'  # SELECT+START
+
+BUTTON_SELECT = 6
+BUTTON_START = 7
+BUTTON_ACTIONS = {
+    0: ACTION_ACCEPT,
+    1: ACTION_BACK,
+    2: ACTION_ERASE,
+    3: ACTION_SPACE,
+    BUTTON_START: ACTION_START,
+}
+AXIS_DEADZONE = 0.6            # Desviación mínima del stick analógico
+
+# Repetición acelerada de direcciones mantenidas
+KEY_REPEAT_DELAY = 0.3         # Retardo antes de la primera repetición
+KEY_REPEAT_RATE = 0.1          # Intervalo inicial entre repeticiones
+KEY_REPEAT_MIN_RATE = 0.03     # Intervalo mínimo al acelerar
+KEY_REPEAT_ACCELERATION = 0.85 # Factor aplicado al intervalo en cada repetición
+KEY_REPEAT_STEP_AFTER = 2.0    # Segundos mantenidos antes de avanzar varios pasos
+KEY_REPEAT_MAX_STEP = 64       # Pasos máximos por repetición
+
+# Instrumentación de latencia entrada → pantalla
+LATENCY_REPORT_FILE = "/home/ccjpmmGaming/Retroconsole/latency.json"
+LATENCY_BUCKETS_MS = (2, 4, 8, 16, 33, 50, 100, 250, 500, 1000)  # Límites del histograma
+LATENCY_SAMPLES = 2048         # Muestras recientes por pantalla para los percentiles
+
+# Perfilador de cuadros: RETROCONSOLE_PROFILE=1 lo activa y =overlay además
+# dibuja en pantalla los FPS y las secciones más lentas
+PROFILE_MODE = os.environ.get("RETROCONSOLE_PROFILE", "")
+PROFILE_RING_SIZE = 512        # Duraciones recientes guardadas por sección
+PROFILE_OVERLAY_SECTIONS = 3   # Secciones más lentas mostradas en pantalla
+PROFILE_EXPORT_INTERVAL = 10.0 # Segundos entre exportaciones periódicas
+PROFILE_JSON_FILE = "/home/ccjpmmGaming/Retroconsole/profile.json"
+PROFILE_PROMETHEUS_FILE = "/var/lib/node_exporter/textfile_collector/retroconsole.prom"
+
+# Lanzamiento de juegos: el primer cuadro del emulador se detecta cuando
+# abre alguno de estos dispositivos (video o audio); tiempo máximo de
+# espera e intervalo entre revisiones de /proc/<pid>/fd (segundos)
+EMULATOR_FIRST_FRAME_DEVICES = ('/dev/dri/', '/dev/fb', '/dev/snd/pcm')
+EMULATOR_FIRST_FRAME_TIMEOUT = 10.0
+EMULATOR_PROBE_INTERVAL = 0.005
+
+# Precarga especulativa de ROMs en la caché de páginas: se inicia al pulsar
+# A y también cuando el cursor permanece sobre una ROM ROM_PREFETCH_DWELL
+# segundos (None desactiva la precarga por permanencia). Las ROMs más
+# grandes que ROM_PREFETCH_MAX_BYTES solo reciben posix_fadvise
+ROM_PREFETCH_DWELL = 0.6
+ROM_PREFETCH_CHUNK = 1024 * 1024
+ROM_PREFETCH_MAX_BYTES = 64 * 1024 * 1024
+
+# Perfiles de planificación mientras corre el emulador (ver
+# SchedulingProfile): núcleos y nice del emulador y de los hilos de este
+# programa (interfaz, copia desde USB, carátulas). None deja ese aspecto sin
+# cambios. Subir la prioridad del emulador requiere CAP_SYS_NICE, y un
+# ui_nice solo se puede deshacer al terminar el juego con CAP_SYS_NICE o
+# LimitNICE. RETROCONSOLE_SCHED=ninguno desactiva el perfil
+EMULATOR_SCHED_PROFILES = {
+    'dedicado': {'emulator_cpus': (1, 2, 3), 'emulator_nice': -5, 'ui_cpus': (0,), 'ui_nice': None},
+    'prioridad': {'emulator_cpus': None, 'emulator_nice': -5, 'ui_cpus': None, 'ui_nice': None},
+}
+EMULATOR_SCHED_PROFILE = os.environ.get("RETROCONSOLE_SCHED", "dedicado")
+
+# Vigilancia de emuladores colgados (ver EmulatorWatchdog): intervalo de
+# muestreo de /proc/<pid>/stat, segundos sin consumir CPU o en espera no
+# interrumpible antes de darlo por colgado, consumo de CPU (en núcleos)
+# sostenido y memoria que se consideran descontrol (None desactiva cada
+# límite), esperas tras terminate y tras kill, y registro de incidentes
+EMULATOR_WATCHDOG_INTERVAL = 1.0
+EMULATOR_STALL_SECONDS = 10.0
+EMULATOR_RUNAWAY_CPUS = 2.5
+EMULATOR_RUNAWAY_SECONDS = 30.0
+EMULATOR_MAX_RSS = 1536 * 1024 * 1024
+EMULATOR_TERMINATE_TIMEOUT = 2.0
+EMULATOR_KILL_TIMEOUT = 2.0
+EMULATOR_INCIDENT_LOG = "/home/ccjpmmGaming/Retroconsole/incidents.jsonl"
+
+# Grabación de sesiones del control: RETROCONSOLE_RECORD=archivo.jsonl
+SESSION_RECORD_FILE = os.environ.get("RETROCONSOLE_RECORD", "")
+
+# Número de coincidencias mostradas en vivo bajo el texto de búsqueda
+LIVE_RESULTS_LIMIT = 4
+
+# Búsqueda difusa: resultados máximos, presupuesto de tiempo (s) y puntuación mínima
+SEARCH_RESULTS_LIMIT = 100
+SEARCH_TIME_BUDGET = 0.05
+LIVE_SEARCH_TIME_BUDGET = 0.004
+FUZZY_MIN_SCORE = 0.9
+
 # Mapeo de imágenes de controles por extensión de ROM
 MAPPING_CONTROL_IMAGES = {
     '.gba': "/home/ccjpmmGaming/Retroconsole/splash/gba_controls.png",
@@ -53,7 +210,7 @@ MAPPING_CONTROL_IMAGES = {
     '.sfc': "/home/ccjpmmGaming/Retroconsole/splash/snes_controls.png"
 }
 
-# Configuración de directorios USB
+# Configuración de directorios USB (cada partición se monta en USB_MOUNT_DIR/<nodo>)
 USB_MOUNT_DIR = "/home/ccjpmmGaming/usb"
 USB_ROM_DIRS = {
     '.gba': '/home/ccjpmmGaming/Retroconsole/roms/GBA',
@@ -62,10 +219,56 @@ USB_ROM_DIRS = {
     '.sfc': '/home/ccjpmmGaming/Retroconsole/roms/SNES'
 }
 
+# Copia desde USB: archivos copiados en paralelo, tamaño de bloque, bloques
+# leídos por adelantado en cada archivo e intervalo mínimo entre avisos de
+# avance a la interfaz (segundos)
+USB_COPY_WORKERS = 2
+USB_COPY_CHUNK = 1024 * 1024
+USB_COPY_QUEUE_DEPTH = 4
+USB_PROGRESS_INTERVAL = 0.1
+
+# Búsqueda de ROMs en el USB: profundidad máxima de carpetas y máximo de
+# archivos revisados (incluye los miembros de los .zip)
+USB_SCAN_MAX_DEPTH = 8
+USB_SCAN_MAX_FILES = 20000
+
+# Copia desde USB con un juego en curso: si USB_IMPORT_DURING_GAME es True
+# la copia sigue en segundo plano con prioridad mínima de CPU y de E/S y
+# una velocidad máxima que se adapta a la espera por CPU del emulador
+# (bytes/s); si es False se cierra el juego como antes
+USB_IMPORT_DURING_GAME = True
+USB_BACKGROUND_NICE = 19
+USB_THROTTLE_START_RATE = 4 * 1024 * 1024
+USB_THROTTLE_MIN_RATE = 256 * 1024
+USB_THROTTLE_MAX_RATE = 64 * 1024 * 1024
+USB_THROTTLE_INTERVAL = 0.5    # Segundos entre ajustes de la velocidad
+USB_THROTTLE_MAX_WAIT = 0.02   # Fracción máxima de tiempo que el emulador espera por CPU
+
 # Estado global del emulador
 EMULATOR_RUNNING = False
 EMULATOR_PROCESS = None
 
+# Catálogo persistente de ROMs (se crea bajo demanda)
+ROM_CATALOG = None
+ROM_CATALOG_LOCK = Lock()
+
+# Vigilante de cambios en la biblioteca de ROMs
+LIBRARY_WATCHER = None
+
+# Mapa de carátulas por ROM (se crea bajo demanda)
+COVER_RESOLVER = None
+COVER_RESOLVER_LOCK = Lock()
+
+# Caché en memoria de miniaturas de carátulas y su precargador
+COVER_CACHE = None
+COVER_PREFETCHER = None
+
+# Precargador de ROMs en la caché de páginas (se crea bajo demanda)
+ROM_PREFETCHER = None
+
+# Marcador de carátula que aún se está cargando en segundo plano
+COVER_PENDING = object()
+
 # =============================================
 # CLASE PRINCIPAL DE ESTADO DEL JUEGO
 # =============================================
@@ -88,6 +291,8 @@ class GameState:
         self.search_text = ""               # Texto ingresado en búsqueda
         self.search_results = []            # Resultados de búsqueda
         self.search_selected = 0            # Índice seleccionado en resultados
+        self.live_query = None              # Texto de las coincidencias en vivo
+        self.live_results = []              # Coincidencias en vivo bajo el texto
         self.keyboard_selected = 0          # Tecla seleccionada en teclado virtual
         self.last_input_time = time.time()  # Última interacción del usuario
         self.keyboard_layout = [            # Distribución del teclado virtual
@@ -96,108 +301,1403 @@ class GameState:
             ['Z','X','C','V','B','N','M',"."],
             ['SPACE','DEL']
         ]
-        self.input_delay = 0.1      # Retardo inicial para repetición de teclas
-        self.repeat_delay = 0.3     # Retardo antes de repetir teclas
-        self.repeat_rate = 0.1      # Tasa de repetición de teclas
-        self.copied_files = {}      # Archivos copiados desde USB
-        self.show_copy_notification = False  # Mostrar notificación de copia
+        self.copy_summaries = queue.Queue()  # Copias desde USB pendientes de mostrar
+        self.library_changes = queue.Queue() # Cambios pendientes en la biblioteca
+
+# =============================================
+# CACHÉ DE FUENTES Y TEXTO RENDERIZADO
+# =============================================
+
+FONT_CACHE = {}                         # tamaño -> fuente
+TEXT_CACHE = collections.OrderedDict()  # (texto, tamaño, color) -> superficie
+TEXT_CACHE_SIZE = 512                   # Máximo de textos renderizados en caché
+
+def get_font(size):
+    """Retorna la fuente por defecto del tamaño indicado, creándola una sola vez."""
+    font = FONT_CACHE.get(size)
+    if font is None:
+        font = FONT_CACHE[size] = pygame.font.Font(None, size)
+    return font
+
+def render_text(text, size, color):
+    """
+    Retorna la superficie de un texto renderizado con antialiasing.
+    Los textos repetidos (títulos, controles, filas de la lista) se toman
+    de una caché LRU, por lo que dibujarlos solo cuesta un blit.
+    """
+    key = (text, size, color)
+    surface = TEXT_CACHE.get(key)
+    if surface is not None:
+        TEXT_CACHE.move_to_end(key)
+        return surface
+
+    surface = get_font(size).render(text, True, color)
+    try:
+        surface = surface.convert_alpha()
+    except pygame.error:
+        pass  # Sin modo de video activo: usar la superficie tal cual
+    TEXT_CACHE[key] = surface
+    if len(TEXT_CACHE) > TEXT_CACHE_SIZE:
+        TEXT_CACHE.popitem(last=False)
+    return surface
+
+# =============================================
+# RENDERIZADO RETENIDO CON RECTÁNGULOS SUCIOS
+# =============================================
+
+class RetainedRenderer:
+    """
+    Dibuja una pantalla en modo retenido.
+    Las partes estáticas (barras de título y de controles, textos fijos) se
+    componen una sola vez en una superficie de fondo. El resto se declara
+    en cada cuadro como regiones con una clave que describe su contenido;
+    solo las regiones cuya clave cambió (o que aparecen o desaparecen) se
+    vuelven a dibujar, respetando el orden en que se declaran, y end()
+    retorna únicamente los rectángulos modificados.
+    """
+    _owner = None   # Último renderizador que dibujó en la pantalla
+
+    def __init__(self, build_background):
+        self._build_background = build_background
+        self._background = None
+        self._screen = None
+        self._regions = collections.OrderedDict()   # nombre -> (rect, clave, dibujo)
+        self._frame = None
+        self._full_redraw = True
+
+    @classmethod
+    def invalidate_screen(cls):
+        """Indica que se dibujó en la pantalla fuera de un renderizador."""
+        cls._owner = None
+
+    def begin(self, screen):
+        """Inicia un cuadro; si la pantalla cambió se redibuja completa."""
+        if (screen is not self._screen or RetainedRenderer._owner is not self
+                or self._background is None):
+            if self._background is None or screen.get_size() != self._background.get_size():
+                self._background = self._build_background(screen.get_size())
+                try:
+                    self._background = self._background.convert()
+                except pygame.error:
+                    pass
+            self._screen = screen
+            self._full_redraw = True
+            RetainedRenderer._owner = self
+        self._frame = collections.OrderedDict()
+
+    def region(self, name, rect, key, draw, *args):
+        """
+        Declara una región del cuadro actual. draw(screen, *args) dibuja su
+        contenido, que debe quedar dentro de rect.
+        """
+        self._frame[name] = (pygame.Rect(rect), key, draw, args)
+
+    def end(self):
+        """Dibuja las regiones modificadas y retorna la lista de rectángulos sucios."""
+        screen = self._screen
+        if self._full_redraw:
+            dirty = [screen.get_rect()]
+        else:
+            dirty = []
+            for name, (rect, key, _, _) in self._frame.items():
+                previous = self._regions.get(name)
+                if previous is None or previous[0] != rect or previous[1] != key:
+                    dirty.append(rect)
+                    if previous is not None and previous[0] != rect:
+                        dirty.append(previous[0])
+            for name, previous in self._regions.items():
+                if name not in self._frame:
+                    dirty.append(previous[0])
+
+        # Restaurar el fondo y redibujar, en orden, las regiones que tocan cada rectángulo
+        for area in dirty:
+            screen.set_clip(area)
+            screen.blit(self._background, area, area)
+            for rect, _, draw, args in self._frame.values():
+                clip = area.clip(rect)
+                if clip.width and clip.height:
+                    screen.set_clip(clip)
+                    draw(screen, *args)
+        screen.set_clip(None)
+
+        self._regions = {name: (rect, key) for name, (rect, key, _, _) in self._frame.items()}
+        self._full_redraw = False
+        return dirty
+
+def build_bars_background(size, controls_title=None, controls=()):
+    """
+    Compone el fondo común de los menús: color de fondo, barra de título y
+    barra de controles con su título y textos fijos.
+    controls es una lista de (texto, color, (x, y)); con x None el texto se centra.
+    """
+    background = pygame.Surface(size)
+    background.fill(COLOR_BG)
+    
+    # Área de título
+    title_area = pygame.Rect(0, 0, 640, 60)
+    pygame.draw.rect(background, COLOR_SEARCH_BG, title_area)
+    pygame.draw.line(background, COLOR_HIGHLIGHT, (0, title_area.height), (640, title_area.height), 2)
+    
+    # Área de controles
+    controls_area = pygame.Rect(0, 400, 640, 80)
+    pygame.draw.rect(background, COLOR_SEARCH_BG, controls_area)
+    pygame.draw.line(background, COLOR_HIGHLIGHT, (0, controls_area.y), (640, controls_area.y), 2)
+    
+    if controls_title:
+        title = render_text(controls_title, 26, COLOR_HIGHLIGHT)
+        background.blit(title, (320 - title.get_width()//2, controls_area.y + 10))
+    for text, color, (x, y) in controls:
+        rendered = render_text(text, 26, color)
+        if x is None:
+            x = 320 - rendered.get_width()//2
+        background.blit(rendered, (x, y))
+    return background
+
+def blit_text(screen, text, size, color, pos):
+    """
+    Dibuja un texto (desde la caché) en la posición indicada.
+    Con x None el texto se centra horizontalmente en la pantalla.
+    """
+    rendered = render_text(text, size, color)
+    x, y = pos
+    if x is None:
+        x = 320 - rendered.get_width()//2
+    screen.blit(rendered, (x, y))
+
+def blit_centered_text(screen, text, size, color, center):
+    """Dibuja un texto (desde la caché) centrado en el punto indicado."""
+    rendered = render_text(text, size, color)
+    screen.blit(rendered, (center[0] - rendered.get_width()//2,
+                           center[1] - rendered.get_height()//2))
+
+# =============================================
+# BUCLE DE EVENTOS Y TEMPORIZADORES
+# =============================================
+
+class TimerWheel:
+    """
+    Rueda de temporizadores (hashed timing wheel) de resolución fija.
+    Programar y cancelar cuestan O(1); el bucle de eventos la consulta para
+    saber cuánto puede bloquearse esperando eventos sin perder un vencimiento.
+    """
+    def __init__(self, resolution=TIMER_WHEEL_RESOLUTION, slots=TIMER_WHEEL_SLOTS):
+        self.resolution = resolution
+        self._slots = [[] for _ in range(slots)]
+        self._tick = int(time.monotonic() / resolution)  # Último tick procesado
+        self._count = 0
+
+    def schedule(self, delay, callback):
+        """
+        Programa callback() para dentro de delay segundos.
+        Retorna el temporizador, que sirve para cancelarlo.
+        """
+        tick = max(self._tick + 1, math.ceil((time.monotonic() + delay) / self.resolution))
+        timer = [tick, callback]
+        self._slots[tick % len(self._slots)].append(timer)
+        self._count += 1
+        return timer
+
+    def cancel(self, timer):
+        """Cancela un temporizador pendiente (si ya venció no hace nada)."""
+        slot = self._slots[timer[0] % len(self._slots)]
+        try:
+            slot.remove(timer)
+            self._count -= 1
+        except ValueError:
+            pass
+
+    def timeout(self):
+        """Segundos hasta el próximo vencimiento, o None si no hay temporizadores."""
+        if not self._count:
+            return None
+        slots = len(self._slots)
+        for tick in range(self._tick + 1, self._tick + slots + 1):
+            if any(timer[0] == tick for timer in self._slots[tick % slots]):
+                break
+        else:
+            # Todos los temporizadores están a más de una vuelta
+            tick = min(timer[0] for slot in self._slots for timer in slot)
+        return max(0.0, tick * self.resolution - time.monotonic())
+
+    def advance(self):
+        """Dispara los temporizadores vencidos y retorna los valores no nulos que produzcan."""
+        now_tick = int(time.monotonic() / self.resolution)
+        slots = len(self._slots)
+        fired = []
+        for tick in range(max(self._tick + 1, now_tick - slots + 1), now_tick + 1):
+            slot = self._slots[tick % slots]
+            if slot and any(timer[0] <= now_tick for timer in slot):
+                fired.extend(timer for timer in slot if timer[0] <= now_tick)
+                slot[:] = [timer for timer in slot if timer[0] > now_tick]
+        self._tick = max(self._tick, now_tick)
+        self._count -= len(fired)
+        
+        results = []
+        for _, callback in sorted(fired, key=lambda timer: timer[0]):
+            result = callback()
+            if result is not None:
+                results.append(result)
+        return results
+
+class InputDispatcher:
+    """
+    Traduce los eventos crudos del control (D-Pad, stick analógico y
+    botones) a acciones lógicas (ACTION_*) publicadas como eventos
+    INPUT_ACTION_EVENT con los atributos action, repeat y steps.
+    Una dirección mantenida se repite con la rueda de temporizadores y se
+    acelera: el intervalo se reduce hasta KEY_REPEAT_MIN_RATE y, pasado
+    KEY_REPEAT_STEP_AFTER, cada repetición avanza cada vez más pasos.
+    Todas las pantallas consumen estas acciones, así que el ritmo de
+    desplazamiento es el mismo en cualquier lista.
+    """
+    def __init__(self, timers):
+        self.timers = timers
+        self._hat = None          # Dirección del D-Pad
+        self._axes = {}           # eje -> valor del stick analógico
+        self._direction = None    # Dirección efectiva en curso
+        self._held_buttons = set()
+        self._repeat = None       # Temporizador de la repetición en curso
+
+    def translate(self, event):
+        """Retorna la lista de acciones (eventos) que produce un evento crudo."""
+        if event.type == pygame.JOYHATMOTION:
+            self._hat = self._hat_direction(event.value)
+            return self._update_direction()
+        if event.type == pygame.JOYAXISMOTION:
+            if event.axis in (0, 1):
+                self._axes[event.axis] = event.value
+                return self._update_direction()
+            return []
+        if event.type == pygame.JOYBUTTONDOWN:
+            self._held_buttons.add(event.button)
+            if (event.button in (BUTTON_SELECT, BUTTON_START) and
+                    {BUTTON_SELECT, BUTTON_START} <= self._held_buttons):
+                return [self._action(ACTION_SHUTDOWN_CHORD)]
+            action = BUTTON_ACTIONS.get(event.button)
+            return [self._action(action)] if action else []
+        if event.type == pygame.JOYBUTTONUP:
+            self._held_buttons.discard(event.button)
+            return []
+        if event.type == pygame.JOYDEVICEREMOVED:
+            self.reset()
+        return []
+
+    def reset(self):
+        """Olvida direcciones y botones mantenidos y cancela la repetición."""
+        self._hat = None
+        self._axes.clear()
+        self._direction = None
+        self._held_buttons.clear()
+        self._cancel_repeat()
+
+    @staticmethod
+    def _hat_direction(value):
+        if value[1] == 1:
+            return ACTION_UP
+        if value[1] == -1:
+            return ACTION_DOWN
+        if value[0] == -1:
+            return ACTION_LEFT
+        if value[0] == 1:
+            return ACTION_RIGHT
+        return None
+
+    def _axis_direction(self):
+        x = self._axes.get(0, 0.0)
+        y = self._axes.get(1, 0.0)
+        if max(abs(x), abs(y)) < AXIS_DEADZONE:
+            return None
+        if abs(y) >= abs(x):
+            return ACTION_UP if y < 0 else ACTION_DOWN
+        return ACTION_LEFT if x < 0 else ACTION_RIGHT
+
+    def _update_direction(self):
+        direction = self._hat or self._axis_direction()
+        if direction == self._direction:
+            return []
+        self._direction = direction
+        self._cancel_repeat()
+        if direction is None:
+            return []
+        self._schedule_repeat(direction, time.monotonic(), KEY_REPEAT_DELAY, KEY_REPEAT_RATE)
+        return [self._action(direction)]
+
+    def _cancel_repeat(self):
+        if self._repeat is not None:
+            self.timers.cancel(self._repeat)
+            self._repeat = None
+
+    def _schedule_repeat(self, direction, pressed_at, delay, rate):
+        def fire():
+            held = time.monotonic() - pressed_at
+            steps = 1
+            if held > KEY_REPEAT_STEP_AFTER:
+                steps = min(KEY_REPEAT_MAX_STEP, 2 ** int(held - KEY_REPEAT_STEP_AFTER + 1))
+            next_rate = max(KEY_REPEAT_MIN_RATE, rate * KEY_REPEAT_ACCELERATION)
+            self._schedule_repeat(direction, pressed_at, rate, next_rate)
+            return self._action(direction, repeat=True, steps=steps)
+        self._repeat = self.timers.schedule(delay, fire)
+
+    @staticmethod
+    def _action(action, repeat=False, steps=1):
+        return pygame.event.Event(INPUT_ACTION_EVENT, action=action, repeat=repeat, steps=steps)
+
+class EventLoop:
+    """
+    Bucle de eventos central de la interfaz.
+    Bloquea en pygame.event.wait hasta que llega un evento o vence un
+    temporizador, de modo que sin actividad el proceso no se despierta.
+    Los eventos del control pasan por el despachador de entrada y las
+    pantallas reciben acciones lógicas (INPUT_ACTION_EVENT).
+    """
+    def __init__(self):
+        self.timers = TimerWheel()
+        self.input = InputDispatcher(self.timers)
+        self.recorder = None   # SessionRecorder activo, si se graba la sesión
+
+    def wait(self, timeout=None):
+        """
+        Espera al menos un evento (o timeout segundos) y retorna la lista de
+        eventos pendientes con las acciones de entrada ya traducidas,
+        incluidas las repeticiones vencidas.
+        """
+        delay = self.timers.timeout()
+        if timeout is not None:
+            delay = timeout if delay is None else min(delay, timeout)
+        
+        if delay is None:
+            first = pygame.event.wait()
+        else:
+            # Un timeout de 0 ms significa esperar indefinidamente
+            first = pygame.event.wait(max(1, math.ceil(delay * 1000)))
+        
+        arrival = time.monotonic()
+        raw_events = [] if first.type == pygame.NOEVENT else [first]
+        raw_events.extend(pygame.event.get())
+        if self.recorder is not None:
+            for event in raw_events:
+                self.recorder.record(event, arrival)
+        events = []
+        for event in raw_events:
+            events.append(event)
+            events.extend(self.input.translate(event))
+        events.extend(self.timers.advance())
+        
+        # Marcar la llegada de la entrada para medir su latencia hasta la pantalla
+        if any(event.type == INPUT_ACTION_EVENT for event in events):
+            INPUT_LATENCY.input_arrived(arrival)
+        return events
+
+    def reset(self):
+        """Descarta el estado de entrada (por ejemplo, al volver de otra pantalla)."""
+        self.input.reset()
+
+EVENT_LOOP = EventLoop()
+
+# Eventos crudos del control que se graban y reproducen
+SESSION_EVENT_TYPES = {
+    'JOYBUTTONDOWN': pygame.JOYBUTTONDOWN,
+    'JOYBUTTONUP': pygame.JOYBUTTONUP,
+    'JOYHATMOTION': pygame.JOYHATMOTION,
+    'JOYAXISMOTION': pygame.JOYAXISMOTION,
+    'JOYDEVICEADDED': pygame.JOYDEVICEADDED,
+    'JOYDEVICEREMOVED': pygame.JOYDEVICEREMOVED,
+}
+SESSION_EVENT_NAMES = {event_type: name for name, event_type in SESSION_EVENT_TYPES.items()}
+
+class SessionRecorder:
+    """
+    Graba los eventos crudos del control, uno por línea en JSON, con el
+    instante relativo al inicio de la grabación:
+    {"t": 1.25, "type": "JOYHATMOTION", "hat": 0, "value": [0, -1]}
+    """
+    def __init__(self, path):
+        self._file = open(path, 'w')
+        self._start = time.monotonic()
+
+    def record(self, event, timestamp):
+        name = SESSION_EVENT_NAMES.get(event.type)
+        if name is None:
+            return
+        entry = {'t': round(timestamp - self._start, 4), 'type': name}
+        for attribute in ('button', 'hat', 'axis'):
+            if hasattr(event, attribute):
+                entry[attribute] = getattr(event, attribute)
+        if hasattr(event, 'value'):
+            entry['value'] = list(event.value) if isinstance(event.value, tuple) else event.value
+        self._file.write(json.dumps(entry) + "\n")
+        self._file.flush()
+
+def load_session(path):
+    """Lee una sesión grabada y retorna sus entradas ordenadas por tiempo."""
+    with open(path) as session:
+        entries = [json.loads(line) for line in session if line.strip()]
+    return sorted(entries, key=lambda entry: entry['t'])
+
+def session_event(entry, joy=0):
+    """Construye el evento de pygame que corresponde a una entrada grabada."""
+    attributes = {key: value for key, value in entry.items() if key not in ('t', 'type')}
+    if entry['type'] == 'JOYHATMOTION':
+        attributes['value'] = tuple(attributes['value'])
+    if entry['type'] == 'JOYDEVICEADDED':
+        attributes.setdefault('device_index', joy)
+    else:
+        attributes.setdefault('instance_id', joy)
+        attributes.setdefault('joy', joy)
+    return pygame.event.Event(SESSION_EVENT_TYPES[entry['type']], **attributes)
+
+def start_session_recorder():
+    """Activa la grabación de la sesión si se pidió con RETROCONSOLE_RECORD."""
+    if not SESSION_RECORD_FILE:
+        return
+    try:
+        EVENT_LOOP.recorder = SessionRecorder(SESSION_RECORD_FILE)
+        print(f"Grabando la sesión del control en {SESSION_RECORD_FILE}")
+    except OSError as e:
+        print(f"No se pudo iniciar la grabación de la sesión: {e}")
+
+def post_event(event_type, **attributes):
+    """Publica un evento de pygame desde cualquier hilo."""
+    try:
+        pygame.event.post(pygame.event.Event(event_type, **attributes))
+    except pygame.error:
+        pass  # Sin sistema de video (por ejemplo, durante la emulación)
+
+class LatencyHistogram:
+    """
+    Histograma de latencias de una pantalla: conteos por intervalo
+    (LATENCY_BUCKETS_MS) y las muestras recientes para calcular percentiles.
+    """
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.samples = collections.deque(maxlen=LATENCY_SAMPLES)
+        self.total = 0
+        self.max_ms = 0.0
+
+    def add(self, latency_ms):
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS_MS, latency_ms)] += 1
+        self.samples.append(latency_ms)
+        self.total += 1
+        self.max_ms = max(self.max_ms, latency_ms)
+
+    def percentile(self, fraction):
+        """Percentil por rango más cercano sobre las muestras recientes."""
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, max(0, math.ceil(fraction * len(ordered)) - 1))]
+
+    def summary(self):
+        buckets = {f"<={bound}": count for bound, count in zip(LATENCY_BUCKETS_MS, self.counts)}
+        buckets[f">{LATENCY_BUCKETS_MS[-1]}"] = self.counts[-1]
+        return {
+            'count': self.total,
+            'p50_ms': self.percentile(0.50),
+            'p95_ms': self.percentile(0.95),
+            'p99_ms': self.percentile(0.99),
+            'max_ms': self.max_ms,
+            'buckets_ms': buckets,
+        }
+
+class InputLatencyTracker:
+    """
+    Mide la latencia entrada → pantalla.
+    El bucle de eventos marca cuándo llegó una acción del control y
+    present_frame() la cierra cuando el cuadro que la refleja pasa por
+    pygame.display.update, acumulando un histograma por pantalla.
+    La marca se toma al sacar el evento de la cola de SDL.
+    """
+    def __init__(self):
+        self._lock = Lock()
+        self._pending = None       # Llegada de la entrada más antigua sin mostrar
+        self._histograms = {}      # pantalla -> LatencyHistogram
+
+    def input_arrived(self, timestamp):
+        if self._pending is None:
+            self._pending = timestamp
+
+    def discard(self):
+        """Olvida la entrada pendiente (su efecto no es un cuadro de la interfaz)."""
+        self._pending = None
+
+    def frame_presented(self, screen_name, changed):
+        """Cierra la medición pendiente; si el cuadro no cambió, la entrada no tuvo efecto visible."""
+        if self._pending is None:
+            return
+        latency_ms = (time.monotonic() - self._pending) * 1000
+        self._pending = None
+        if changed:
+            with self._lock:
+                histogram = self._histograms.setdefault(screen_name, LatencyHistogram())
+                histogram.add(latency_ms)
+
+    def summary(self):
+        with self._lock:
+            return {name: histogram.summary() for name, histogram in self._histograms.items()}
+
+    def dump(self, path=None):
+        """Imprime los percentiles por pantalla y guarda el informe completo en JSON."""
+        summary = self.summary()
+        print("Latencia entrada → pantalla (ms):")
+        for name, stats in sorted(summary.items()):
+            print(f"  {name}: n={stats['count']} p50={stats['p50_ms']:.1f} "
+                  f"p95={stats['p95_ms']:.1f} p99={stats['p99_ms']:.1f} máx={stats['max_ms']:.1f}")
+        try:
+            with open(path or LATENCY_REPORT_FILE, 'w') as report:
+                json.dump(summary, report, indent=2)
+        except OSError as e:
+            print(f"Error al guardar el informe de latencia: {e}")
+        return summary
+
+INPUT_LATENCY = InputLatencyTracker()
+
+def present_frame(screen_name, dirty):
+    """
+    Envía a la pantalla los rectángulos modificados y registra la
+    latencia de la entrada que provocó el cuadro.
+    """
+    if PROFILER.enabled and dirty:
+        if PROFILER.overlay:
+            dirty = list(dirty) + [PROFILER.draw_overlay(pygame.display.get_surface())]
+        with PROFILER.section('display_update'):
+            pygame.display.update(dirty)
+        PROFILER.frame()
+    elif dirty:
+        pygame.display.update(dirty)
+    INPUT_LATENCY.frame_presented(screen_name, bool(dirty))
+    if dirty:
+        LAUNCH_TIMER.frame_presented()
+
+def start_latency_dump_listener():
+    """
+    Permite pedir el informe de latencia y el perfil con SIGUSR1 (kill -USR1 <pid>).
+    La señal se bloquea en todos los hilos y la atiende un hilo dedicado,
+    así el informe sale aunque el bucle principal esté bloqueado esperando
+    eventos. Debe llamarse antes de crear otros hilos.
+    """
+    signal.pthread_sigmask(signal.SIG_BLOCK, {signal.SIGUSR1})
+    
+    def listen():
+        while True:
+            signal.sigwait({signal.SIGUSR1})
+            dump_diagnostics()
+    Thread(target=listen, daemon=True).start()
+
+# =============================================
+# PERFILADOR DE CUADROS Y SECCIONES
+# =============================================
+
+class RingStats:
+    """Duraciones recientes de una sección en un búfer circular de tamaño fijo."""
+    __slots__ = ('values', 'index', 'count', 'total')
+
+    def __init__(self, size=PROFILE_RING_SIZE):
+        self.values = [0.0] * size
+        self.index = 0
+        self.count = 0      # Mediciones totales
+        self.total = 0.0    # Segundos acumulados
+
+    def add(self, seconds):
+        self.values[self.index] = seconds
+        self.index = (self.index + 1) % len(self.values)
+        self.count += 1
+        self.total += seconds
+
+    def summary(self):
+        recent = sorted(self.values[:min(self.count, len(self.values))])
+        if not recent:
+            return None
+        return {
+            'count': self.count,
+            'total_s': self.total,
+            'mean_ms': sum(recent) / len(recent) * 1000,
+            'p50_ms': recent[(len(recent) - 1) // 2] * 1000,
+            'p95_ms': recent[math.ceil(0.95 * len(recent)) - 1] * 1000,
+            'max_ms': recent[-1] * 1000,
+        }
+
+class FrameProfiler:
+    """
+    Perfilador ligero de la interfaz.
+    Mide secciones con nombre (reloj monotónico de alta resolución) y los
+    cuadros presentados, guardando estadísticas móviles en búferes
+    circulares. Exporta a JSON y al formato textfile de Prometheus.
+    Apagado, las funciones decoradas con @profiled quedan intactas y
+    section() retorna un contexto nulo compartido.
+    """
+    def __init__(self, mode):
+        self.enabled = mode in ('1', 'overlay')
+        self.overlay = mode == 'overlay'
+        self._lock = Lock()
+        self._sections = {}   # nombre -> RingStats
+        self._frames = collections.deque(maxlen=PROFILE_RING_SIZE)  # instantes de cuadros
+
+    def record(self, name, seconds):
+        with self._lock:
+            stats = self._sections.get(name)
+            if stats is None:
+                stats = self._sections[name] = RingStats()
+            stats.add(seconds)
+
+    @contextlib.contextmanager
+    def _timed(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def section(self, name):
+        """Contexto que mide un bloque como la sección name."""
+        return self._timed(name) if self.enabled else NULL_SECTION
+
+    def frame(self):
+        """Registra un cuadro presentado."""
+        self._frames.append(time.monotonic())
+
+    def fps(self):
+        """Cuadros presentados durante el último segundo."""
+        since = time.monotonic() - 1.0
+        return sum(1 for stamp in self._frames if stamp > since)
+
+    def snapshot(self):
+        with self._lock:
+            sections = {name: stats.summary() for name, stats in self._sections.items()}
+        return {'fps': self.fps(), 'sections': sections}
+
+    def draw_overlay(self, screen):
+        """Dibuja los FPS y las secciones más lentas (p95); retorna el rectángulo ocupado."""
+        snapshot = self.snapshot()
+        slowest = sorted(snapshot['sections'].items(), key=lambda item: item[1]['p95_ms'],
+                         reverse=True)[:PROFILE_OVERLAY_SECTIONS]
+        lines = [f"FPS {snapshot['fps']}"]
+        lines.extend(f"{name} {stats['p95_ms']:.1f} ms" for name, stats in slowest)
+        
+        rect = pygame.Rect(0, 0, 230, 16 * (PROFILE_OVERLAY_SECTIONS + 1) + 4)
+        screen.fill((0, 0, 0), rect)
+        for row, line in enumerate(lines):
+            blit_text(screen, line, 18, (255, 255, 0), (4, 2 + row * 16))
+        return rect
+
+    def export_json(self, path=None):
+        with open(path or PROFILE_JSON_FILE, 'w') as output:
+            json.dump(self.snapshot(), output, indent=2)
+
+    def export_prometheus(self, path=None):
+        """Escribe las métricas para el textfile collector (reemplazo atómico)."""
+        snapshot = self.snapshot()
+        lines = [
+            "# HELP retroconsole_section_seconds Duración de las secciones instrumentadas de la interfaz.",
+            "# TYPE retroconsole_section_seconds summary",
+        ]
+        for name, stats in sorted(snapshot['sections'].items()):
+            for quantile, key in (("0.5", 'p50_ms'), ("0.95", 'p95_ms')):
+                lines.append(f'retroconsole_section_seconds{{section="{name}",quantile="{quantile}"}} '
+                             f'{stats[key] / 1000:.6f}')
+            lines.append(f'retroconsole_section_seconds_sum{{section="{name}"}} {stats["total_s"]:.6f}')
+            lines.append(f'retroconsole_section_seconds_count{{section="{name}"}} {stats["count"]}')
+        lines.append("# HELP retroconsole_fps Cuadros presentados en el último segundo.")
+        lines.append("# TYPE retroconsole_fps gauge")
+        lines.append(f"retroconsole_fps {snapshot['fps']}")
+        
+        path = path or PROFILE_PROMETHEUS_FILE
+        temp_path = path + ".tmp"
+        with open(temp_path, 'w') as output:
+            output.write("\n".join(lines) + "\n")
+        os.replace(temp_path, path)
+
+    def export(self):
+        """Exporta JSON y Prometheus si el perfilador está activo."""
+        if not self.enabled:
+            return
+        for exporter in (self.export_json, self.export_prometheus):
+            try:
+                exporter()
+            except OSError as e:
+                print(f"Error al exportar el perfil: {e}")
+
+NULL_SECTION = contextlib.nullcontext()
+PROFILER = FrameProfiler(PROFILE_MODE)
+
+def profiled(name):
+    """
+    Decorador que mide cada llamada como la sección name.
+    Con el perfilador apagado retorna la función original (sin costo).
+    """
+    def decorate(func):
+        if not PROFILER.enabled:
+            return func
+        
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                PROFILER.record(name, time.perf_counter() - start)
+        return wrapper
+    return decorate
+
+def start_profile_exporter():
+    """Programa la exportación periódica del perfil en la rueda de temporizadores."""
+    if not PROFILER.enabled:
+        return
+    
+    def export():
+        PROFILER.export()
+        EVENT_LOOP.timers.schedule(PROFILE_EXPORT_INTERVAL, export)
+    EVENT_LOOP.timers.schedule(PROFILE_EXPORT_INTERVAL, export)
+
+def dump_diagnostics():
+    """Vuelca el informe de latencia, los tiempos de lanzamiento y el perfil de cuadros."""
+    INPUT_LATENCY.dump()
+    LAUNCH_TIMER.dump()
+    PROFILER.export()
 
 # =============================================
 # SECCIÓN 1: GESTIÓN DE USB Y CONTROLES
 # =============================================
 
-def check_existing_usb():
+def usb_partition(device):
     """
-    Verifica si hay un USB conectado al iniciar el sistema.
-    Retorna True si se encuentra y monta correctamente.
+    Retorna (nodo, sistema de archivos) si el dispositivo de udev es una
+    partición USB con un sistema de archivos (o una memoria formateada sin
+    tabla de particiones); en otro caso retorna None.
     """
+    if device.get('ID_BUS') != 'usb' or device.get('ID_FS_USAGE') != 'filesystem':
+        return None
+    if not device.device_node:
+        return None
+    return device.device_node, device.get('ID_FS_TYPE')
+
+def find_mount_point(device_node):
+    """Retorna dónde está montado device_node según /proc/self/mounts, o None."""
     try:
-        return check_and_mount_usb()
-    except Exception as e:
-        print(f"Error al verificar USB existente: {e}")
-        return False
+        with open('/proc/self/mounts') as mounts:
+            for line in mounts:
+                fields = line.split()
+                if len(fields) > 1 and fields[0] == device_node:
+                    return fields[1].replace('\\040', ' ')
+    except OSError as e:
+        print(f"Error al leer los puntos de montaje: {e}")
+    return None
 
-def check_and_mount_usb():
+def mount_usb_partition(device_node, fs_type):
     """
-    Verifica y monta un dispositivo USB en el directorio especificado.
-    Retorna True si se montó correctamente.
+    Monta la partición device_node (con sistema de archivos fs_type) en su
+    propio directorio dentro de USB_MOUNT_DIR. Si ya estaba montada se
+    usa ese punto de montaje.
+    Retorna (punto de montaje, True si esta función lo montó) o (None, False).
     """
+    mounted_at = find_mount_point(device_node)
+    if mounted_at:
+        return mounted_at, False
+    
+    mount_point = os.path.join(USB_MOUNT_DIR, os.path.basename(device_node))
     try:
-        # Verificar si ya está montado
-        if os.path.ismount(USB_MOUNT_DIR):
-            return True
-            
         # Crear directorio de montaje si no existe
-        if not os.path.exists(USB_MOUNT_DIR):
-            os.makedirs(USB_MOUNT_DIR)
-            
-        # Intentar montar dispositivos comunes
-        for device in ['/dev/sda1', '/dev/sdb1', '/dev/sdc1']:
-            if os.path.exists(device):
-                subprocess.run(['sudo', 'mount', device, USB_MOUNT_DIR], check=True)
-                print(f"Dispositivo USB montado en {USB_MOUNT_DIR}")
-                return True
-                
+        if not os.path.exists(mount_point):
+            os.makedirs(mount_point)
+        
+        command = ['sudo', 'mount']
+        if fs_type:
+            command += ['-t', fs_type]
+        subprocess.run(command + [device_node, mount_point], check=True)
+        print(f"Dispositivo USB {device_node} ({fs_type}) montado en {mount_point}")
+        return mount_point, True
     except Exception as e:
-        print(f"Error al montar USB: {e}")
-    return False
+        print(f"Error al montar {device_node}: {e}")
+        with contextlib.suppress(OSError):
+            os.rmdir(mount_point)
+        return None, False
 
-def unmount_usb():
-    """Desmonta el dispositivo USB de forma segura."""
+def unmount_usb(mount_point, lazy=False):
+    """
+    Desmonta el dispositivo USB de forma segura y borra su directorio.
+    Con lazy se desmonta aunque esté en uso (la memoria ya se retiró).
+    Si el directorio ya no existe (se desmontó al retirar la memoria) no
+    hace nada.
+    """
+    if not os.path.isdir(mount_point):
+        return
     try:
-        if os.path.ismount(USB_MOUNT_DIR):
-            subprocess.run(['sudo', 'umount', USB_MOUNT_DIR], check=True)
-            print("Dispositivo USB desmontado")
+        if os.path.ismount(mount_point):
+            subprocess.run(['sudo', 'umount'] + (['-l'] if lazy else []) + [mount_point], check=True)
+            print(f"Dispositivo USB desmontado de {mount_point}")
+        with contextlib.suppress(FileNotFoundError):
+            os.rmdir(mount_point)
     except Exception as e:
         print(f"Error al desmontar USB: {e}")
 
-def copy_roms_from_usb():
+class CopyProgress:
+    """
+    Avance de la copia desde USB, compartido entre los hilos de copia y la
+    interfaz. Los hilos suman bytes por archivo y la interfaz toma
+    instantáneas; los avisos al bucle de eventos se limitan a uno cada
+    USB_PROGRESS_INTERVAL segundos.
+    """
+    def __init__(self):
+        self._lock = Lock()
+        self.active = False
+        self._copies = 0        # Copias en curso (una por memoria)
+        self._files = {}        # clave -> [bytes copiados, tamaño, nombre]
+        self._files_done = 0
+        self._bytes_done = 0
+        self._bytes_total = 0
+        self._current = None    # Clave del último archivo que avanzó
+        self._started = 0.0
+        self._last_notice = 0.0
+
+    def start(self, files):
+        """
+        Inicia una copia de files, lista de (clave, nombre, tamaño); la clave
+        (la ruta que se escribe) identifica al archivo aunque otro tenga el
+        mismo nombre. Si ya hay otra copia en curso (otra memoria) sus
+        archivos se suman al mismo avance.
+        """
+        with self._lock:
+            if not self._copies:
+                self._files = {}
+                self._files_done = 0
+                self._bytes_done = 0
+                self._bytes_total = 0
+                self._current = None
+                self._started = time.monotonic()
+            self._copies += 1
+            self._files.update((key, [0, size, name]) for key, name, size in files)
+            self._bytes_total += sum(size for _, _, size in files)
+            self.active = True
+        self._notice(force=True)
+
+    def advance(self, key, count):
+        """Suma count bytes copiados del archivo key."""
+        with self._lock:
+            self._files[key][0] += count
+            self._bytes_done += count
+            self._current = key
+        self._notice()
+
+    def file_done(self, key):
+        with self._lock:
+            self._files_done += 1
+        self._notice()
+
+    def finish(self):
+        with self._lock:
+            self._copies -= 1
+            self.active = self._copies > 0
+        self._notice(force=True)
+
+    def snapshot(self):
+        """Retorna el avance actual o None si no hay copia en curso."""
+        with self._lock:
+            if not self.active:
+                return None
+            elapsed = time.monotonic() - self._started
+            current_done, current_size, current = self._files.get(self._current, (0, 0, None))
+            return {
+                'files_done': self._files_done,
+                'files_total': len(self._files),
+                'bytes_done': self._bytes_done,
+                'bytes_total': self._bytes_total,
+                'current': current,
+                'current_done': current_done,
+                'current_size': current_size,
+                'rate': self._bytes_done / elapsed if elapsed > 0 else 0.0,
+            }
+
+    def _notice(self, force=False):
+        """Despierta a la interfaz para que redibuje el avance (no durante un juego)."""
+        if EMULATOR_RUNNING and not force:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if not force and now - self._last_notice < USB_PROGRESS_INTERVAL:
+                return
+            self._last_notice = now
+        post_event(UI_WAKE_EVENT)
+
+COPY_PROGRESS = CopyProgress()
+
+def process_cpu_wait(pid):
+    """
+    Retorna el tiempo total (s) que los hilos del proceso pid esperaron por
+    CPU en la cola del planificador, según /proc/<pid>/task/*/schedstat,
+    o None si no está disponible.
+    """
+    total = 0
+    try:
+        tasks = os.listdir(f"/proc/{pid}/task")
+    except OSError:
+        return None
+    for tid in tasks:
+        try:
+            with open(f"/proc/{pid}/task/{tid}/schedstat") as schedstat:
+                total += int(schedstat.read().split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+    return total / 1e9
+
+class ImportThrottle:
+    """
+    Limita la velocidad de la copia desde USB mientras el emulador corre.
+    Cada USB_THROTTLE_INTERVAL segundos mide qué fracción del tiempo
+    esperaron por CPU los hilos del emulador: si supera
+    USB_THROTTLE_MAX_WAIT la velocidad se reduce a la mitad y si no crece
+    un 25 %. Cuando el juego termina la copia sigue sin límite.
+    """
+    def __init__(self, process):
+        self._process = process
+        self._lock = Lock()
+        self.rate = USB_THROTTLE_START_RATE
+        self.slowdowns = 0
+        self._ready_at = time.monotonic()   # Instante en que se puede seguir copiando
+        self._next_adjust = 0.0
+        self._sample = None                 # (instante, espera acumulada del emulador)
+
+    def active(self):
+        return EMULATOR_RUNNING and self._process.poll() is None
+
+    def consume(self, count):
+        """Descuenta count bytes copiados y duerme lo necesario para respetar el límite."""
+        if not self.active():
+            return
+        with self._lock:
+            now = time.monotonic()
+            if now >= self._next_adjust:
+                self._adjust(now)
+            self._ready_at = max(self._ready_at, now) + count / self.rate
+            delay = self._ready_at - now
+        if delay > 0:
+            time.sleep(delay)
+
+    def _adjust(self, now):
+        self._next_adjust = now + USB_THROTTLE_INTERVAL
+        waited = process_cpu_wait(self._process.pid)
+        if waited is None:
+            return
+        if self._sample is not None:
+            elapsed = now - self._sample[0]
+            if elapsed > 0 and (waited - self._sample[1]) / elapsed > USB_THROTTLE_MAX_WAIT:
+                self.rate = max(USB_THROTTLE_MIN_RATE, self.rate / 2)
+                self.slowdowns += 1
+            else:
+                self.rate = min(USB_THROTTLE_MAX_RATE, self.rate * 1.25)
+        self._sample = (now, waited)
+
+# Número de la llamada al sistema ioprio_set por arquitectura
+IOPRIO_SET_SYSCALLS = {'x86_64': 251, 'i686': 289, 'aarch64': 30, 'armv7l': 314, 'armv6l': 314}
+IOPRIO_CLASS_IDLE = 3
+IOPRIO_WHO_PROCESS = 1
+
+def lower_thread_priority():
+    """
+    Baja al mínimo la prioridad de CPU (nice) y de E/S (clase idle) del
+    hilo actual; los hilos que cree después la heredan.
+    """
+    tid = get_native_id()
+    try:
+        os.setpriority(os.PRIO_PROCESS, tid, USB_BACKGROUND_NICE)
+    except OSError as e:
+        print(f"No se pudo bajar la prioridad de CPU de la copia: {e}")
+    
+    syscall = IOPRIO_SET_SYSCALLS.get(os.uname().machine)
+    if syscall is None:
+        return
+    libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+    if libc.syscall(syscall, IOPRIO_WHO_PROCESS, tid, IOPRIO_CLASS_IDLE << 13) != 0:
+        print(f"No se pudo bajar la prioridad de E/S de la copia: {os.strerror(ctypes.get_errno())}")
+
+def copy_file_chunked(rom, dest_path, progress, throttle=None):
+    """
+    Copia la ROM del USB (UsbRom) en dest_path por bloques de USB_COPY_CHUNK
+    bytes; los miembros de un .zip se descomprimen al vuelo.
+    Un hilo lee del USB por adelantado (hasta USB_COPY_QUEUE_DEPTH bloques)
+    mientras este escribe en la tarjeta SD, de modo que lecturas y
+    escrituras se solapan. Los búferes se reutilizan en anillo y no se
+    hace fsync aquí: copy_roms_from_usb los agrupa al final.
+    Con throttle (ImportThrottle) la escritura respeta su velocidad máxima.
+    Retorna el hash (crc32, sha1) del contenido, calculado al escribir.
+    """
+    buffers = [bytearray(USB_COPY_CHUNK) for _ in range(USB_COPY_QUEUE_DEPTH + 2)]
+    chunks = queue.Queue(maxsize=USB_COPY_QUEUE_DEPTH)
+    stop = Event()
+
+    def read_chunks():
+        try:
+            with rom.open() as source:
+                index = 0
+                while not stop.is_set():
+                    buffer = buffers[index % len(buffers)]
+                    count = source.readinto(buffer)
+                    if not count:
+                        break
+                    chunks.put(memoryview(buffer)[:count])
+                    index += 1
+        except (OSError, zipfile.BadZipFile, zlib.error) as e:
+            chunks.put(e)
+        finally:
+            chunks.put(None)
+
+    reader = Thread(target=read_chunks, daemon=True)
+    reader.start()
+    chunk = b''
+    crc32 = 0
+    sha1 = hashlib.sha1()
+    try:
+        with open(dest_path, 'wb') as dest:
+            while True:
+                chunk = chunks.get()
+                if chunk is None:
+                    break
+                if isinstance(chunk, Exception):
+                    raise chunk
+                dest.write(chunk)
+                crc32 = zlib.crc32(chunk, crc32)
+                sha1.update(chunk)
+                progress.advance(dest_path, len(chunk))
+                if throttle is not None:
+                    throttle.consume(len(chunk))
+        rom.copy_times(dest_path)
+        return crc32, sha1.hexdigest()
+    finally:
+        # Ante un error, vaciar la cola para que el lector termine
+        stop.set()
+        while chunk is not None:
+            chunk = chunks.get()
+        reader.join()
+
+def sync_copied_files(copies):
+    """
+    Hace fsync de los archivos copiados, los mueve a su nombre definitivo
+    y hace fsync de cada directorio de destino una sola vez.
+    copies es una lista de (ruta temporal, ruta final).
+    Retorna las rutas finales que quedaron en disco.
+    """
+    synced = []
+    for temp_path, dest_path in copies:
+        try:
+            fd = os.open(temp_path, os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+            os.replace(temp_path, dest_path)
+            synced.append(dest_path)
+        except OSError as e:
+            print(f"Error al guardar {dest_path}: {e}")
+            with contextlib.suppress(OSError):
+                os.remove(temp_path)
+
+    for directory in {os.path.dirname(path) for path in synced}:
+        try:
+            fd = os.open(directory, os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+        except OSError as e:
+            print(f"Error al sincronizar {directory}: {e}")
+    return synced
+
+def hash_file(path):
+    """
+    Calcula el CRC32 y el SHA-1 del contenido de un archivo.
+    Retorna (crc32, sha1 en hexadecimal).
+    """
+    with open(path, 'rb', buffering=0) as source:
+        return hash_stream(source)
+
+def hash_stream(source):
+    """
+    Calcula el CRC32 y el SHA-1 de un archivo abierto.
+    Lee por bloques de USB_COPY_CHUNK bytes con un único búfer, así que la
+    memoria usada no depende del tamaño de la ROM.
+    """
+    crc32 = 0
+    sha1 = hashlib.sha1()
+    buffer = bytearray(USB_COPY_CHUNK)
+    view = memoryview(buffer)
+    while True:
+        count = source.readinto(buffer)
+        if not count:
+            break
+        crc32 = zlib.crc32(view[:count], crc32)
+        sha1.update(view[:count])
+    return crc32, sha1.hexdigest()
+
+class UsbRom:
+    """
+    ROM encontrada en el USB: un archivo suelto o un miembro de un .zip
+    (archive es la ruta del .zip y member el nombre dentro de él).
+    """
+    def __init__(self, ext, name, size, mtime, path, member=None):
+        self.ext = ext          # Extensión de USB_ROM_DIRS que le corresponde
+        self.name = name        # Nombre con el que se copia
+        self.size = size
+        self.mtime = mtime
+        self.path = path
+        self.member = member
+
+    @property
+    def archive(self):
+        return self.path if self.member is not None else None
+
+    def label(self):
+        """Descripción legible del origen."""
+        if self.member is None:
+            return self.path
+        return f"{self.path}:{self.member}"
+
+    def open(self):
+        """Abre el contenido para lectura; los miembros se leen del .zip sin extraerlos."""
+        if self.member is None:
+            return open(self.path, 'rb', buffering=0)
+        # El miembro abierto mantiene el archivo del .zip hasta que se cierra
+        with zipfile.ZipFile(self.path) as archive:
+            return archive.open(self.member)
+
+    def hash(self):
+        with self.open() as source:
+            return hash_stream(source)
+
+    def copy_times(self, dest_path):
+        """Copia al destino la fecha de modificación (y permisos de los archivos sueltos)."""
+        if self.member is None:
+            shutil.copystat(self.path, dest_path)
+        else:
+            os.utime(dest_path, (self.mtime, self.mtime))
+
+def usb_rom_extension(filename):
+    """Retorna la extensión de USB_ROM_DIRS que corresponde a filename, o None."""
+    lower = filename.lower()
+    for ext in USB_ROM_DIRS.keys():
+        if lower.endswith(ext):
+            return ext
+    return None
+
+def scan_usb_roms(root=None, max_depth=USB_SCAN_MAX_DEPTH, max_files=USB_SCAN_MAX_FILES):
+    """
+    Recorre el USB con os.scandir buscando ROMs en todas las carpetas (hasta
+    max_depth niveles) y dentro de los archivos .zip, cuyo contenido se
+    lista leyendo solo el directorio central. Deja de buscar al revisar
+    max_files archivos. Las carpetas ocultas se ignoran.
+    Retorna la lista de UsbRom encontradas.
+    """
+    roms = []
+    examined = 0
+    skipped_7z = 0
+    pending = [(root or USB_MOUNT_DIR, 0)]
+    while pending:
+        path, depth = pending.pop()
+        try:
+            with os.scandir(path) as entries:
+                entries = sorted(entries, key=lambda entry: entry.name)
+        except OSError as e:
+            print(f"Error al listar {path}: {e}")
+            continue
+        
+        subdirs = []
+        for entry in entries:
+            if entry.name.startswith('.') or entry.name == "System Volume Information":
+                continue
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if depth < max_depth:
+                        subdirs.append((entry.path, depth + 1))
+                    continue
+                if not entry.is_file():
+                    continue
+                
+                examined += 1
+                if examined > max_files:
+                    print(f"Búsqueda en el USB detenida tras {max_files} archivos")
+                    return roms
+                
+                lower = entry.name.lower()
+                ext = usb_rom_extension(entry.name)
+                if ext:
+                    st = entry.stat()
+                    roms.append(UsbRom(ext, entry.name, st.st_size, st.st_mtime, entry.path))
+                elif lower.endswith('.zip'):
+                    with zipfile.ZipFile(entry.path) as archive:
+                        members = archive.infolist()
+                    for info in members:
+                        if info.is_dir():
+                            continue
+                        examined += 1
+                        if examined > max_files:
+                            print(f"Búsqueda en el USB detenida tras {max_files} archivos")
+                            return roms
+                        name = os.path.basename(info.filename)
+                        ext = usb_rom_extension(name)
+                        if not ext:
+                            continue
+                        mtime = time.mktime(info.date_time + (0, 0, -1))
+                        roms.append(UsbRom(ext, name, info.file_size, mtime, entry.path, info.filename))
+                elif lower.endswith('.7z'):
+                    skipped_7z += 1
+            except (OSError, zipfile.BadZipFile) as e:
+                print(f"Error al revisar {entry.path}: {e}")
+        
+        # Visitar las subcarpetas en orden alfabético
+        pending.extend(reversed(subdirs))
+    
+    if skipped_7z:
+        print(f"Se ignoraron {skipped_7z} archivos .7z (formato no soportado)")
+    return roms
+
+# Destinos que están copiando las memorias conectadas
+USB_COPY_CLAIMS = set()
+USB_COPY_CLAIMS_LOCK = Lock()
+
+@profiled('copy_roms_from_usb')
+def copy_roms_from_usb(throttle=None, root=None):
     """
     Copia ROMs desde el USB a los directorios correspondientes según su extensión.
+    Busca en todas las carpetas del USB y dentro de los archivos .zip
+    (scan_usb_roms); los miembros de los .zip se descomprimen directo al
+    destino, sin archivos intermedios.
+    Copia varios archivos a la vez (USB_COPY_WORKERS) por bloques grandes,
+    publica el avance en COPY_PROGRESS y agrupa los fsync al final.
+    Omite las ROMs cuyo contenido ya está en la biblioteca (o repetido en
+    el mismo USB) aunque tengan otro nombre. throttle (ImportThrottle)
+    limita la velocidad de la copia. root es el punto de montaje de la
+    memoria (por omisión USB_MOUNT_DIR); varias memorias pueden copiarse
+    a la vez.
     Retorna un diccionario con los archivos copiados y un booleano si se encontraron ROMs.
     """
     copied_files = {ext: [] for ext in USB_ROM_DIRS.keys()}
     found_roms = False
     
-    if not os.path.isdir(USB_MOUNT_DIR):
+    root = root or USB_MOUNT_DIR
+    if not os.path.isdir(root):
         return copied_files, False
-        
+    
+    pending = []        # (UsbRom, destino)
+    source_hashes = {}  # UsbRom -> (crc32, sha1), calculados solo si hace falta
+    catalog = get_rom_catalog()
+    
+    def source_hash(rom):
+        if rom not in source_hashes:
+            source_hashes[rom] = rom.hash()
+        return source_hashes[rom]
+    
     try:
-        # Recorrer archivos en el USB
-        for filename in os.listdir(USB_MOUNT_DIR):
-            filepath = os.path.join(USB_MOUNT_DIR, filename)
+        # Recorrer el USB (carpetas y archivos .zip)
+        roms = scan_usb_roms(root)
+        found_roms = bool(roms)
+        claimed = set()
+        for rom in roms:
+            dest_dir = USB_ROM_DIRS[rom.ext]
             
-            # Verificar extensiones compatibles
-            for ext in USB_ROM_DIRS.keys():
-                if filename.lower().endswith(ext):
-                    found_roms = True
-                    dest_dir = USB_ROM_DIRS[ext]
-                    
-                    # Crear directorio de destino si no existe
-                    if not os.path.exists(dest_dir):
-                        os.makedirs(dest_dir)
-                    
-                    dest_path = os.path.join(dest_dir, filename)
-                    
-                    # Determinar si se debe copiar (nuevo o modificado)
-                    should_copy = False
-                    if not os.path.exists(dest_path):
+            # Crear directorio de destino si no existe
+            if not os.path.exists(dest_dir):
+                os.makedirs(dest_dir)
+            
+            dest_path = os.path.join(dest_dir, rom.name)
+            if dest_path in claimed:
+                print(f"Omitida {rom.label()}: ya se copia otra ROM con el nombre {rom.name}")
+                continue
+            
+            try:
+                # Determinar si se debe copiar (nuevo o modificado)
+                should_copy = False
+                if not os.path.exists(dest_path):
+                    should_copy = True
+                else:
+                    dst_mtime = os.path.getmtime(dest_path)
+                    if rom.mtime > dst_mtime:
                         should_copy = True
-                    else:
-                        src_mtime = os.path.getmtime(filepath)
-                        dst_mtime = os.path.getmtime(dest_path)
-                        if src_mtime > dst_mtime:
-                            should_copy = True
-                    
-                    # Copiar archivo si es necesario
-                    if should_copy:
-                        shutil.copy2(filepath, dest_path)
-                        copied_files[ext].append(filename)
-                        print(f"Copiada {filename} a {dest_dir}")
-                    break
+                
+                # Omitir contenido repetido (se compara el hash solo entre ROMs del mismo tamaño)
+                if should_copy:
+                    duplicate = catalog.find_content(rom.size, lambda: source_hash(rom))
+                    if duplicate is None:
+                        duplicate = next((other.label() for other, _ in pending if other.size == rom.size and
+                                          source_hash(other) == source_hash(rom)), None)
+                    if duplicate is not None:
+                        print(f"Omitida {rom.label()}: mismo contenido que {duplicate}")
+                        should_copy = False
+            except (OSError, zipfile.BadZipFile, zlib.error) as e:
+                print(f"Error al revisar {rom.label()}: {e}")
+                continue
+            
+            if should_copy:
+                # Otra memoria conectada a la vez puede estar copiando el mismo destino
+                with USB_COPY_CLAIMS_LOCK:
+                    if dest_path in USB_COPY_CLAIMS:
+                        print(f"Omitida {rom.label()}: {rom.name} ya se copia desde otra memoria")
+                        continue
+                    USB_COPY_CLAIMS.add(dest_path)
+                pending.append((rom, dest_path))
+                claimed.add(dest_path)
                     
     except Exception as e:
         print(f"Error al copiar ROMs: {e}")
+    
+    if not pending:
+        return copied_files, found_roms
+    
+    def copy_job(rom, temp_path):
+        start = time.monotonic()
+        digest = copy_file_chunked(rom, temp_path, COPY_PROGRESS, throttle)
+        return digest, start, time.monotonic()
+    
+    # Copiar en paralelo a archivos temporales ocultos
+    jobs = [(rom, dest_path, os.path.join(os.path.dirname(dest_path), f".{rom.name}.part"))
+            for rom, dest_path in pending]
+    COPY_PROGRESS.start([(temp_path, rom.name, rom.size) for rom, _, temp_path in jobs])
+    try:
+        written = []
+        digests = {}
+        archives = {}  # .zip -> [ROMs, bytes, inicio, fin]
+        with concurrent.futures.ThreadPoolExecutor(
+                max_workers=USB_COPY_WORKERS, thread_name_prefix='usb-copy') as pool:
+            futures = {}
+            for rom, dest_path, temp_path in jobs:
+                futures[pool.submit(copy_job, rom, temp_path)] = (rom, dest_path, temp_path)
+            
+            for future in concurrent.futures.as_completed(futures):
+                rom, dest_path, temp_path = futures[future]
+                try:
+                    digests[dest_path], start, end = future.result()
+                    written.append((temp_path, dest_path))
+                    if rom.archive:
+                        stats = archives.setdefault(rom.archive, [0, 0, start, end])
+                        stats[0] += 1
+                        stats[1] += rom.size
+                        stats[2] = min(stats[2], start)
+                        stats[3] = max(stats[3], end)
+                except Exception as e:
+                    print(f"Error al copiar {rom.label()}: {e}")
+                    with contextlib.suppress(OSError):
+                        os.remove(temp_path)
+                COPY_PROGRESS.file_done(temp_path)
+        
+        # Rendimiento de la extracción de cada archivo .zip
+        for archive, (count, size, start, end) in sorted(archives.items()):
+            elapsed = max(end - start, 1e-6)
+            print(f"Extraídas {count} ROMs de {os.path.basename(archive)}: "
+                  f"{size / 1048576:.1f} MB en {elapsed:.2f}s ({size / 1048576 / elapsed:.1f} MB/s)")
+        
+        # Sincronizar todo de una vez y publicar las ROMs nuevas
+        extensions = {dest_path: rom.ext for rom, dest_path in pending}
+        for dest_path in sync_copied_files(written):
+            filename = os.path.basename(dest_path)
+            copied_files[extensions[dest_path]].append(filename)
+            # Con inotify activo el vigilante ya publica el renombrado del .part
+            if LIBRARY_WATCHER is None or not LIBRARY_WATCHER.active:
+                notify_library_change('add', dest_path)
+            # Registrar el hash calculado durante la copia para no volver a leerla
+            with contextlib.suppress(OSError):
+                st = os.stat(dest_path)
+                catalog.store_hash(dest_path, st.st_size, st.st_mtime_ns, digests[dest_path])
+            print(f"Copiada {filename} a {os.path.dirname(dest_path)}")
+    finally:
+        COPY_PROGRESS.finish()
+        with USB_COPY_CLAIMS_LOCK:
+            USB_COPY_CLAIMS.difference_update(claimed)
         
     return copied_files, found_roms
 
@@ -205,45 +1705,119 @@ def setup_usb_monitor():
     """Configura el monitor de eventos USB usando pyudev."""
     context = pyudev.Context()
     monitor = pyudev.Monitor.from_netlink(context)
-    monitor.filter_by(subsystem='block', device_type='disk')
+    # Particiones y memorias sin tabla de particiones (ver usb_partition)
+    monitor.filter_by(subsystem='block')
     return monitor
 
+def import_usb_roms(game_state, mount_point):
+    """
+    Copia las ROMs del USB montado en mount_point y deja el resumen en cola
+    para mostrarlo en el menú. Si hay un juego en curso la copia se hace en segundo plano
+    desde un hilo de prioridad mínima y con velocidad limitada por
+    ImportThrottle, sin cerrar el emulador (con USB_IMPORT_DURING_GAME).
+    """
+    global EMULATOR_RUNNING
+    process = EMULATOR_PROCESS
+    if EMULATOR_RUNNING and process and USB_IMPORT_DURING_GAME:
+        print("Copiando ROMs en segundo plano durante el juego")
+        throttle = ImportThrottle(process)
+        result = []
+        
+        def background_copy():
+            lower_thread_priority()
+            result.append(copy_roms_from_usb(throttle, mount_point))
+        
+        start = time.monotonic()
+        worker = Thread(target=background_copy, name="usb-import", daemon=True)
+        worker.start()
+        worker.join()
+        copied_files, found_roms = result[0] if result else ({ext: [] for ext in USB_ROM_DIRS}, False)
+        print(f"Copia en segundo plano terminada en {time.monotonic() - start:.1f}s "
+              f"(velocidad final {throttle.rate / 1048576:.1f} MB/s, {throttle.slowdowns} reducciones)")
+    else:
+        copied_files, found_roms = copy_roms_from_usb(root=mount_point)
+        if EMULATOR_RUNNING and process:
+            process.terminate()
+            process.wait()
+            EMULATOR_RUNNING = False
+    
+    game_state.copy_summaries.put(copied_files)
+    post_event(UI_WAKE_EVENT)
+
+# Particiones USB que se están atendiendo (nodo del dispositivo)
+USB_ACTIVE_DEVICES = set()
+USB_ACTIVE_LOCK = Lock()
+
+def start_usb_import(game_state, device_node, fs_type):
+    """
+    Monta la partición, copia sus ROMs y la desmonta en un hilo propio, de
+    modo que varias memorias se montan y revisan a la vez.
+    Ignora la partición si ya se está atendiendo.
+    """
+    with USB_ACTIVE_LOCK:
+        if device_node in USB_ACTIVE_DEVICES:
+            return
+        USB_ACTIVE_DEVICES.add(device_node)
+    
+    def handle_partition():
+        try:
+            mount_point, mounted = mount_usb_partition(device_node, fs_type)
+            if mount_point is None:
+                return
+            try:
+                import_usb_roms(game_state, mount_point)
+            finally:
+                # Solo se desmontan las particiones que montó la consola
+                if mounted:
+                    unmount_usb(mount_point)
+        except Exception as e:
+            print(f"Error al copiar desde {device_node}: {e}")
+        finally:
+            with USB_ACTIVE_LOCK:
+                USB_ACTIVE_DEVICES.discard(device_node)
+    
+    Thread(target=handle_partition, name=f"usb-{os.path.basename(device_node)}", daemon=True).start()
+
+def take_copy_summaries(game_state):
+    """Junta en un solo resumen todas las copias desde USB pendientes de mostrar."""
+    copied_files = {}
+    while not game_state.copy_summaries.empty():
+        for ext, files in game_state.copy_summaries.get_nowait().items():
+            copied_files.setdefault(ext, []).extend(files)
+    return copied_files
+
 def usb_event_handler(game_state):
     """
     Maneja eventos de conexión/desconexión de USB.
     Se ejecuta en un hilo separado para monitoreo en tiempo real.
+    Cada partición USB que anuncia udev se monta con su nodo y sistema de
+    archivos exactos y se atiende en paralelo (start_usb_import).
     """
-    global EMULATOR_RUNNING, EMULATOR_PROCESS
     monitor = setup_usb_monitor()
+    monitor.start()  # Recibir eventos desde ya para no perder memorias al listar
     
-    # Verificar si ya hay un USB conectado al iniciar
-    if check_existing_usb():
-        copied_files, found_roms = copy_roms_from_usb()
-        if EMULATOR_RUNNING and EMULATOR_PROCESS:
-            EMULATOR_PROCESS.terminate()
-            EMULATOR_PROCESS.wait()
-            EMULATOR_RUNNING = False
-            
-        game_state.copied_files = copied_files
-        game_state.show_copy_notification = True
-        unmount_usb()
+    # Atender las memorias que ya estaban conectadas al iniciar
+    try:
+        for device in pyudev.Context().list_devices(subsystem='block'):
+            partition = usb_partition(device)
+            if partition:
+                start_usb_import(game_state, *partition)
+    except Exception as e:
+        print(f"Error al verificar USB existente: {e}")
     
     # Monitorear eventos de dispositivos
     for device in iter(monitor.poll, None):
         if device.action == 'add':
-            print("Dispositivo USB conectado")
-            if check_and_mount_usb():
-                copied_files, found_roms = copy_roms_from_usb()
-                if EMULATOR_RUNNING and EMULATOR_PROCESS:
-                    EMULATOR_PROCESS.terminate()
-                    EMULATOR_PROCESS.wait()
-                    EMULATOR_RUNNING = False
-                
-                game_state.copied_files = copied_files
-                game_state.show_copy_notification = True
-                unmount_usb()
-        elif device.action == 'remove':
-            print("Dispositivo USB desconectado")
+            partition = usb_partition(device)
+            if partition:
+                print(f"Dispositivo USB conectado: {partition[0]} ({partition[1]})")
+                start_usb_import(game_state, *partition)
+        elif device.action == 'remove' and device.device_node:
+            # Si se retiró sin desmontar, liberar su punto de montaje
+            mount_point = find_mount_point(device.device_node)
+            if mount_point and mount_point.startswith(USB_MOUNT_DIR + '/'):
+                print(f"Dispositivo USB desconectado: {device.device_node}")
+                unmount_usb(mount_point, lazy=True)
 
 def start_usb_monitor(game_state):
     """
@@ -263,9 +1837,6 @@ def show_copy_confirmation(screen, copied_files):
     Muestra una notificación con los archivos copiados desde USB.
     Espera confirmación del usuario para continuar.
     """
-    font_large = pygame.font.Font(None, 36)
-    font_small = pygame.font.Font(None, 28)
-    
     total_copied = sum(len(files) for files in copied_files.values())
     
     # Crear overlay semitransparente
@@ -278,47 +1849,47 @@ def show_copy_confirmation(screen, copied_files):
     pygame.draw.rect(overlay, COLOR_HIGHLIGHT, dialog_rect, 3, border_radius=10)
     
     # Mostrar título
-    title = font_large.render("Memoria USB detectada.", True, COLOR_HIGHLIGHT)
+    title = render_text("Memoria USB detectada.", 36, COLOR_HIGHLIGHT)
     overlay.blit(title, (320 - title.get_width()//2, 150))
     
     # Mostrar lista de archivos copiados o mensaje si no hay
     if total_copied > 0:
-        msg = font_small.render(f"Se copiaron {total_copied} ROMs:", True, COLOR_TEXT)
+        msg = render_text(f"Se copiaron {total_copied} ROMs:", 28, COLOR_TEXT)
         overlay.blit(msg, (320 - msg.get_width()//2, 200))
         
         y_pos = 240
         for ext, files in copied_files.items():
             if files:
-                ext_text = font_small.render(f"{ext.upper()}: {len(files)}", True, COLOR_TEXT)
+                ext_text = render_text(f"{ext.upper()}: {len(files)}", 28, COLOR_TEXT)
                 overlay.blit(ext_text, (320 - ext_text.get_width()//2, y_pos))
                 y_pos += 30
     else:
         msg_lines = [
             "No se encontraron ROMs nuevas para copiar...",
-            "Recuerda que para copiar ROMs estas deben",
-            "estar en la raiz de la memoria.",
+            "Las ROMs pueden estar en cualquier carpeta",
+            "de la memoria o dentro de archivos .zip.",
             "Archivos compatibles: .gba, .nes, .smc, .sfc"
         ]
         y_pos = 200
         for line in msg_lines:
-            line_text = font_small.render(line, True, COLOR_TEXT)
+            line_text = render_text(line, 28, COLOR_TEXT)
             overlay.blit(line_text, (320 - line_text.get_width()//2, y_pos))
             y_pos += 30
 
     # Instrucción para continuar
-    instruction = font_small.render("Presiona el botón A para continuar", True, COLOR_HIGHLIGHT)
+    instruction = render_text("Presiona el botón A para continuar", 28, COLOR_HIGHLIGHT)
     overlay.blit(instruction, (320 - instruction.get_width()//2, 320))
     
     screen.blit(overlay, (0, 0))
+    RetainedRenderer.invalidate_screen()
     pygame.display.update()
     
     # Esperar confirmación del usuario
     waiting = True
     while waiting:
-        for event in pygame.event.get():
-            if event.type == pygame.JOYBUTTONDOWN and event.button == 0:
+        for event in EVENT_LOOP.wait():
+            if event.type == INPUT_ACTION_EVENT and event.action == ACTION_ACCEPT:
                 waiting = False
-        time.sleep(0.1)
 
 def show_connect_controller(require_button_press=True):
     """
@@ -329,9 +1900,6 @@ def show_connect_controller(require_button_press=True):
     pygame.display.init()
     screen = pygame.display.set_mode((640, 480), pygame.FULLSCREEN)
     pygame.mouse.set_visible(False)
-    font_large = pygame.font.Font(None, 36)
-    font_small = pygame.font.Font(None, 30)
-    font_warning = pygame.font.Font(None, 26)
     
     pygame.joystick.init()
     joystick_connected = False
@@ -349,14 +1917,8 @@ def show_connect_controller(require_button_press=True):
         
         # Mostrar advertencia importante si es necesario
         if require_button_press:
-            line1 = font_warning.render(
-                "Importante. La salida de audio de la consola",
-                True, 
-                (255, 255, 0))
-            line2 = font_warning.render(
-                "es por medio de la conexión de audífonos", 
-                True, 
-                (255, 255, 0))
+            line1 = render_text("Importante. La salida de audio de la consola", 26, (255, 255, 0))
+            line2 = render_text("es por medio de la conexión de audífonos", 26, (255, 255, 0))
             
             warning_bg = pygame.Surface((600, 60), pygame.SRCALPHA)
             warning_bg.fill((20, 20, 0, 200))
@@ -379,14 +1941,14 @@ def show_connect_controller(require_button_press=True):
                     return joystick
             
             if require_button_press:
-                title = font_large.render("Control Conectado", True, COLOR_HIGHLIGHT)
-                instruction = font_small.render("Presiona el botón A para continuar", True, COLOR_TEXT)
+                title = render_text("Control Conectado", 36, COLOR_HIGHLIGHT)
+                instruction = render_text("Presiona el botón A para continuar", 30, COLOR_TEXT)
             else:
                 return joystick
         else:
             joystick_connected = False
-            title = font_large.render("Control Desconectado", True, COLOR_DISCONNECTED)
-            instruction = font_small.render("Conecta un control para continuar", True, COLOR_TEXT)
+            title = render_text("Control Desconectado", 36, COLOR_DISCONNECTED)
+            instruction = render_text("Conecta un control para continuar", 30, COLOR_TEXT)
         
         # Mostrar título e instrucciones
         overlay.blit(title, (320 - title.get_width()//2, 210))
@@ -394,42 +1956,310 @@ def show_connect_controller(require_button_press=True):
         
         screen.fill(COLOR_BG)
         screen.blit(overlay, (0, 0))
+        RetainedRenderer.invalidate_screen()
         pygame.display.update()
         
-        # Manejar eventos de botón
-        for event in pygame.event.get():
-            if event.type == pygame.JOYBUTTONDOWN and joystick_connected and event.button == 0:
+        # Esperar eventos de botón o de conexión/desconexión del control
+        for event in EVENT_LOOP.wait():
+            if (event.type == INPUT_ACTION_EVENT and joystick_connected and
+                    event.action == ACTION_ACCEPT):
                 button_pressed = True
                 return pygame.joystick.Joystick(0)
-        
-        time.sleep(0.1)
 
-def init_inputs():
-    """Inicializa los sistemas de entrada y muestra pantalla de conexión de control."""
-    pygame.init()
-    pygame.joystick.init()
-    return show_connect_controller()
+def init_inputs():
+    """Inicializa los sistemas de entrada y muestra pantalla de conexión de control."""
+    pygame.init()
+    pygame.joystick.init()
+    return show_connect_controller()
+
+# =============================================
+# SECCIÓN 2: EMULACIÓN Y PANTALLAS PREVIAS
+# =============================================
+
+LAUNCH_LABELS = {
+    'first_frame': "A → primer cuadro del emulador",
+    'exit_to_menu': "salida del emulador → menú",
+}
+
+class LaunchTimer:
+    """
+    Mide el lanzamiento de los juegos:
+    - Desde el botón A en la pantalla de controles hasta el primer cuadro
+      del emulador, que se detecta cuando el proceso abre su dispositivo de
+      video o de audio (EMULATOR_FIRST_FRAME_DEVICES) en /proc/<pid>/fd.
+    - Desde que el emulador termina hasta que se presenta el menú.
+    """
+    def __init__(self):
+        self._lock = Lock()
+        self._exited_at = None
+        self._histograms = {name: LatencyHistogram() for name in LAUNCH_LABELS}
+
+    def emulator_started(self, pressed_at, process):
+        """Vigila en segundo plano el proceso recién iniciado hasta su primer cuadro."""
+        def probe():
+            fd_dir = f"/proc/{process.pid}/fd"
+            deadline = pressed_at + EMULATOR_FIRST_FRAME_TIMEOUT
+            while time.monotonic() < deadline and process.poll() is None:
+                try:
+                    fds = os.listdir(fd_dir)
+                except OSError:
+                    return
+                for fd in fds:
+                    try:
+                        target = os.readlink(os.path.join(fd_dir, fd))
+                    except OSError:
+                        continue
+                    if target.startswith(EMULATOR_FIRST_FRAME_DEVICES):
+                        self._record('first_frame', pressed_at)
+                        return
+                time.sleep(EMULATOR_PROBE_INTERVAL)
+        Thread(target=probe, name="launch-probe", daemon=True).start()
+
+    def emulator_exited(self, timestamp):
+        self._exited_at = timestamp
+
+    def frame_presented(self):
+        """Cierra la medición salida → menú con el primer cuadro presentado."""
+        exited_at = self._exited_at
+        if exited_at is not None:
+            self._exited_at = None
+            self._record('exit_to_menu', exited_at)
+
+    def _record(self, name, since):
+        latency_ms = (time.monotonic() - since) * 1000
+        with self._lock:
+            self._histograms[name].add(latency_ms)
+        print(f"Lanzamiento: {LAUNCH_LABELS[name]} en {latency_ms:.0f} ms")
+
+    def summary(self):
+        with self._lock:
+            return {name: histogram.summary() for name, histogram in self._histograms.items()
+                    if histogram.total}
+
+    def dump(self):
+        """Imprime los percentiles de los tiempos de lanzamiento."""
+        summary = self.summary()
+        if not summary:
+            return summary
+        print("Tiempos de lanzamiento (ms):")
+        for name, stats in summary.items():
+            print(f"  {LAUNCH_LABELS[name]}: n={stats['count']} p50={stats['p50_ms']:.0f} "
+                  f"p95={stats['p95_ms']:.0f} máx={stats['max_ms']:.0f}")
+        return summary
+
+LAUNCH_TIMER = LaunchTimer()
+
+class RomPrefetcher:
+    """
+    Lleva ROMs a la caché de páginas del kernel antes de que el emulador
+    las abra. Cada solicitud pide readahead (posix_fadvise WILLNEED) y luego
+    lee el archivo en orden desde un hilo, porque el readahead del kernel
+    solo cubre un tramo corto. Una solicitud nueva interrumpe la lectura en
+    curso: la ROM elegida con A siempre pasa antes que una especulativa.
+    """
+    def __init__(self):
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="roms")
+        self._generation = 0
+        self._hovered = None
+        self._dwell_timer = None
+        self._lock = Lock()
+
+    def prefetch(self, rom_path):
+        """Precarga rom_path en segundo plano y abandona la precarga anterior."""
+        with self._lock:
+            self._generation += 1
+            generation = self._generation
+        try:
+            self._executor.submit(self._read, rom_path, generation)
+        except RuntimeError:
+            pass  # El grupo de hilos ya se cerró
+
+    def hover(self, rom_path):
+        """
+        Informa la ROM bajo el cursor (None si la selección no es una ROM).
+        Si sigue seleccionada ROM_PREFETCH_DWELL segundos se precarga.
+        """
+        if rom_path == self._hovered:
+            return
+        self._hovered = rom_path
+        if self._dwell_timer is not None:
+            EVENT_LOOP.timers.cancel(self._dwell_timer)
+            self._dwell_timer = None
+        if rom_path is not None and ROM_PREFETCH_DWELL is not None:
+            self._dwell_timer = EVENT_LOOP.timers.schedule(
+                ROM_PREFETCH_DWELL, lambda: self._dwell_expired(rom_path))
+
+    def _dwell_expired(self, rom_path):
+        self._dwell_timer = None
+        # No competir por el disco con el emulador ni con una copia desde USB
+        if EMULATOR_RUNNING or COPY_PROGRESS.active:
+            return
+        self.prefetch(rom_path)
+
+    def advise(self, path):
+        """
+        Solo pide al kernel que lea path por adelantado (posix_fadvise
+        WILLNEED), sin leerlo aquí ni interrumpir la precarga en curso.
+        Retorna el tamaño del archivo o None si no se pudo.
+        """
+        try:
+            with open(path, 'rb', buffering=0) as target:
+                os.posix_fadvise(target.fileno(), 0, 0, os.POSIX_FADV_WILLNEED)
+                return os.fstat(target.fileno()).st_size
+        except (OSError, AttributeError) as e:
+            print(f"No se pudo precargar {path}: {e}")
+            return None
+
+    @profiled('rom_prefetch')
+    def _read(self, rom_path, generation):
+        size = self.advise(rom_path)
+        if size is None or size > ROM_PREFETCH_MAX_BYTES:
+            return
+        try:
+            with open(rom_path, 'rb', buffering=0) as rom:
+                buffer = bytearray(ROM_PREFETCH_CHUNK)
+                while self._generation == generation and rom.readinto(buffer):
+                    pass  # Una solicitud más reciente interrumpe la lectura
+        except OSError as e:
+            print(f"No se pudo precargar {rom_path}: {e}")
+
+def get_rom_prefetcher():
+    """Retorna el precargador global de ROMs."""
+    global ROM_PREFETCHER
+    if ROM_PREFETCHER is None:
+        ROM_PREFETCHER = RomPrefetcher()
+    return ROM_PREFETCHER
+
+def preload_game(rom_path):
+    """
+    Lleva la ROM a la caché de páginas y pide readahead del ejecutable del
+    emulador (ver RomPrefetcher) mientras se muestra la pantalla de controles.
+    """
+    prefetcher = get_rom_prefetcher()
+    prefetcher.prefetch(rom_path)
+    prefetcher.advise(shutil.which(EMULATOR_CMD) or EMULATOR_CMD)
+
+def thread_ids(pid='self'):
+    """Retorna los identificadores de los hilos del proceso pid."""
+    try:
+        return [int(tid) for tid in os.listdir(f"/proc/{pid}/task")]
+    except OSError:
+        return []
 
-# =============================================
-# SECCIÓN 2: EMULACIÓN Y PANTALLAS PREVIAS
-# =============================================
+class SchedulingProfile:
+    """
+    Aplica un perfil de EMULATOR_SCHED_PROFILES mientras corre el emulador:
+    fija los hilos del emulador y los de este programa a núcleos distintos
+    y ajusta su nice. restore() devuelve los hilos del programa a su estado
+    anterior y retorna, con o sin perfil, las expropiaciones de CPU que
+    sufrió el emulador (cambios de contexto involuntarios por segundo de
+    CPU, de los hilos del emulador muestreados por EmulatorWatchdog) para
+    comparar el efecto en la fluidez del juego.
+    """
+    def __init__(self, name):
+        self.name = name
+        self.settings = EMULATOR_SCHED_PROFILES.get(name)
+        if self.settings is None and name not in ('', 'ninguno'):
+            print(f"Perfil de planificación desconocido: {name}")
+        self._saved = {}          # tid -> (núcleos, nice) de los hilos del programa
+        self._cpus = None         # núcleos del programa antes del perfil
+        self._errors = set()
+
+    def apply(self, pid):
+        """Aplica el perfil al emulador recién lanzado (pid) y a este programa."""
+        if self.settings is None:
+            return
+        self._cpus = os.sched_getaffinity(0)
+        for tid in thread_ids(pid):
+            self._set(tid, self._available('emulator_cpus'), self.settings['emulator_nice'])
+        ui_cpus = self._available('ui_cpus')
+        for tid in thread_ids():
+            try:
+                saved = (os.sched_getaffinity(tid), os.getpriority(os.PRIO_PROCESS, tid))
+            except OSError:
+                continue  # El hilo ya terminó
+            # Solo se baja la prioridad: la copia desde USB ya corre con nice 19
+            nice = self.settings['ui_nice']
+            self._saved[tid] = saved
+            self._set(tid, ui_cpus, None if nice is None else max(nice, saved[1]))
+        self._report_errors()
+
+    def restore(self, emulator_threads):
+        """
+        Restaura los hilos del programa y retorna el informe del juego a
+        partir de las muestras de los hilos del emulador
+        (EmulatorWatchdog.threads).
+        """
+        if self.settings is not None:
+            for tid in thread_ids():
+                # Los hilos creados durante el juego heredaron los núcleos de la interfaz
+                cpus, nice = self._saved.get(tid, (self._cpus, None))
+                self._set(tid, cpus, nice)
+            self._report_errors()
+            self._saved.clear()
+
+        cpu = sum(cpu for cpu, _ in emulator_threads.values())
+        preemptions = sum(count for _, count in emulator_threads.values())
+        return {
+            'profile': self.name if self.settings is not None else 'ninguno',
+            'cpu_s': cpu,
+            'preemptions': preemptions,
+            'preemptions_per_cpu_s': preemptions / cpu if cpu > 0 else None,
+        }
+
+    def _available(self, key):
+        cpus = self.settings[key]
+        if cpus is None:
+            return None
+        cpus = set(cpus) & self._cpus
+        if not cpus:
+            self._errors.add(f"núcleos {self.settings[key]} no disponibles")
+            return None
+        return cpus
+
+    def _set(self, tid, cpus, nice):
+        try:
+            if cpus is not None:
+                os.sched_setaffinity(tid, cpus)
+            if nice is not None and os.getpriority(os.PRIO_PROCESS, tid) != nice:
+                os.setpriority(os.PRIO_PROCESS, tid, nice)
+        except ProcessLookupError:
+            pass  # El hilo ya terminó
+        except OSError as e:
+            self._errors.add(str(e))
+
+    def _report_errors(self):
+        for error in sorted(self._errors):
+            print(f"Perfil de planificación '{self.name}' incompleto: {error}")
+        self._errors.clear()
 
 def launch_game(rom_path, joystick):
     """
     Inicia la emulación del juego especificado.
-    Muestra pantalla de controles antes de iniciar.
+    Muestra pantalla de controles antes de iniciar; mientras está en
+    pantalla la ROM y el emulador se precargan en la caché del kernel.
+    Mientras el juego corre se aplica el perfil EMULATOR_SCHED_PROFILE.
     """
     global EMULATOR_RUNNING, EMULATOR_PROCESS
+    scheduling = SchedulingProfile(EMULATOR_SCHED_PROFILE)
+    watchdog = None
     try:
         _, ext = os.path.splitext(rom_path)
         ext = ext.lower()
+        preload_game(rom_path)
         
         # Mostrar pantalla de controles y verificar conexión
         if not show_mapping_control_screen(joystick, ext):
             print("No se lanzó el juego porque el control se desconectó")
             return
+        pressed_at = time.monotonic()
             
-        # Configurar pantalla para el emulador
+        # El siguiente cuadro será del emulador, no de la interfaz
+        INPUT_LATENCY.discard()
+        
+        # Liberar la pantalla para el emulador; el subsistema de video se
+        # vuelve a iniciar sin ventana para seguir recibiendo eventos
         pygame.display.quit()
         pygame.display.init()
         pygame.mouse.set_visible(False)
@@ -437,51 +2267,386 @@ def launch_game(rom_path, joystick):
         # Iniciar emulador
         EMULATOR_PROCESS = subprocess.Popen([EMULATOR_CMD, rom_path])
         EMULATOR_RUNNING = True
+        scheduling.apply(EMULATOR_PROCESS.pid)
+        watchdog = EmulatorWatchdog(EMULATOR_PROCESS)
+        LAUNCH_TIMER.emulator_started(pressed_at, EMULATOR_PROCESS)
         
         # Monitorear estado del emulador
-        monitor_emulator(EMULATOR_PROCESS, joystick)
+        monitor_emulator(EMULATOR_PROCESS, joystick, watchdog)
     except Exception as e:
         print(f"Error al lanzar el juego: {e}")
     finally:
+        if watchdog is not None:
+            report = scheduling.restore(watchdog.threads)
+            rate = report['preemptions_per_cpu_s']
+            print(f"Planificación del juego ({report['profile']}): "
+                  f"{'-' if rate is None else f'{rate:.0f}'} expropiaciones por segundo de CPU "
+                  f"({report['preemptions']} en {report['cpu_s']:.1f} s)")
         EMULATOR_RUNNING = False
         EMULATOR_PROCESS = None
+        EVENT_LOOP.reset()
+        INPUT_LATENCY.discard()
+
+# Interfaz evdev del kernel (linux/input.h): formato de struct input_event,
+# tipos y códigos usados y números de las ioctl EVIOCGBIT/EVIOCGKEY
+EVDEV_EVENT = struct.Struct('llHHi')
+EV_SYN = 0x00
+EV_KEY = 0x01
+SYN_DROPPED = 3
+BTN_MISC = 0x100
+BTN_JOYSTICK = 0x120
+KEY_MAX = 0x2ff
+EVIOCGKEY = 0x18
+EVIOCGBIT_KEY = 0x20 + EV_KEY
+
+# Eventos del control que llegan a pygame durante el juego y no deben
+# interpretarse en el menú al volver
+EMULATOR_INPUT_EVENTS = [pygame.JOYBUTTONDOWN, pygame.JOYBUTTONUP,
+                         pygame.JOYHATMOTION, pygame.JOYAXISMOTION]
+
+def evdev_key_bitmap(fd, number):
+    """Lee un mapa de bits de teclas del dispositivo (ioctl de lectura 'E')."""
+    bitmap = bytearray(KEY_MAX // 8 + 1)
+    request = (2 << 30) | (len(bitmap) << 16) | (ord('E') << 8) | number
+    fcntl.ioctl(fd, request, bitmap)
+    return {code for code in range(KEY_MAX + 1) if bitmap[code // 8] >> (code % 8) & 1}
+
+def evdev_button_codes(fd):
+    """
+    Retorna los códigos evdev de los botones del control en el orden en que
+    SDL los numera: primero desde BTN_JOYSTICK y luego desde BTN_MISC.
+    """
+    keys = evdev_key_bitmap(fd, EVIOCGBIT_KEY)
+    order = list(range(BTN_JOYSTICK, KEY_MAX)) + list(range(BTN_MISC, BTN_JOYSTICK))
+    return [code for code in order if code in keys]
+
+def find_controller_evdev(joystick):
+    """
+    Busca el nodo /dev/input/eventN del control de pygame: por fabricante y
+    producto (del GUID de SDL), luego por nombre y, si solo hay un control
+    conectado, ese. Retorna None si no se encuentra.
+    """
+    context = pyudev.Context()
+    candidates = [device for device in context.list_devices(subsystem='input', ID_INPUT_JOYSTICK='1')
+                  if (device.device_node or '').startswith('/dev/input/event')]
+    if not candidates:
+        return None
+
+    try:
+        guid = bytes.fromhex(joystick.get_guid())
+        name = joystick.get_name()
+    except (pygame.error, AttributeError, ValueError):
+        guid, name = b'', None
+    vendor = int.from_bytes(guid[4:6], 'little') if len(guid) == 16 else 0
+    product = int.from_bytes(guid[8:10], 'little') if len(guid) == 16 else 0
+
+    def attribute(device, name):
+        try:
+            return device.parent.attributes.asstring(name).strip()
+        except (KeyError, AttributeError, UnicodeDecodeError):
+            return None
+
+    if vendor:
+        matches = [device for device in candidates
+                   if attribute(device, 'id/vendor') == f"{vendor:04x}"
+                   and attribute(device, 'id/product') == f"{product:04x}"]
+        if matches:
+            return matches[0].device_node
+    matches = [device for device in candidates if name and attribute(device, 'name') == name]
+    if matches:
+        return matches[0].device_node
+    if len(candidates) == 1:
+        return candidates[0].device_node
+    return None
+
+def supervise_emulator(emulator_process, device_path, watchdog):
+    """
+    Espera a la vez el fin del emulador (pidfd, o un hilo en waitpid si el
+    kernel no lo soporta) y los eventos evdev del control, despertando solo
+    para las muestras del watchdog (EmulatorWatchdog). Retorna 'exit' si el
+    emulador terminó, 'chord' si se pulsó SELECT+START, 'disconnect' si el
+    control se desconectó, o el tipo de incidente del watchdog.
+    """
+    device = os.open(device_path, os.O_RDONLY | os.O_NONBLOCK)
+    selector = selectors.DefaultSelector()
+    exit_fds = []
+    try:
+        buttons = evdev_button_codes(device)
+        chord = {buttons[index] for index in (BUTTON_SELECT, BUTTON_START) if index < len(buttons)}
+        if len(chord) < 2:
+            chord = None
+            print(f"El control en {device_path} no tiene SELECT y START; solo se vigila la desconexión")
+        pressed = evdev_key_bitmap(device, EVIOCGKEY)
+
+        try:
+            exit_fds.append(os.pidfd_open(emulator_process.pid))
+        except (AttributeError, OSError):
+            read_end, write_end = os.pipe()
+            exit_fds.append(read_end)
+            def wait_for_exit():
+                # WNOWAIT: el proceso se recoge después de muestrear sus hilos
+                with contextlib.suppress(ChildProcessError):
+                    os.waitid(os.P_PID, emulator_process.pid, os.WEXITED | os.WNOWAIT)
+                try:
+                    os.write(write_end, b'\0')
+                except OSError:
+                    pass  # La supervisión ya terminó por otro motivo
+                finally:
+                    os.close(write_end)
+            Thread(target=wait_for_exit, daemon=True).start()
+        selector.register(exit_fds[0], selectors.EVENT_READ, 'exit')
+        selector.register(device, selectors.EVENT_READ, 'input')
+
+        while True:
+            incident = watchdog.check()
+            if incident is not None:
+                return incident
+            for key, _ in selector.select(watchdog.timeout()):
+                if key.data == 'exit':
+                    return 'exit'
+                try:
+                    data = os.read(device, EVDEV_EVENT.size * 64)
+                except BlockingIOError:
+                    continue
+                except OSError as e:
+                    if e.errno == errno.ENODEV:
+                        return 'disconnect'
+                    raise
+                if not data:
+                    return 'disconnect'
+                for offset in range(0, len(data) - EVDEV_EVENT.size + 1, EVDEV_EVENT.size):
+                    _, _, kind, code, value = EVDEV_EVENT.unpack_from(data, offset)
+                    if kind == EV_KEY:
+                        if value:
+                            pressed.add(code)
+                        else:
+                            pressed.discard(code)
+                    elif kind == EV_SYN and code == SYN_DROPPED:
+                        # Se perdieron eventos: releer el estado de los botones
+                        pressed = evdev_key_bitmap(device, EVIOCGKEY)
+                if chord and chord <= pressed:
+                    return 'chord'
+    finally:
+        selector.close()
+        os.close(device)
+        for fd in exit_fds:
+            os.close(fd)
+
+class EmulatorWatchdog:
+    """
+    Detecta un emulador colgado muestreando /proc/<pid>/stat cada
+    EMULATOR_WATCHDOG_INTERVAL segundos; no tiene hilo propio, lo consulta
+    quien espera al emulador. Es un cuelgue ('stall') no consumir CPU, o
+    seguir en espera no interrumpible (estado D), durante
+    EMULATOR_STALL_SECONDS; es un descontrol ('runaway') usar más de
+    EMULATOR_RUNAWAY_CPUS núcleos durante EMULATOR_RUNAWAY_SECONDS o más de
+    EMULATOR_MAX_RSS bytes de memoria.
+    """
+    CLOCK_TICKS = os.sysconf('SC_CLK_TCK')
+    PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+
+    def __init__(self, emulator_process):
+        self.process = emulator_process
+        self.started = time.monotonic()
+        self.incident = None             # (tipo, detalle, instante de detección)
+        self.threads = {}                # tid -> (segundos de CPU, expropiaciones)
+        self._next = self.started + EMULATOR_WATCHDOG_INTERVAL
+        self._sample = None              # (instante, segundos de CPU)
+        self._progress_at = self.started # Último instante con avance de CPU
+        self._blocked_since = None       # Primera muestra en estado D
+        self._busy_since = None          # Inicio del consumo excesivo de CPU
+
+    def timeout(self):
+        """Segundos hasta la próxima muestra."""
+        return max(0.0, self._next - time.monotonic())
+
+    def check(self):
+        """Toma una muestra si corresponde; retorna el tipo de incidente o None."""
+        now = time.monotonic()
+        if now < self._next or self.incident is not None:
+            return None
+        self._next = now + EMULATOR_WATCHDOG_INTERVAL
+        self.sample_threads()
+        try:
+            with open(f"/proc/{self.process.pid}/stat") as stat:
+                fields = stat.read().rsplit(')', 1)[1].split()
+            state = fields[0]
+            cpu = (int(fields[11]) + int(fields[12])) / self.CLOCK_TICKS
+            rss = int(fields[21]) * self.PAGE_SIZE
+        except (OSError, IndexError, ValueError):
+            return None  # El proceso ya terminó
+        if state == 'Z':
+            return None
+
+        previous, self._sample = self._sample, (now, cpu)
+        if previous is not None and cpu > previous[1]:
+            self._progress_at = now
+        self._blocked_since = (self._blocked_since or now) if state == 'D' else None
+
+        if now - self._progress_at >= EMULATOR_STALL_SECONDS:
+            return self._detected('stall', f"sin consumir CPU durante {now - self._progress_at:.1f} s "
+                                            f"(estado {state})", now)
+        if self._blocked_since is not None and now - self._blocked_since >= EMULATOR_STALL_SECONDS:
+            return self._detected('stall', f"en espera no interrumpible durante "
+                                            f"{now - self._blocked_since:.1f} s", now)
+        if EMULATOR_MAX_RSS is not None and rss > EMULATOR_MAX_RSS:
+            return self._detected('runaway', f"{rss / 2**20:.0f} MiB de memoria", now)
+        if EMULATOR_RUNAWAY_CPUS is not None and previous is not None:
+            load = (cpu - previous[1]) / (now - previous[0])
+            if load < EMULATOR_RUNAWAY_CPUS:
+                self._busy_since = None
+            else:
+                self._busy_since = self._busy_since or previous[0]
+                if now - self._busy_since >= EMULATOR_RUNAWAY_SECONDS:
+                    return self._detected('runaway', f"{load:.1f} núcleos de CPU durante "
+                                                      f"{now - self._busy_since:.1f} s", now)
+        return None
+
+    def sample_threads(self):
+        """
+        Actualiza el tiempo de CPU y los cambios de contexto involuntarios
+        (expropiaciones) de cada hilo del emulador, de /proc/<pid>/task.
+        Debe llamarse antes de recoger el proceso con wait: después sus
+        contadores ya no existen.
+        """
+        pid = self.process.pid
+        for tid in thread_ids(pid):
+            try:
+                with open(f"/proc/{pid}/task/{tid}/stat") as stat:
+                    fields = stat.read().rsplit(')', 1)[1].split()
+                with open(f"/proc/{pid}/task/{tid}/status") as status:
+                    preempted = next(int(line.split()[1]) for line in status
+                                     if line.startswith('nonvoluntary_ctxt_switches:'))
+                cpu = (int(fields[11]) + int(fields[12])) / self.CLOCK_TICKS
+            except (OSError, IndexError, ValueError, StopIteration):
+                continue  # El hilo ya terminó
+            self.threads[tid] = (cpu, preempted)
+
+    def _detected(self, kind, detail, now):
+        self.incident = (kind, detail, now)
+        return kind
+
+    def report(self, steps):
+        """
+        Registra el incidente detectado y los pasos de stop_emulator en
+        EMULATOR_INCIDENT_LOG (un JSON por línea).
+        """
+        kind, detail, detected_at = self.incident
+        incident = {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'rom': self.process.args[-1],
+            'kind': kind,
+            'detail': detail,
+            'detected_after_s': round(detected_at - self.started, 3),
+            'steps_ms': {step: round(seconds * 1000, 1) for step, seconds in steps},
+        }
+        print(f"Incidente del emulador ({kind}): {detail}; pasos {incident['steps_ms']}")
+        try:
+            with open(EMULATOR_INCIDENT_LOG, 'a') as log:
+                log.write(json.dumps(incident) + "\n")
+        except OSError as e:
+            print(f"No se pudo registrar el incidente del emulador: {e}")
+
+def stop_emulator(emulator_process):
+    """
+    Cierra el emulador con terminate y, si no termina en
+    EMULATOR_TERMINATE_TIMEOUT segundos, con kill. Si tampoco termina en
+    EMULATOR_KILL_TIMEOUT segundos (espera no interrumpible) se abandona
+    para volver al menú. Retorna los pasos [(paso, segundos desde el inicio)].
+    """
+    start = time.monotonic()
+    steps = []
+    for step, send, timeout in (('terminate', emulator_process.terminate, EMULATOR_TERMINATE_TIMEOUT),
+                                ('kill', emulator_process.kill, EMULATOR_KILL_TIMEOUT)):
+        send()
+        steps.append((step, time.monotonic() - start))
+        try:
+            emulator_process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            continue
+        steps.append(('exited', time.monotonic() - start))
+        return steps
+    print(f"El emulador (pid {emulator_process.pid}) no terminó con kill; se abandona")
+    steps.append(('abandoned', time.monotonic() - start))
+    return steps
 
-def monitor_emulator(emulator_process, joystick):
+def monitor_emulator(emulator_process, joystick, watchdog):
     """
     Monitorea el estado del emulador durante la ejecución.
-    Detecta desconexión de controles o comando de apagado.
+    Detecta desconexión de controles, comando de apagado y cuelgues
+    (watchdog, un EmulatorWatchdog). Si se encuentra el nodo evdev del
+    control la espera ocurre en el kernel (ver supervise_emulator); si no,
+    en el bucle de eventos de pygame.
     """
     global EMULATOR_RUNNING
     if not emulator_process:
         return
+
+    device_path = find_controller_evdev(joystick)
+    if device_path is not None:
+        try:
+            reason = supervise_emulator(emulator_process, device_path, watchdog)
+        except OSError as e:
+            print(f"No se pudo vigilar el control en {device_path}: {e}")
+        else:
+            if reason == 'disconnect':
+                print("Control desconectado durante el juego")
+            watchdog.sample_threads()
+            if reason == 'exit':
+                emulator_process.wait()
+            elif watchdog.incident is not None:
+                watchdog.report(stop_emulator(emulator_process))
+            else:
+                stop_emulator(emulator_process)
+            LAUNCH_TIMER.emulator_exited(time.monotonic())
+            pygame.event.clear(EMULATOR_INPUT_EVENTS)
+            EMULATOR_RUNNING = False
+            return
+    
+    # Hilo que espera el fin del emulador (sin recogerlo hasta tomar la
+    # última muestra de sus hilos) y despierta al bucle de eventos
+    def wait_for_exit():
+        with contextlib.suppress(ChildProcessError, AttributeError):
+            os.waitid(os.P_PID, emulator_process.pid, os.WEXITED | os.WNOWAIT)
+        watchdog.sample_threads()
+        emulator_process.wait()
+        LAUNCH_TIMER.emulator_exited(time.monotonic())
+        post_event(EMULATOR_EXIT_EVENT)
+    Thread(target=wait_for_exit, daemon=True).start()
         
     while EMULATOR_RUNNING and emulator_process.poll() is None:
         # Verificar conexión del control
         if pygame.joystick.get_count() == 0:
             print("Control desconectado durante el juego")
-            emulator_process.terminate()
-            emulator_process.wait()
+            watchdog.sample_threads()
+            stop_emulator(emulator_process)
             EMULATOR_RUNNING = False
             return
             
         # Verificar comando de apagado (SELECT+START)
-        for event in pygame.event.get():
-            if event.type == pygame.JOYBUTTONDOWN:
-                if joystick.get_button(6) and joystick.get_button(7):
-                    emulator_process.terminate()
-                    emulator_process.wait()
-                    EMULATOR_RUNNING = False
-                    return
-        time.sleep(0.1)
+        for event in EVENT_LOOP.wait(watchdog.timeout()):
+            if event.type == INPUT_ACTION_EVENT and event.action == ACTION_SHUTDOWN_CHORD:
+                watchdog.sample_threads()
+                stop_emulator(emulator_process)
+                EMULATOR_RUNNING = False
+                return
+
+        # Verificar que el emulador no esté colgado
+        if watchdog.check() is not None:
+            watchdog.report(stop_emulator(emulator_process))
+            EMULATOR_RUNNING = False
+            return
 
 def show_mapping_control_screen(joystick, rom_extension):
     """
     Muestra la pantalla con los controles mapeados para el sistema emulado.
     Espera confirmación del usuario antes de continuar.
     Retorna False si el control se desconecta durante la espera.
+    Usa la ventana del menú sin volver a iniciar la pantalla.
     """
-    pygame.display.init()
-    screen = pygame.display.set_mode((640, 480), pygame.FULLSCREEN)
+    screen = pygame.display.get_surface()
+    if screen is None:
+        screen = pygame.display.set_mode((640, 480), pygame.FULLSCREEN)
     pygame.mouse.set_visible(False)
     
     try:
@@ -490,6 +2655,7 @@ def show_mapping_control_screen(joystick, rom_extension):
         mapping_img = pygame.image.load(image_path)
         
         screen.blit(mapping_img, (0, 0))
+        RetainedRenderer.invalidate_screen()
         pygame.display.update()
         
         # Esperar confirmación del usuario
@@ -498,21 +2664,17 @@ def show_mapping_control_screen(joystick, rom_extension):
             if pygame.joystick.get_count() == 0:
                 print("Control desconectado durante pantalla de controles")
                 waiting = False
-                pygame.display.quit()
                 return False
             
-            for event in pygame.event.get():
-                if event.type == pygame.JOYBUTTONDOWN and event.button == 0:
+            for event in EVENT_LOOP.wait():
+                if event.type == INPUT_ACTION_EVENT and event.action == ACTION_ACCEPT:
                     waiting = False
-            time.sleep(0.1)
             
         return True
         
     except Exception as e:
         print(f"Error mostrando pantalla de controles: {e}")
         return False
-    finally:
-        pygame.display.quit()
 
 # =============================================
 # SECCIÓN 3: MENÚS Y BÚSQUEDA
@@ -531,6 +2693,7 @@ def show_splash():
         # Cargar y mostrar imagen de splash
         splash = pygame.image.load(SPLASH_IMAGE)
         screen.blit(splash, (0, 0))
+        RetainedRenderer.invalidate_screen()
         pygame.display.update()
         
         # Reproducir sonido de inicio
@@ -544,129 +2707,519 @@ def show_splash():
     finally:
         pygame.display.quit()
 
+class CoverResolver:
+    """
+    Mapa en memoria de carátulas por consola.
+    Los directorios de carátulas se listan una sola vez (y de nuevo solo
+    cuando cambian); resolver la carátula de una ROM es una búsqueda en
+    diccionario sin llamadas al sistema. Se prefiere la carátula cuyo
+    nombre coincide exactamente con el de la ROM; si no existe se usa la
+    primera cuyo nombre contiene el nombre base de la ROM.
+    """
+    def __init__(self, covers_dir):
+        self.covers_dir = covers_dir
+        self._covers = {}       # consola -> [(nombre_minúsculas, ruta)]
+        self._exact = {}        # (consola, nombre_base) -> ruta
+        self._resolved = {}     # (consola, nombre_base) -> ruta o None
+        self._dir_mtimes = {}   # consola -> fecha de modificación del directorio
+        self._dirty = True
+        self._lock = Lock()
+
+    def refresh(self):
+        """Vuelve a listar los directorios de carátulas de cada consola."""
+        covers = {}
+        exact = {}
+        mtimes = {}
+        for console in set(CONSOLE_MAP.values()):
+            cover_dir = os.path.join(self.covers_dir, console)
+            entries = []
+            try:
+                mtimes[console] = os.stat(cover_dir).st_mtime_ns
+                for filename in os.listdir(cover_dir):
+                    filename_lower = filename.lower()
+                    stem, ext = os.path.splitext(filename_lower)
+                    if ext in COVER_EXTENSIONS:
+                        path = os.path.join(cover_dir, filename)
+                        entries.append((filename_lower, path))
+                        exact.setdefault((console, stem), path)
+            except OSError as e:
+                print(f"Error al buscar carátulas: {e}")
+            covers[console] = entries
+
+        with self._lock:
+            self._covers = covers
+            self._exact = exact
+            self._dir_mtimes = mtimes
+            self._resolved = {}
+            self._dirty = False
+
+        # Las carátulas que fallaron o ya se cargaron pueden haber cambiado
+        if COVER_PREFETCHER is not None:
+            COVER_PREFETCHER.forget()
+
+    def invalidate(self):
+        """Marca el mapa como desactualizado; se relista en el siguiente uso."""
+        self._dirty = True
+
+    def refresh_if_changed(self):
+        """Relista los directorios solo si su fecha de modificación cambió."""
+        for console, mtime in list(self._dir_mtimes.items()):
+            try:
+                if os.stat(os.path.join(self.covers_dir, console)).st_mtime_ns != mtime:
+                    self._dirty = True
+                    break
+            except OSError:
+                self._dirty = True
+                break
+        if self._dirty:
+            self.refresh()
+
+    def all_covers(self):
+        """Retorna la lista de rutas de todas las carátulas conocidas."""
+        if self._dirty:
+            self.refresh()
+        with self._lock:
+            return [path for entries in self._covers.values() for _, path in entries]
+
+    def resolve(self, game_name):
+        """Retorna la ruta de la carátula de la ROM o None si no tiene."""
+        console = CONSOLE_MAP.get(os.path.splitext(game_name)[1].lower())
+        if console is None:
+            return None
+        if self._dirty:
+            self.refresh()
+
+        key = (console, os.path.splitext(game_name)[0].lower())
+        with self._lock:
+            if key in self._resolved:
+                return self._resolved[key]
+            path = self._exact.get(key)
+            if path is None:
+                base_name = key[1]
+                for filename_lower, cover_path in self._covers.get(console, ()):
+                    if base_name in filename_lower:
+                        path = cover_path
+                        break
+            self._resolved[key] = path
+            return path
+
+def get_cover_resolver():
+    """Retorna el mapa global de carátulas, creándolo la primera vez."""
+    global COVER_RESOLVER
+    with COVER_RESOLVER_LOCK:
+        if COVER_RESOLVER is None:
+            resolver = CoverResolver(COVERS_DIR)
+            resolver.refresh()
+            COVER_RESOLVER = resolver
+    return COVER_RESOLVER
+
+def cover_thumbnail_path(cover_path, size):
+    """Ruta en disco de la miniatura de una carátula para un tamaño de recuadro."""
+    cover_dir, filename = os.path.split(cover_path)
+    return os.path.join(cover_dir, COVER_THUMBS_DIRNAME, f"{size[0]}x{size[1]}",
+                        os.path.splitext(filename)[0] + ".png")
+
+def load_cover_thumbnail(cover_path, size):
+    """
+    Carga la miniatura de una carátula ajustada al recuadro indicado.
+    Usa la miniatura guardada en disco si está al día; si no, decodifica
+    la imagen completa, la escala manteniendo proporciones y guarda la
+    miniatura para la próxima vez. Retorna la superficie o None.
+    """
+    thumb_path = cover_thumbnail_path(cover_path, size)
+    try:
+        if os.stat(thumb_path).st_mtime_ns >= os.stat(cover_path).st_mtime_ns:
+            return pygame.image.load(thumb_path)
+    except (OSError, pygame.error):
+        pass
+
+    try:
+        image = pygame.image.load(cover_path)
+    except (OSError, pygame.error) as e:
+        print(f"No se pudo cargar la carátula {cover_path}: {e}")
+        return None
+
+    # Escalar imagen manteniendo proporciones
+    img_ratio = min(size[0] / image.get_width(), size[1] / image.get_height())
+    new_size = (max(1, int(image.get_width() * img_ratio)),
+                max(1, int(image.get_height() * img_ratio)))
+    try:
+        thumbnail = pygame.transform.smoothscale(image, new_size)
+    except ValueError:
+        # smoothscale solo acepta superficies de 24 o 32 bits
+        thumbnail = pygame.transform.scale(image, new_size)
+
+    try:
+        os.makedirs(os.path.dirname(thumb_path), exist_ok=True)
+        pygame.image.save(thumbnail, thumb_path)
+    except (OSError, pygame.error) as e:
+        print(f"No se pudo guardar la miniatura {thumb_path}: {e}")
+    return thumbnail
+
+class CoverThumbnailCache:
+    """
+    Caché LRU de miniaturas ya convertidas al formato de la pantalla.
+    Se limita por memoria (bytes de píxeles) y descarta primero las
+    miniaturas usadas hace más tiempo.
+    """
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._surfaces = collections.OrderedDict()  # (ruta, tamaño) -> superficie
+        self._bytes = 0
+        self._lock = Lock()
+
+    @staticmethod
+    def _surface_bytes(surface):
+        return surface.get_width() * surface.get_height() * surface.get_bytesize()
+
+    def get(self, key):
+        """Retorna la superficie en caché (marcándola como reciente) o None."""
+        with self._lock:
+            surface = self._surfaces.get(key)
+            if surface is not None:
+                self._surfaces.move_to_end(key)
+            return surface
+
+    def put(self, key, surface):
+        """Convierte la superficie al formato de pantalla y la guarda en caché."""
+        try:
+            if surface.get_flags() & pygame.SRCALPHA:
+                surface = surface.convert_alpha()
+            else:
+                surface = surface.convert()
+        except pygame.error:
+            pass  # Sin modo de video activo: guardar sin convertir
+
+        with self._lock:
+            previous = self._surfaces.pop(key, None)
+            if previous is not None:
+                self._bytes -= self._surface_bytes(previous)
+            self._surfaces[key] = surface
+            self._bytes += self._surface_bytes(surface)
+            while self._bytes > self.max_bytes and len(self._surfaces) > 1:
+                _, evicted = self._surfaces.popitem(last=False)
+                self._bytes -= self._surface_bytes(evicted)
+        return surface
+
+def get_cover_cache():
+    """Retorna la caché global de miniaturas de carátulas."""
+    global COVER_CACHE
+    if COVER_CACHE is None:
+        COVER_CACHE = CoverThumbnailCache(COVER_CACHE_BYTES)
+    return COVER_CACHE
+
+class CoverPrefetcher:
+    """
+    Decodifica y escala miniaturas de carátulas en un grupo de hilos.
+    Cuando cambia la selección de una lista se encolan las carátulas de
+    las entradas siguientes en la dirección de desplazamiento (y unas
+    pocas en sentido contrario); las solicitudes que aún no empezaron y
+    ya no están en esa ventana se cancelan. El hilo de la interfaz solo
+    recoge los resultados que ya están listos.
+    """
+    def __init__(self, workers):
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="caratulas")
+        self._pending = {}                          # clave -> futuro
+        self._ready = collections.OrderedDict()     # clave -> superficie o None
+        self._failed = set()                        # claves que no se pudieron cargar
+        self._last = {}                             # tamaño -> (lista, selección, dirección)
+        self._generation = 0                        # aumenta con cada forget()
+        self._lock = Lock()
+
+    def forget(self):
+        """
+        Olvida las carátulas que fallaron y los resultados listos sin
+        recoger, para que se vuelvan a cargar tras un cambio en el
+        directorio de carátulas. Las cargas en curso se descartan.
+        """
+        with self._lock:
+            for future in self._pending.values():
+                future.cancel()
+            self._failed.clear()
+            self._ready.clear()
+            self._pending.clear()
+            self._generation += 1
+
+    def take(self, key):
+        """
+        Retira un resultado listo. Retorna (True, superficie) si ya se cargó
+        (superficie None si falló) o (False, None) si aún no está disponible.
+        """
+        with self._lock:
+            if key in self._failed:
+                return True, None
+            if key in self._ready:
+                return True, self._ready.pop(key)
+            return False, None
+
+    def request(self, keys):
+        """
+        Encola la carga de las claves (ruta de carátula, tamaño) en orden de
+        prioridad y cancela las pendientes que ya no se necesitan.
+        """
+        wanted = set(keys)
+        with self._lock:
+            for key, future in list(self._pending.items()):
+                if key not in wanted and future.cancel():
+                    del self._pending[key]
+            for key in keys:
+                if key in self._pending or key in self._ready or key in self._failed:
+                    continue
+                try:
+                    self._pending[key] = self._executor.submit(self._load, key, self._generation)
+                except RuntimeError:
+                    return  # El grupo de hilos ya se cerró
+
+    def _load(self, key, generation):
+        try:
+            surface = load_cover_thumbnail(*key)
+        except Exception as e:
+            print(f"Error precargando carátula {key[0]}: {e}")
+            surface = None
+        with self._lock:
+            if generation != self._generation:
+                return  # Se cargó antes de un forget()
+            self._pending.pop(key, None)
+            if surface is None:
+                self._failed.add(key)
+            else:
+                self._ready[key] = surface
+                while len(self._ready) > 4 * (COVER_PREFETCH_AHEAD + COVER_PREFETCH_BEHIND):
+                    self._ready.popitem(last=False)
+        post_event(COVER_READY_EVENT, key=key)
+
+    def follow(self, items, selected, size):
+        """
+        Precarga las carátulas alrededor de la selección de una lista de items
+        ('rom', nombre, ...). Solo trabaja cuando la selección cambió.
+        """
+        last_items, last_selected, direction = self._last.get(size, (None, None, 1))
+        if last_items is items and last_selected == selected:
+            return
+        if last_items is items and last_selected is not None and selected != last_selected:
+            direction = 1 if selected > last_selected else -1
+        self._last[size] = (items, selected, direction)
+
+        resolver = get_cover_resolver()
+        cache = get_cover_cache()
+        keys = []
+        offsets = [0]
+        offsets += [direction * i for i in range(1, COVER_PREFETCH_AHEAD + 1)]
+        offsets += [-direction * i for i in range(1, COVER_PREFETCH_BEHIND + 1)]
+        for offset in offsets:
+            index = selected + offset
+            if 0 <= index < len(items) and items[index][0] == 'rom':
+                cover_path = resolver.resolve(items[index][1])
+                if cover_path is not None and cache.get((cover_path, size)) is None:
+                    keys.append((cover_path, size))
+        self.request(keys)
+
+def get_cover_prefetcher():
+    """Retorna el precargador global de carátulas."""
+    global COVER_PREFETCHER
+    if COVER_PREFETCHER is None:
+        COVER_PREFETCHER = CoverPrefetcher(COVER_PREFETCH_WORKERS)
+    return COVER_PREFETCHER
+
+def get_cover_thumbnail(game_name, size):
+    """
+    Retorna la miniatura de la carátula de una ROM para un recuadro sin
+    bloquear el dibujado: consulta la caché en memoria y los resultados ya
+    precargados. Si la miniatura aún no está lista encarga su carga en
+    segundo plano y retorna COVER_PENDING. Retorna None si no tiene carátula.
+    """
+    cover_path = get_cover_resolver().resolve(game_name)
+    if cover_path is None:
+        return None
+    cache = get_cover_cache()
+    key = (cover_path, size)
+    surface = cache.get(key)
+    if surface is not None:
+        return surface
+
+    prefetcher = get_cover_prefetcher()
+    ready, thumbnail = prefetcher.take(key)
+    if ready:
+        return cache.put(key, thumbnail) if thumbnail is not None else None
+    prefetcher.request([key])
+    return COVER_PENDING
+
+def pregenerate_cover_thumbnails():
+    """
+    Genera en segundo plano las miniaturas en disco que falten para todas
+    las carátulas, de modo que el menú no tenga que decodificar imágenes
+    completas al desplazarse.
+    """
+    resolver = get_cover_resolver()
+    generated = 0
+    start = time.time()
+    for cover_path in resolver.all_covers():
+        for size in (MENU_COVER_SIZE, SEARCH_COVER_SIZE):
+            try:
+                thumb_mtime = os.stat(cover_thumbnail_path(cover_path, size)).st_mtime_ns
+                if thumb_mtime >= os.stat(cover_path).st_mtime_ns:
+                    continue
+            except OSError:
+                pass
+            if load_cover_thumbnail(cover_path, size) is not None:
+                generated += 1
+            # Ceder la CPU al hilo de la interfaz
+            time.sleep(0.005)
+    if generated:
+        print(f"Generadas {generated} miniaturas de carátulas en {time.time() - start:.1f}s")
+
+@profiled('load_game_cover')
 def load_game_cover(game_name):
     """
     Carga la imagen de portada para el juego especificado.
-    Busca en directorios organizados por consola.
+    La ruta se obtiene del mapa de carátulas precalculado.
     Retorna la imagen cargada o None si no se encuentra.
     """
-    base_name = os.path.splitext(game_name)[0].lower()
-    
-    # Mapeo de extensiones a consolas
-    console_map = {
-        '.gba': 'GBA',
-        '.nes': 'NES',
-        '.smc': 'SNES',
-        '.sfc': 'SNES'
-    }
-    
-    # Determinar consola según extensión
-    for ext, console in console_map.items():
-        if game_name.lower().endswith(ext):
-            cover_dir = f"/home/ccjpmmGaming/Retroconsole/covers/{console}"
-            break
-    else:
+    cover_path = get_cover_resolver().resolve(game_name)
+    if cover_path is None:
         return None
     
-    # Extensiones de imagen soportadas
-    extensions = ['.png', '.jpg', '.jpeg', '.webp']
-    
     try:
-        # Buscar archivo de carátula coincidente
-        for filename in os.listdir(cover_dir):
-            filename_lower = filename.lower()
-            
-            if base_name in filename_lower:
-                for ext in extensions:
-                    if filename_lower.endswith(ext):
-                        cover_path = os.path.join(cover_dir, filename)
-                        try:
-                            image = pygame.image.load(cover_path)
-                            return image
-                        except pygame.error as e:
-                            print(f"No se pudo cargar la carátula {cover_path}: {e}")
-                            return None
-    except Exception as e:
-        print(f"Error al buscar carátulas: {e}")
-    
-    return None
+        return pygame.image.load(cover_path)
+    except pygame.error as e:
+        print(f"No se pudo cargar la carátula {cover_path}: {e}")
+        return None
 
+@profiled('load_roms_and_folders')
 def load_roms_and_folders(current_path):
     """
     Carga el contenido del directorio actual, organizando ROMs por consola.
+    Consulta el catálogo persistente en lugar de recorrer el disco.
     Retorna lista de items y la ruta cargada.
     """
     items = []
-    console_map = {
-        '.gba': 'GBA',
-        '.nes': 'NES', 
-        '.smc': 'SNES',
-        '.sfc': 'SNES'
-    }
+    catalog = get_rom_catalog()
     
     # Vista especial para el directorio raíz
     if current_path == ROM_DIR:
-        roms_by_console = {}
-        
-        # Recorrer estructura de directorios
-        for root, dirs, files in os.walk(current_path):
-            for file in files:
-                # Clasificar ROMs por consola
-                for ext, console in console_map.items():
-                    if file.lower().endswith(ext):
-                        full_path = os.path.join(root, file)
-                        if console not in roms_by_console:
-                            roms_by_console[console] = []
-                        roms_by_console[console].append(('rom', file, full_path))
-                        break
-        
-        # Construir lista organizada por consola
-        for console in sorted(roms_by_console.keys()):
-            items.append(('console', console, None))
-            for rom in sorted(roms_by_console[console], key=lambda x: x[1]):
-                items.append(rom)
+        current_console = None
+        for name, full_path, console in catalog.list_root():
+            # Encabezado al cambiar de consola
+            if console != current_console:
+                current_console = console
+                items.append(('console', console, None))
+            items.append(('rom', name, full_path))
     else:
         # Vista normal para subdirectorios
-        try:
-            for item in sorted(os.listdir(current_path)):
-                full_path = os.path.join(current_path, item)
-                if os.path.isdir(full_path):
-                    items.append(('folder', item, full_path))
-                elif os.path.isfile(full_path) and item.lower().endswith((".smc", ".sfc", ".gba", ".nes")):
-                    items.append(('rom', item, full_path))
-        except Exception as e:
-            print(f"Error al cargar contenido de {current_path}: {e}")
-            return [], current_path
+        items = catalog.list_directory(current_path)
+        if items is None:
+            # Directorio aún no catalogado: listar directamente
+            items = []
+            try:
+                for item in sorted(os.listdir(current_path)):
+                    full_path = os.path.join(current_path, item)
+                    if os.path.isdir(full_path):
+                        items.append(('folder', item, full_path))
+                    elif os.path.isfile(full_path) and item.lower().endswith((".smc", ".sfc", ".gba", ".nes")):
+                        items.append(('rom', item, full_path))
+            except Exception as e:
+                print(f"Error al cargar contenido de {current_path}: {e}")
+                return [], current_path
     
     return items, current_path
 
+def build_menu_background(size):
+    """Fondo estático del menú principal: barras de título y de controles."""
+    return build_bars_background(size, "Controles del Menú", [
+        ("A : Seleccionar", COLOR_TEXT, (125, 430)),
+        ("↑/↓ : Navegar", COLOR_TEXT, (275, 430)),
+        ("← : Buscar", COLOR_TEXT, (425, 430)),
+        ("SELECT+START : Apagar", (255, 100, 100), (None, 460)),
+    ])
+
+MENU_RENDERER = RetainedRenderer(build_menu_background)
+
+def draw_cover_box(screen, cover_area, cover_image, font_size=24):
+    """Dibuja el recuadro de carátula con la miniatura, el marcador de carga o el aviso."""
+    # Fondo para carátula
+    cover_bg = pygame.Surface((cover_area.width, cover_area.height), pygame.SRCALPHA)
+    cover_bg.fill((30, 30, 30, 200))
+    screen.blit(cover_bg, cover_area.topleft)
+    
+    if cover_image is COVER_PENDING:
+        # Marcador mientras se carga en segundo plano
+        blit_centered_text(screen, "Cargando...", font_size, COLOR_TEXT, cover_area.center)
+    elif cover_image:
+        # Centrar imagen
+        pos_x = cover_area.x + (cover_area.width - cover_image.get_width()) // 2
+        pos_y = cover_area.y + (cover_area.height - cover_image.get_height()) // 2
+        screen.blit(cover_image, (pos_x, pos_y))
+    else:
+        # Mensaje si no hay carátula
+        blit_centered_text(screen, "Sin carátula", font_size, COLOR_TEXT, cover_area.center)
+    
+    # Borde para el área de carátula
+    pygame.draw.rect(screen, COLOR_HIGHLIGHT, cover_area, 2, border_radius=5)
+
+COPY_PROGRESS_AREA = pygame.Rect(0, 402, 640, 78)  # Sobre la barra de controles
+
+def draw_copy_progress(screen, summary, detail, fraction):
+    """Dibuja el panel de avance de la copia desde USB."""
+    pygame.draw.rect(screen, COLOR_SEARCH_BG, COPY_PROGRESS_AREA)
+    blit_text(screen, summary, 24, COLOR_HIGHLIGHT, (None, 410))
+    blit_text(screen, detail, 22, COLOR_TEXT, (None, 432))
+
+    bar = pygame.Rect(40, 456, 560, 14)
+    pygame.draw.rect(screen, COLOR_KEY, bar, border_radius=4)
+    if fraction > 0:
+        filled = bar.copy()
+        filled.width = max(1, int(bar.width * fraction))
+        pygame.draw.rect(screen, COLOR_SELECTED, filled, border_radius=4)
+    pygame.draw.rect(screen, COLOR_HIGHLIGHT, bar, 1, border_radius=4)
+
+def declare_copy_progress(renderer):
+    """
+    Declara el panel de avance de la copia desde USB mientras hay una en
+    curso; la interfaz sigue respondiendo debajo de él.
+    """
+    progress = COPY_PROGRESS.snapshot()
+    if progress is None:
+        return
+
+    megabyte = 1024 * 1024
+    summary = (f"Copiando ROMs desde USB: {progress['files_done']}/{progress['files_total']}  "
+               f"{progress['bytes_done'] / megabyte:.1f}/{progress['bytes_total'] / megabyte:.1f} MB  "
+               f"({progress['rate'] / megabyte:.1f} MB/s)")
+    if progress['current']:
+        percent = 100 * progress['current_done'] // max(1, progress['current_size'])
+        name = progress['current']
+        if len(name) > 48:
+            name = name[:45] + "..."
+        detail = f"{name}  {percent}%"
+    else:
+        detail = "Preparando copia..."
+    fraction = progress['bytes_done'] / max(1, progress['bytes_total'])
+    renderer.region('copy_progress', COPY_PROGRESS_AREA, (summary, detail, round(fraction, 3)),
+                    draw_copy_progress, summary, detail, fraction)
+
+@profiled('draw_menu')
 def draw_menu(screen, items, selected, current_path, game_state):
     """
     Renderiza la interfaz del menú principal.
     Incluye navegación, vista previa de carátulas y controles.
+    Solo redibuja lo que cambió desde el cuadro anterior y retorna la
+    lista de rectángulos modificados (vacía si no hubo cambios).
     """
-    font = pygame.font.Font(None, 24)
-    title_font = pygame.font.Font(None, 30)
-    controls_font = pygame.font.Font(None, 26)
-    console_font = pygame.font.Font(None, 28)
-    
-    screen.fill(COLOR_BG)
-    
-    # Área de título
-    title_area = pygame.Rect(0, 0, 640, 60)
-    pygame.draw.rect(screen, COLOR_SEARCH_BG, title_area)
-    pygame.draw.line(screen, COLOR_HIGHLIGHT, (0, title_area.height), (640, title_area.height), 2)
+    renderer = MENU_RENDERER
+    renderer.begin(screen)
+    list_area = pygame.Rect(0, 62, 640, 338)
     
     # Mostrar ruta actual
     rel_path = os.path.relpath(current_path, ROM_DIR)
     title_text = "Todas las ROMs" if rel_path == "." else f"Ubicación: {rel_path}"
-    title = title_font.render(title_text, True, COLOR_HIGHLIGHT)
-    screen.blit(title, (320 - title.get_width()//2, 20))
+    renderer.region('title', (0, 10, 640, 40), title_text,
+                    blit_text, title_text, 30, COLOR_HIGHLIGHT, (None, 20))
 
     # Mostrar mensaje si no hay items
     if not items:
-        no_results = font.render("No hay ROMs en esta carpeta", True, COLOR_TEXT)
-        screen.blit(no_results, (320 - no_results.get_width()//2, 150))
+        renderer.region('empty', (0, 140, 640, 40), None, blit_text,
+                        "No hay ROMs en esta carpeta", 24, COLOR_TEXT, (None, 150))
     else:
         # Asegurar que el seleccionado no sea un encabezado de consola
         while selected < len(items) and items[selected][0] == 'console':
@@ -684,75 +3237,125 @@ def draw_menu(screen, items, selected, current_path, game_state):
         start_idx = max(0, selected - (max_items_visible // 2))
         end_idx = min(len(items), start_idx + max_items_visible)
         
-        for idx in range(start_idx, end_idx):
+        for slot, idx in enumerate(range(start_idx, end_idx)):
             item_type, name, _ = items[idx]
             
             if item_type == 'console':
                 # Encabezado de consola
-                text = console_font.render(f"--- {name} ---", True, COLOR_HIGHLIGHT)
-                screen.blit(text, (50, y_pos))
+                text = f"--- {name} ---"
+                rect = pygame.Rect(50, y_pos, 590, console_header_height).clip(list_area)
+                renderer.region(('row', slot), rect, (text, 28, COLOR_HIGHLIGHT),
+                                blit_text, text, 28, COLOR_HIGHLIGHT, (50, y_pos))
                 y_pos += console_header_height
             else:
                 # Item normal (ROM o carpeta)
                 color = COLOR_SELECTED if idx == selected else COLOR_TEXT
                 prefix = "> " if idx == selected else "  "
-                text = font.render(f"{prefix}{name}", True, color)
-                screen.blit(text, (50, y_pos))
+                text = f"{prefix}{name}"
+                rect = pygame.Rect(50, y_pos, 590, item_height).clip(list_area)
+                renderer.region(('row', slot), rect, (text, 24, color),
+                                blit_text, text, 24, color, (50, y_pos))
                 y_pos += item_height
 
     # Mostrar carátula del juego seleccionado
     if items and selected < len(items) and items[selected][0] == 'rom':
-        cover_area = pygame.Rect(460, 70, 165, 150)
-        
-        # Fondo para carátula
-        cover_bg = pygame.Surface((cover_area.width, cover_area.height), pygame.SRCALPHA)
-        cover_bg.fill((30, 30, 30, 200))
-        screen.blit(cover_bg, cover_area.topleft)
-        
-        # Cargar y mostrar carátula
-        cover_image = load_game_cover(items[selected][1])
-        if cover_image:
-            # Escalar imagen manteniendo proporciones
-            img_ratio = min(cover_area.width/cover_image.get_width(), 
-                           cover_area.height/cover_image.get_height())
-            new_width = int(cover_image.get_width() * img_ratio)
-            new_height = int(cover_image.get_height() * img_ratio)
-            scaled_cover = pygame.transform.scale(cover_image, (new_width, new_height))
-            
-            # Centrar imagen
-            pos_x = cover_area.x + (cover_area.width - new_width) // 2
-            pos_y = cover_area.y + (cover_area.height - new_height) // 2
-            screen.blit(scaled_cover, (pos_x, pos_y))
-        else:
-            # Mensaje si no hay carátula
-            no_cover = font.render("Sin carátula", True, COLOR_TEXT)
-            screen.blit(no_cover, (cover_area.centerx - no_cover.get_width()//2, 
-                                 cover_area.centery - no_cover.get_height()//2))
-        
-        # Borde para el área de carátula
-        pygame.draw.rect(screen, COLOR_HIGHLIGHT, cover_area, 2, border_radius=5)
+        cover_area = pygame.Rect((460, 70), MENU_COVER_SIZE)
+        cover_image = get_cover_thumbnail(items[selected][1], MENU_COVER_SIZE)
+        get_cover_prefetcher().follow(items, selected, MENU_COVER_SIZE)
+        renderer.region('cover', cover_area, (items[selected][1], cover_image),
+                        draw_cover_box, cover_area, cover_image)
 
-    # Área de controles
-    controls_area = pygame.Rect(0, 400, 640, 80)
-    pygame.draw.rect(screen, COLOR_SEARCH_BG, controls_area)
-    pygame.draw.line(screen, COLOR_HIGHLIGHT, (0, controls_area.y), (640, controls_area.y), 2)
-    
-    # Instrucciones de controles
-    controls_title = controls_font.render("Controles del Menú", True, COLOR_HIGHLIGHT)
-    screen.blit(controls_title, (320 - controls_title.get_width()//2, controls_area.y + 10))
-    
-    a_text = controls_font.render("A : Seleccionar", True, COLOR_TEXT)
-    nav_text = controls_font.render("↑/↓ : Navegar", True, COLOR_TEXT)
-    search_text = controls_font.render("← : Buscar", True, COLOR_TEXT)
-    shutdown_text = controls_font.render("SELECT+START : Apagar", True, (255, 100, 100))
-
-    screen.blit(a_text, (125, controls_area.y + 30))
-    screen.blit(nav_text, (275, controls_area.y + 30))
-    screen.blit(search_text, (425, controls_area.y + 30))
-    
-    screen.blit(shutdown_text, (320 - shutdown_text.get_width()//2, controls_area.y + 60))
+    # Avance de la copia desde USB, si hay una en curso
+    declare_copy_progress(renderer)
+
+    return renderer.end()
+
+def _menu_sort_key(item, root_view):
+    """Clave de orden de un item del menú, igual a la usada por load_roms_and_folders."""
+    item_type, name, path = item
+    if not root_view:
+        return ('', name)
+    if item_type == 'console':
+        return (name, '')
+    console = CONSOLE_MAP.get(os.path.splitext(name)[1].lower(), '')
+    return (console, '\0' + name)
+
+def apply_library_change(items, change, game_state):
+    """
+    Aplica en sitio un cambio de la biblioteca a la lista de items del menú.
+    Mantiene el elemento seleccionado en game_state.selected.
+    Retorna True si es necesario recargar la lista completa.
+    """
+    action, kind, path, _ = change
+    if action == 'reload':
+        return True
+
+    current_path = game_state.current_path
+    root_view = current_path == ROM_DIR
+
+    # La carpeta actual (o una superior) desapareció
+    if action == 'remove' and kind == 'folder' and (
+            current_path == path or current_path.startswith(path.rstrip('/') + '/')):
+        return True
+
+    # Solo interesan cambios visibles en la vista actual
+    if root_view:
+        if kind != 'rom':
+            return False
+    elif os.path.dirname(path) != current_path:
+        return False
+
+    name = os.path.basename(path)
+    item = (kind, name, path)
+    key = _menu_sort_key(item, root_view)
+    # Claves precalculadas: bisect(key=...) no existe en Python 3.9 (Bullseye)
+    keys = [_menu_sort_key(it, root_view) for it in items]
+    index = bisect.bisect_left(keys, key)
+
+    # Buscar el item entre los que tienen el mismo nombre
+    found = None
+    probe = index
+    while probe < len(items) and keys[probe] == key:
+        if items[probe][2] == path:
+            found = probe
+            break
+        probe += 1
+
+    if action == 'add':
+        if found is not None:
+            return False
+        if root_view:
+            console = key[0]
+            header = ('console', console, None)
+            header_index = bisect.bisect_left(keys, (console, ''))
+            if header_index >= len(items) or items[header_index] != header:
+                items.insert(header_index, header)
+                if items and header_index <= game_state.selected and len(items) > 1:
+                    game_state.selected += 1
+                index += 1
+        items.insert(index, item)
+        if index <= game_state.selected and len(items) > 1:
+            game_state.selected += 1
+    elif action == 'remove':
+        if found is None:
+            return False
+        del items[found]
+        if found < game_state.selected:
+            game_state.selected -= 1
+        # Quitar el encabezado de consola si quedó vacío
+        if root_view and found > 0 and items[found - 1][0] == 'console' and (
+                found >= len(items) or items[found][0] == 'console'):
+            del items[found - 1]
+            if found - 1 < game_state.selected:
+                game_state.selected -= 1
 
-    return screen
+    # Mantener la selección dentro de rango y fuera de los encabezados
+    game_state.selected = min(max(game_state.selected, 0), max(len(items) - 1, 0))
+    while game_state.selected < len(items) - 1 and items[game_state.selected][0] == 'console':
+        game_state.selected += 1
+    while game_state.selected > 0 and items[game_state.selected][0] == 'console':
+        game_state.selected -= 1
+    return False
 
 def folder_menu(joystick, game_state):
     """
@@ -762,24 +3365,19 @@ def folder_menu(joystick, game_state):
     screen = pygame.display.set_mode((640, 480), pygame.FULLSCREEN)
     pygame.mouse.set_visible(False)
     
-    input_cooldown = 0.1
-    repeat_delay = 0.0
-    repeat_rate = 0.1
-    last_input_time = 0
-    last_hat = (0, 0)
-    
     reload_items = True
     
     while True:
         # Mostrar notificación de copia si es necesario
-        if game_state.show_copy_notification:
-            show_copy_confirmation(screen, game_state.copied_files)
-            game_state.show_copy_notification = False
-            reload_items = True
+        if not game_state.copy_summaries.empty():
+            show_copy_confirmation(screen, take_copy_summaries(game_state))
             
         # Recargar items si es necesario
         if reload_items:
             items, loaded_path = load_roms_and_folders(game_state.current_path)
+            if LIBRARY_WATCHER is None or not LIBRARY_WATCHER.active:
+                # Sin inotify: revisar si cambiaron las carátulas
+                get_cover_resolver().refresh_if_changed()
             
             if loaded_path != game_state.current_path:
                 print(f"Advertencia: Ruta cargada ({loaded_path}) no coincide con current_path ({game_state.current_path})")
@@ -798,68 +3396,74 @@ def folder_menu(joystick, game_state):
             
             reload_items = False
 
+        # Aplicar cambios de la biblioteca detectados en segundo plano
+        while not game_state.library_changes.empty():
+            change = game_state.library_changes.get_nowait()
+            if apply_library_change(items, change, game_state):
+                reload_items = True
+        if reload_items:
+            continue
+
         # Manejar caso de directorio vacío
         if not items:
-            font = pygame.font.Font(None, 32)
             screen.fill(COLOR_BG)
-            msg = font.render("No hay ROMs en esta carpeta", True, COLOR_TEXT)
+            msg = render_text("No hay ROMs en esta carpeta", 32, COLOR_TEXT)
             screen.blit(msg, (50, 50))
-            back_msg = font.render("Presiona B para volver", True, COLOR_TEXT)
+            back_msg = render_text("Presiona B para volver", 32, COLOR_TEXT)
             screen.blit(back_msg, (50, 90))
+            RetainedRenderer.invalidate_screen()
             pygame.display.update()
             
-            # Esperar acción del usuario
+            # Esperar acción del usuario o la llegada de nuevas ROMs
             waiting = True
             while waiting:
-                for event in pygame.event.get():
-                    if event.type == pygame.JOYBUTTONDOWN:
-                        if event.button == 1:  # Botón B
-                            if len(game_state.path_stack) > 1:
-                                game_state.current_path = game_state.path_stack.pop()
-                                reload_items = True
-                                waiting = False
-                            else:
-                                return
-                        elif event.button == 6 or event.button == 7:  # SELECT+START
-                            if joystick.get_button(6) and joystick.get_button(7):
-                                shutdown_raspberry()
-                time.sleep(0.1)
+                for event in EVENT_LOOP.wait():
+                    if event.type != INPUT_ACTION_EVENT:
+                        continue
+                    if event.action == ACTION_BACK:
+                        if len(game_state.path_stack) > 1:
+                            game_state.current_path = game_state.path_stack.pop()
+                            reload_items = True
+                            waiting = False
+                        else:
+                            return
+                    elif event.action == ACTION_SHUTDOWN_CHORD:
+                        shutdown_raspberry()
+                if not game_state.library_changes.empty():
+                    waiting = False
             continue
 
         # Dibujar menú y manejar entrada
-        draw_menu(screen, items, game_state.selected, game_state.current_path, game_state)
-        pygame.display.update()
+        dirty = draw_menu(screen, items, game_state.selected, game_state.current_path, game_state)
+        present_frame('folder_menu', dirty)
+        item = items[game_state.selected] if items else None
+        get_rom_prefetcher().hover(item[2] if item and item[0] == 'rom' else None)
         
-        for event in pygame.event.get():
-            if event.type == pygame.JOYHATMOTION:
-                hat = event.value
-                current_time = time.time()
+        # Esperar la siguiente entrada (o repetición del D-Pad) sin sondear
+        for event in EVENT_LOOP.wait():
+            if event.type == INPUT_ACTION_EVENT:
+                action = event.action
                 
-                # Manejar movimiento del D-Pad
-                if hat != (0, 0):
-                    if hat != last_hat or current_time - last_input_time > repeat_delay:
-                        if hat[1] == 1:  # Arriba
-                            game_state.selected = max(0, game_state.selected - 1)
-                            while game_state.selected > 0 and items[game_state.selected][0] == 'console':
-                                game_state.selected -= 1
-                        elif hat[1] == -1:  # Abajo
-                            game_state.selected = min(len(items) - 1, game_state.selected + 1)
-                            while game_state.selected < len(items) - 1 and items[game_state.selected][0] == 'console':
-                                game_state.selected += 1
-                        elif hat[0] == -1:  # Izquierda (activar búsqueda)
-                            game_state.search_active = True
-                            game_state.search_text = ""
-                            game_state.search_results = []
-                            handle_search_menu(game_state.joystick, game_state)
-                            screen = pygame.display.set_mode((640, 480), pygame.FULLSCREEN)
-                            pygame.mouse.set_visible(False)
-                            reload_items = True
-                        
-                        last_input_time = current_time
-                        last_hat = hat
-            
-            elif event.type == pygame.JOYBUTTONDOWN:
-                if event.button == 0:  # Botón A
+                # Manejar movimiento (las repeticiones aceleradas avanzan varios pasos)
+                if action == ACTION_UP:
+                    game_state.selected = max(0, game_state.selected - event.steps)
+                    while game_state.selected > 0 and items[game_state.selected][0] == 'console':
+                        game_state.selected -= 1
+                elif action == ACTION_DOWN:
+                    game_state.selected = min(len(items) - 1, game_state.selected + event.steps)
+                    while game_state.selected < len(items) - 1 and items[game_state.selected][0] == 'console':
+                        game_state.selected += 1
+                elif action == ACTION_LEFT and not event.repeat:  # Activar búsqueda
+                    game_state.search_active = True
+                    game_state.search_text = ""
+                    game_state.search_results = []
+                    handle_search_menu(game_state.joystick, game_state)
+                    screen = pygame.display.set_mode((640, 480), pygame.FULLSCREEN)
+                    pygame.mouse.set_visible(False)
+                    reload_items = True
+                    break
+                
+                elif action == ACTION_ACCEPT:
                     item = items[game_state.selected]
                     if item[0] != 'console':
                         # Guardar selección actual en el historial
@@ -870,209 +3474,227 @@ def folder_menu(joystick, game_state):
                             game_state.path_stack.append(game_state.current_path)
                             game_state.current_path = item[2]
                             reload_items = True
+                            break
                         elif item[0] == 'rom':
                             # Iniciar juego
                             launch_game(item[2], joystick)
                             screen = pygame.display.set_mode((640, 480), pygame.FULLSCREEN)
                             pygame.mouse.set_visible(False)
+                            break
                 
-                elif event.button == 1:  # Botón B
+                elif action == ACTION_BACK:
                     if len(game_state.path_stack) > 1:
                         # Volver al directorio anterior
                         game_state.selection_history[game_state.current_path] = game_state.selected
                         game_state.current_path = game_state.path_stack.pop()
                         reload_items = True
+                        break
                 
-                elif event.button == 6 or event.button == 7:  # SELECT o START
-                    if joystick.get_button(6) and joystick.get_button(7):
-                        shutdown_raspberry()
-        
-        # Verificar conexión del control
-        if pygame.joystick.get_count() == 0:
-            print("Control desconectado, esperando reconexión...")
-            joystick = show_connect_controller(require_button_press=False)
-            if joystick:
-                print("Control reconectado, continuando...")
-                reload_items = True
-        
-        time.sleep(0.01)
+                elif action == ACTION_SHUTDOWN_CHORD:
+                    shutdown_raspberry()
+            
+            # Verificar conexión del control
+            elif event.type == pygame.JOYDEVICEREMOVED and pygame.joystick.get_count() == 0:
+                print("Control desconectado, esperando reconexión...")
+                joystick = show_connect_controller(require_button_press=False)
+                if joystick:
+                    print("Control reconectado, continuando...")
+                    reload_items = True
+                break
 
-def search_roms(search_text, root_dir):
+@profiled('search_roms')
+def search_roms(search_text, root_dir, limit=SEARCH_RESULTS_LIMIT, budget=SEARCH_TIME_BUDGET):
     """
-    Busca ROMs en el sistema de archivos que coincidan con el texto.
-    Retorna lista de resultados organizados por consola.
+    Busca ROMs que coincidan con el texto usando el índice en memoria.
+    Tolera errores de escritura y ordena por relevancia; si el presupuesto
+    de tiempo se agota retorna los mejores resultados encontrados.
+    Solo incluye ROMs dentro de root_dir (el índice cubre ROM_DIR completo).
     """
-    results = []
-    search_lower = search_text.lower()
-    
-    # Mapeo de extensiones a consolas
-    console_map = {
-        '.gba': 'GBA',
-        '.nes': 'NES',
-        '.smc': 'SNES',
-        '.sfc': 'SNES'
-    }
-    
-    # Buscar recursivamente en el directorio raíz
-    for root, dirs, files in os.walk(root_dir):
-        for file in files:
-            file_lower = file.lower()
-            # Verificar extensiones compatibles y coincidencia en nombre
-            for ext in console_map.keys():
-                if file_lower.endswith(ext) and search_lower in file_lower:
-                    console = console_map[ext]
-                    results.append(('rom', file, os.path.join(root, file), console))
-                    break
-    
-    # Ordenar resultados por consola y nombre
-    results.sort(key=lambda x: (x[3], x[1]))
+    root = None if root_dir.rstrip('/') == ROM_DIR.rstrip('/') else root_dir.rstrip('/') + '/'
+    results, _ = get_search_index().rank(search_text, limit, budget, root)
     return results
 
+SEARCH_RESULTS_RENDERER = RetainedRenderer(build_bars_background)
+
+def draw_search_controls(screen, controls_area):
+    """Dibuja las instrucciones de la pantalla de resultados."""
+    blit_text(screen, "Controles de Búsqueda", 26, COLOR_HIGHLIGHT, (None, controls_area.y + 10))
+    blit_text(screen, "A : Seleccionar", 26, COLOR_TEXT, (100, controls_area.y + 30))
+    blit_text(screen, "B : Menú principal", 26, COLOR_TEXT, (250, controls_area.y + 30))
+    blit_text(screen, "↑/↓ : Navegar", 26, COLOR_TEXT, (420, controls_area.y + 30))
+    blit_text(screen, "SELECT+START : Apagar", 26, (255, 100, 100), (None, controls_area.y + 60))
+
+def draw_search_empty(screen):
+    """Dibuja el aviso de búsqueda sin resultados."""
+    blit_text(screen, "No se encontraron ROMs", 22, COLOR_TEXT, (None, 150))
+    blit_text(screen, "Presiona A para regresar al menu principal", 26, COLOR_HIGHLIGHT, (None, 200))
+
+def draw_search_result_row(screen, console, name, color, y_pos):
+    """Dibuja una fila de resultados: etiqueta de consola y nombre de la ROM."""
+    blit_text(screen, console, 22, COLOR_HIGHLIGHT, (50, y_pos))
+    blit_text(screen, f"  {name}", 22, color, (100, y_pos))
+
+@profiled('draw_search_results')
 def draw_search_results(screen, game_state):
     """
     Renderiza la pantalla de resultados de búsqueda.
     Muestra lista de juegos encontrados y vista previa de carátula.
+    Retorna los rectángulos modificados desde el cuadro anterior.
     """
-    font = pygame.font.Font(None, 22)
-    title_font = pygame.font.Font(None, 30)
-    controls_font = pygame.font.Font(None, 26)
-    console_font = pygame.font.Font(None, 28)
-    
-    screen.fill(COLOR_BG)
-    
-    # Área de título
-    title_area = pygame.Rect(0, 0, 640, 60)
-    pygame.draw.rect(screen, COLOR_SEARCH_BG, title_area)
-    pygame.draw.line(screen, COLOR_HIGHLIGHT, (0, title_area.height), 
-                    (640, title_area.height), 2)
+    renderer = SEARCH_RESULTS_RENDERER
+    renderer.begin(screen)
     
     # Mostrar texto de búsqueda
-    title = title_font.render(f"Resultados para: '{game_state.search_text}'", True, COLOR_HIGHLIGHT)
-    screen.blit(title, (320 - title.get_width()//2, 20))
-    
-    results_area = pygame.Rect(0, title_area.height, 640, 300)
+    title_text = f"Resultados para: '{game_state.search_text}'"
+    renderer.region('title', (0, 10, 640, 40), title_text,
+                    blit_text, title_text, 30, COLOR_HIGHLIGHT, (None, 20))
     
     # Manejar caso sin resultados
     if not game_state.search_results:
-        no_results = font.render("No se encontraron ROMs", True, COLOR_TEXT)
-        screen.blit(no_results, (320 - no_results.get_width()//2, 150))
-        
-        instruction = controls_font.render("Presiona A para regresar al menu principal", True, COLOR_HIGHLIGHT)
-        screen.blit(instruction, (320 - instruction.get_width()//2, 200))
+        renderer.region('empty', (0, 140, 640, 90), None, draw_search_empty)
     else:
-        # Mostrar lista de resultados
+        # Mostrar lista de resultados (ordenada por relevancia, con la consola de cada ROM)
         y_pos = 80
-        current_console = None
         start_idx = max(0, game_state.search_selected - 5)
-        end_idx = min(len(game_state.search_results), start_idx + 10)
+        end_idx = min(len(game_state.search_results), start_idx + 12)
         
-        for idx in range(start_idx, end_idx):
-            item = game_state.search_results[idx]
-            _, name, _, console = item
-            
-            # Encabezado de consola si cambió
-            if console != current_console:
-                current_console = console
-                console_header = console_font.render(f"--- {console} ---", True, COLOR_HIGHLIGHT)
-                screen.blit(console_header, (50, y_pos))
-                y_pos += 30
+        for slot, idx in enumerate(range(start_idx, end_idx)):
+            _, name, _, console = game_state.search_results[idx]
             
             # Item de resultado
             color = COLOR_SELECTED if idx == game_state.search_selected else COLOR_TEXT
-            text = font.render(f"  {name}", True, color)
-            screen.blit(text, (50, y_pos))
-            y_pos += 22
+            renderer.region(('row', slot), (50, y_pos, 590, 24), (console, name, color),
+                            draw_search_result_row, console, name, color, y_pos)
+            y_pos += 24
     
     # Mostrar carátula del resultado seleccionado
     if game_state.search_results and game_state.search_selected < len(game_state.search_results):
-        cover_area = pygame.Rect(400, 70, 200, 150)
-        
-        # Fondo para carátula
-        cover_bg = pygame.Surface((cover_area.width, cover_area.height), pygame.SRCALPHA)
-        cover_bg.fill((30, 30, 30, 200))
-        screen.blit(cover_bg, cover_area.topleft)
-        
-        # Cargar y mostrar carátula
-        selected_item = game_state.search_results[game_state.search_selected]
-        cover_image = load_game_cover(selected_item[1])
-        
-        if cover_image:
-            # Escalar manteniendo proporciones
-            img_ratio = min(cover_area.width/cover_image.get_width(), 
-                           cover_area.height/cover_image.get_height())
-            new_width = int(cover_image.get_width() * img_ratio)
-            new_height = int(cover_image.get_height() * img_ratio)
-            scaled_cover = pygame.transform.scale(cover_image, (new_width, new_height))
-            
-            # Centrar imagen
-            pos_x = cover_area.x + (cover_area.width - new_width) // 2
-            pos_y = cover_area.y + (cover_area.height - new_height) // 2
-            screen.blit(scaled_cover, (pos_x, pos_y))
-        else:
-            # Mensaje si no hay carátula
-            no_cover = font.render("Sin carátula", True, COLOR_TEXT)
-            screen.blit(no_cover, (cover_area.centerx - no_cover.get_width()//2, 
-                                 cover_area.centery - no_cover.get_height()//2))
-        
-        # Borde para el área de carátula
-        pygame.draw.rect(screen, COLOR_HIGHLIGHT, cover_area, 2, border_radius=5)
-    
-    # Área de controles
-    controls_area = pygame.Rect(0, 400, 640, 80)
-    pygame.draw.rect(screen, COLOR_SEARCH_BG, controls_area)
-    pygame.draw.line(screen, COLOR_HIGHLIGHT, (0, controls_area.y), 
-                    (640, controls_area.y), 2)
+        cover_area = pygame.Rect((400, 70), SEARCH_COVER_SIZE)
+        
+        # Mostrar miniatura de la carátula (ya escalada al recuadro)
+        selected_item = game_state.search_results[game_state.search_selected]
+        cover_image = get_cover_thumbnail(selected_item[1], SEARCH_COVER_SIZE)
+        get_cover_prefetcher().follow(game_state.search_results, game_state.search_selected,
+                                      SEARCH_COVER_SIZE)
+        renderer.region('cover', cover_area, (selected_item[1], cover_image),
+                        draw_cover_box, cover_area, cover_image, 22)
     
     # Mostrar instrucciones de controles si hay resultados
     if game_state.search_results:
-        controls_title = controls_font.render("Controles de Búsqueda", True, COLOR_HIGHLIGHT)
-        screen.blit(controls_title, (320 - controls_title.get_width()//2, controls_area.y + 10))
+        controls_area = pygame.Rect(0, 400, 640, 80)
+        renderer.region('controls', (0, 402, 640, 78), None,
+                        draw_search_controls, controls_area)
         
-        a_text = controls_font.render("A : Seleccionar", True, COLOR_TEXT)
-        b_text = controls_font.render("B : Menú principal", True, COLOR_TEXT)
-        nav_text = controls_font.render("↑/↓ : Navegar", True, COLOR_TEXT)
-        shutdown_text = controls_font.render("SELECT+START : Apagar", True, (255, 100, 100))
-
-        screen.blit(a_text, (100, controls_area.y + 30))
-        screen.blit(b_text, (250, controls_area.y + 30))
-        screen.blit(nav_text, (420, controls_area.y + 30))
+    # Avance de la copia desde USB, si hay una en curso
+    declare_copy_progress(renderer)
+
+    return renderer.end()
+
+def build_keyboard_background(size):
+    """Fondo estático del teclado virtual: advertencia, título e instrucciones."""
+    background = pygame.Surface(size)
+    background.fill(COLOR_BG)
+    
+    # Mostrar advertencia importante
+    blit_text(background, "Importante. Si no se detecta la pulsación de las flechas para moverse",
+              24, (255, 255, 0), (None, 10))
+    blit_text(background, "por el teclado, por favor desconecta y conecta el control.",
+              24, (255, 255, 0), (None, 35))
+    
+    # Título de la pantalla
+    blit_text(background, "BUSCAR ROMS", 30, COLOR_HIGHLIGHT, (None, 62))
+    
+    # Mostrar instrucciones de controles
+    instructions = [
+        ("START: Buscar", "B: Cancelar"),
+        ("A: Seleccionar tecla", "Y: Espacio"),
+        ("X: Borrar", "")
+    ]
+    
+    instruction_y = 380
+    for row in instructions:
+        if row[0]:
+            rendered1 = render_text(row[0], 22, COLOR_TEXT)
+            background.blit(rendered1, (220 - rendered1.get_width() // 2, instruction_y))
         
-        screen.blit(shutdown_text, (320 - shutdown_text.get_width()//2, controls_area.y + 60))
+        if row[1]:
+            rendered2 = render_text(row[1], 22, COLOR_TEXT)
+            background.blit(rendered2, (420 - rendered2.get_width() // 2, instruction_y))
         
-    pygame.display.update()
+        instruction_y += 30
+    return background
+
+SEARCH_KEYBOARD_RENDERER = RetainedRenderer(build_keyboard_background)
+
+def draw_search_box(screen, search_rect, display_text):
+    """Dibuja la caja de texto de búsqueda con el cursor."""
+    pygame.draw.rect(screen, COLOR_SEARCH_BG, search_rect, border_radius=5)
+    pygame.draw.rect(screen, COLOR_HIGHLIGHT, search_rect, 2, border_radius=5)
+    blit_text(screen, display_text + "|", 28, COLOR_TEXT, (search_rect.x + 10, search_rect.y + 10))
+
+def draw_live_results(screen, search_rect, search_text, live_results):
+    """Dibuja las coincidencias en vivo bajo la caja de búsqueda."""
+    y_pos = search_rect.bottom + 6
+    if not search_text:
+        blit_text(screen, "Escribe para ver coincidencias", 22, COLOR_SEARCH_HIGHLIGHT,
+                  (search_rect.x + 10, y_pos))
+    elif not live_results:
+        blit_text(screen, "Sin coincidencias", 22, COLOR_SEARCH_HIGHLIGHT,
+                  (search_rect.x + 10, y_pos))
+    else:
+        for _, name, _, console in live_results:
+            match_text = render_text(f"[{console}] {name}", 22, COLOR_TEXT)
+            screen.blit(match_text, (search_rect.x + 10, y_pos),
+                        pygame.Rect(0, 0, search_rect.width - 20, match_text.get_height()))
+            y_pos += 18
+
+def draw_keyboard_key(screen, key, key_rect, is_selected):
+    """Dibuja una tecla del teclado virtual."""
+    key_color = COLOR_SEARCH_HIGHLIGHT if is_selected else COLOR_KEY
+    pygame.draw.rect(screen, key_color, key_rect, border_radius=4)
+    pygame.draw.rect(screen, COLOR_TEXT, key_rect, 2 if is_selected else 1, border_radius=4)
+    
+    # Dibujar texto de la tecla
+    if key == 'SPACE':
+        key_text = render_text("SPACE", 22, COLOR_TEXT)
+    elif key == 'DEL':
+        key_text = render_text("DEL", 22, COLOR_TEXT)
+    else:
+        key_text = render_text(key, 28, COLOR_TEXT)
+    
+    screen.blit(key_text, (key_rect.centerx - key_text.get_width() // 2, 
+                        key_rect.centery - key_text.get_height() // 2))
 
+@profiled('show_search_keyboard')
 def show_search_keyboard(screen, game_state):
     """
     Muestra el teclado virtual para ingresar texto de búsqueda.
-    Retorna lista de teclas renderizadas (no utilizada en esta implementación).
+    Solo redibuja las zonas que cambiaron y retorna sus rectángulos.
     """
-    font = pygame.font.Font(None, 28)
-    small_font = pygame.font.Font(None, 22)
-    title_font = pygame.font.Font(None, 30)
-    warning_font = pygame.font.Font(None, 24)
-    
-    screen.fill(COLOR_BG)
-    
-    # Mostrar advertencia importante
-    line1 = warning_font.render("Importante. Si no se detecta la pulsación de las flechas para moverse", True, (255, 255, 0))
-    line2 = warning_font.render("por el teclado, por favor desconecta y conecta el control.", True, (255, 255, 0))
-    
-    screen.blit(line1, (320 - line1.get_width() // 2, 10))
-    screen.blit(line2, (320 - line2.get_width() // 2, 35))
-    
-    # Título de la pantalla
-    title = title_font.render("BUSCAR ROMS", True, COLOR_HIGHLIGHT)
-    screen.blit(title, (320 - title.get_width() // 2, 70))
+    renderer = SEARCH_KEYBOARD_RENDERER
+    renderer.begin(screen)
     
     # Área de texto de búsqueda
-    search_rect = pygame.Rect(40, 110, 560, 50)
-    pygame.draw.rect(screen, COLOR_SEARCH_BG, search_rect, border_radius=5)
-    pygame.draw.rect(screen, COLOR_HIGHLIGHT, search_rect, 2, border_radius=5)
+    search_rect = pygame.Rect(40, 88, 560, 40)
     
     # Mostrar texto ingresado (últimos 20 caracteres si es muy largo)
     display_text = game_state.search_text[-20:] if len(game_state.search_text) > 20 else game_state.search_text
-    text_surface = font.render(display_text + "|", True, COLOR_TEXT)
-    screen.blit(text_surface, (search_rect.x + 10, search_rect.y + 10))
+    renderer.region('search_box', search_rect, display_text,
+                    draw_search_box, search_rect, display_text)
+    
+    # Coincidencias en vivo (se recalculan solo si cambió el texto)
+    if game_state.live_query != game_state.search_text:
+        game_state.live_query = game_state.search_text
+        game_state.live_results = (search_roms(game_state.search_text, ROM_DIR, LIVE_RESULTS_LIMIT,
+                                               LIVE_SEARCH_TIME_BUDGET)
+                                   if game_state.search_text else [])
+    
+    live_area = pygame.Rect(search_rect.x, search_rect.bottom + 2, search_rect.width,
+                            LIVE_RESULTS_LIMIT * 18 + 8)
+    live_key = (bool(game_state.search_text),
+                tuple((name, console) for _, name, _, console in game_state.live_results))
+    renderer.region('live_results', live_area, live_key, draw_live_results,
+                    search_rect, game_state.search_text, game_state.live_results)
     
     # Configurar distribución del teclado
     game_state.keyboard_layout = [
@@ -1086,7 +3708,7 @@ def show_search_keyboard(screen, game_state):
     key_width = 34
     key_height = 34
     key_margin = 6
-    start_y = 180
+    start_y = 214
     
     for row_idx, row in enumerate(game_state.keyboard_layout):
         # Calcular ancho total de la fila para centrarla
@@ -1116,41 +3738,13 @@ def show_search_keyboard(screen, game_state):
             
             # Resaltar tecla seleccionada
             is_selected = (row_idx, col_idx) == game_state.keyboard_selected
-            key_color = COLOR_SEARCH_HIGHLIGHT if is_selected else COLOR_KEY
-            pygame.draw.rect(screen, key_color, key_rect, border_radius=4)
-            pygame.draw.rect(screen, COLOR_TEXT, key_rect, 2 if is_selected else 1, border_radius=4)
-            
-            # Dibujar texto de la tecla
-            if key == 'SPACE':
-                key_text = small_font.render("SPACE", True, COLOR_TEXT)
-            elif key == 'DEL':
-                key_text = small_font.render("DEL", True, COLOR_TEXT)
-            else:
-                key_text = font.render(key, True, COLOR_TEXT)
-            
-            screen.blit(key_text, (key_rect.centerx - key_text.get_width() // 2, 
-                                key_rect.centery - key_text.get_height() // 2))
-    
-    # Mostrar instrucciones de controles
-    instructions = [
-        ("START: Buscar", "B: Cancelar"),
-        ("A: Seleccionar tecla", "Y: Espacio"),
-        ("X: Borrar", "")
-    ]
-    
-    instruction_y = 380
-    for row in instructions:
-        if row[0]:
-            rendered1 = small_font.render(row[0], True, COLOR_TEXT)
-            screen.blit(rendered1, (220 - rendered1.get_width() // 2, instruction_y))
-        
-        if row[1]:
-            rendered2 = small_font.render(row[1], True, COLOR_TEXT)
-            screen.blit(rendered2, (420 - rendered2.get_width() // 2, instruction_y))
-        
-        instruction_y += 30
+            renderer.region(('key', row_idx, col_idx), key_rect, (key, is_selected),
+                            draw_keyboard_key, key, key_rect, is_selected)
     
-    return []
+    # Avance de la copia desde USB, si hay una en curso
+    declare_copy_progress(renderer)
+
+    return renderer.end()
 
 def handle_search_menu(joystick, game_state):
     """
@@ -1161,118 +3755,90 @@ def handle_search_menu(joystick, game_state):
     pygame.mouse.set_visible(False)
     
     game_state.keyboard_selected = (0, 0)
-    input_cooldown = 0.1
-    last_input_time = 0
-    last_hat = (0, 0)
-    repeat_delay = 0.3
-    repeat_rate = 0.1
     
     while game_state.search_active:
         # Mostrar notificación de copia si es necesario
-        if game_state.show_copy_notification:
-            show_copy_confirmation(screen, game_state.copied_files)
-            game_state.show_copy_notification = False
-            show_search_keyboard(screen, game_state)
-            pygame.display.update()
+        if not game_state.copy_summaries.empty():
+            show_copy_confirmation(screen, take_copy_summaries(game_state))
 
-        # Verificar conexión del control
-        if pygame.joystick.get_count() == 0:
-            print("Control desconectado en teclado virtual, esperando reconexión...")
-            joystick = show_connect_controller(require_button_press=False)
-            if joystick:
-                print("Control reconectado, continuando en teclado virtual...")
-                game_state.joystick = joystick
-                continue
-
-        current_time = time.time()
-        key_buttons = show_search_keyboard(screen, game_state)
-        
-        # Manejar entrada del D-Pad
-        hat = joystick.get_hat(0)
-        
-        if hat != (0, 0):
-            if hat != last_hat:
-                last_input_time = current_time
-                last_hat = hat
-                should_move = True
-            else:
-                if current_time - last_input_time > repeat_delay:
-                    if current_time - last_input_time > repeat_delay + repeat_rate:
-                        last_input_time = current_time - repeat_rate
-                    should_move = True
-                else:
-                    should_move = False
-        else:
-            last_hat = hat
-            should_move = False
+        dirty = show_search_keyboard(screen, game_state)
+        present_frame('handle_search_menu', dirty)
         
-        # Mover selección del teclado según D-Pad
-        if should_move:
-            row, col = game_state.keyboard_selected
+        for event in EVENT_LOOP.wait():
+            # Verificar conexión del control
+            if event.type == pygame.JOYDEVICEREMOVED and pygame.joystick.get_count() == 0:
+                print("Control desconectado en teclado virtual, esperando reconexión...")
+                joystick = show_connect_controller(require_button_press=False)
+                if joystick:
+                    print("Control reconectado, continuando en teclado virtual...")
+                    game_state.joystick = joystick
+                break
             
-            if hat[0] == 1:  # Derecha
-                if col < len(game_state.keyboard_layout[row]) - 1:
-                    col += 1
-                else:
-                    if row < len(game_state.keyboard_layout) - 1:
-                        row += 1
-                        col = 0
-            elif hat[0] == -1:  # Izquierda
-                if col > 0:
-                    col -= 1
-                else:
+            elif event.type != INPUT_ACTION_EVENT:
+                continue
+            
+            # Mover selección del teclado según la dirección
+            action = event.action
+            if action in (ACTION_UP, ACTION_DOWN, ACTION_LEFT, ACTION_RIGHT):
+                row, col = game_state.keyboard_selected
+                
+                if action == ACTION_RIGHT:
+                    if col < len(game_state.keyboard_layout[row]) - 1:
+                        col += 1
+                    else:
+                        if row < len(game_state.keyboard_layout) - 1:
+                            row += 1
+                            col = 0
+                elif action == ACTION_LEFT:
+                    if col > 0:
+                        col -= 1
+                    else:
+                        if row > 0:
+                            row -= 1
+                            col = len(game_state.keyboard_layout[row]) - 1
+                elif action == ACTION_UP:
                     if row > 0:
                         row -= 1
-                        col = len(game_state.keyboard_layout[row]) - 1
-            elif hat[1] == 1:  # Arriba
-                if row > 0:
-                    row -= 1
-                    col = min(col, len(game_state.keyboard_layout[row]) - 1)
-            elif hat[1] == -1:  # Abajo
-                if row < len(game_state.keyboard_layout) - 1:
-                    row += 1
-                    col = min(col, len(game_state.keyboard_layout[row]) - 1)
-            
-            if (row, col) != game_state.keyboard_selected:
+                        col = min(col, len(game_state.keyboard_layout[row]) - 1)
+                elif action == ACTION_DOWN:
+                    if row < len(game_state.keyboard_layout) - 1:
+                        row += 1
+                        col = min(col, len(game_state.keyboard_layout[row]) - 1)
+                
                 game_state.keyboard_selected = (row, col)
-                last_input_time = current_time
-        
-        # Manejar eventos de botones
-        for event in pygame.event.get():
-            if event.type == pygame.JOYBUTTONDOWN:
-                if event.button == 0:  # Botón A
-                    row, col = game_state.keyboard_selected
-                    key = game_state.keyboard_layout[row][col]
-                    
-                    # Manejar teclas especiales
-                    if key == 'SPACE':
-                        game_state.search_text += ' '
-                    elif key == 'DEL':
-                        game_state.search_text = game_state.search_text[:-1]
-                    else:
-                        game_state.search_text += key.lower()
+            
+            # Manejar botones
+            elif action == ACTION_ACCEPT:
+                row, col = game_state.keyboard_selected
+                key = game_state.keyboard_layout[row][col]
                 
-                elif event.button == 3:  # Botón Y (Espacio alternativo)
+                # Manejar teclas especiales
+                if key == 'SPACE':
                     game_state.search_text += ' '
-                
-                elif event.button == 2:  # Botón X (Borrar alternativo)
+                elif key == 'DEL':
                     game_state.search_text = game_state.search_text[:-1]
-                
-                elif event.button == 1:  # Botón B (Cancelar)
-                    game_state.search_active = False
-                    return
-                
-                elif event.button == 7:  # Botón START (Buscar)
-                    if game_state.search_text:
-                        # Realizar búsqueda y mostrar resultados
-                        game_state.search_results = search_roms(game_state.search_text, ROM_DIR)
-                        game_state.search_selected = 0
-                        show_search_results_menu(joystick, game_state)
-                        screen = pygame.display.set_mode((640, 480), pygame.FULLSCREEN)
-                        pygame.mouse.set_visible(False)
-        
-        pygame.display.update()
-        time.sleep(0.01)
+                else:
+                    game_state.search_text += key.lower()
+            
+            elif action == ACTION_SPACE:  # Botón Y (Espacio alternativo)
+                game_state.search_text += ' '
+            
+            elif action == ACTION_ERASE:  # Botón X (Borrar alternativo)
+                game_state.search_text = game_state.search_text[:-1]
+            
+            elif action == ACTION_BACK:  # Botón B (Cancelar)
+                game_state.search_active = False
+                return
+            
+            elif action == ACTION_START:  # Botón START (Buscar)
+                if game_state.search_text:
+                    # Realizar búsqueda y mostrar resultados
+                    game_state.search_results = search_roms(game_state.search_text, ROM_DIR)
+                    game_state.search_selected = 0
+                    show_search_results_menu(joystick, game_state)
+                    screen = pygame.display.set_mode((640, 480), pygame.FULLSCREEN)
+                    pygame.mouse.set_visible(False)
+                    break
 
 def show_search_results_menu(joystick, game_state):
     """
@@ -1282,96 +3848,887 @@ def show_search_results_menu(joystick, game_state):
     screen = pygame.display.set_mode((640, 480), pygame.FULLSCREEN)
     pygame.mouse.set_visible(False)
     
-    input_cooldown = 0.1
-    repeat_delay = 0.3
-    repeat_rate = 0.1
-    last_input_time = 0
-    last_hat = (0, 0)
-    
     while game_state.search_active:
         # Mostrar notificación de copia si es necesario
-        if game_state.show_copy_notification:
-            show_copy_confirmation(screen, game_state.copied_files)
-            game_state.show_copy_notification = False
-            draw_search_results(screen, game_state)
-            pygame.display.update()
-            
-        # Verificar conexión del control
-        if pygame.joystick.get_count() == 0:
-            print("Control desconectado en resultados de búsqueda, esperando reconexión...")
-            joystick = show_connect_controller(require_button_press=False)
-            if joystick:
-                print("Control reconectado, continuando en resultados...")
-                game_state.joystick = joystick
-                draw_search_results(screen, game_state)
-                pygame.display.update()
-                continue
+        if not game_state.copy_summaries.empty():
+            show_copy_confirmation(screen, take_copy_summaries(game_state))
 
-        current_time = time.time()
-        draw_search_results(screen, game_state)
+        dirty = draw_search_results(screen, game_state)
+        present_frame('show_search_results_menu', dirty)
+        if game_state.search_results:
+            get_rom_prefetcher().hover(game_state.search_results[game_state.search_selected][2])
         
-        # Manejar caso sin resultados
-        if not game_state.search_results:
-            for event in pygame.event.get():
-                if event.type == pygame.JOYBUTTONDOWN and event.button == 0:
+        for event in EVENT_LOOP.wait():
+            # Verificar conexión del control
+            if event.type == pygame.JOYDEVICEREMOVED and pygame.joystick.get_count() == 0:
+                print("Control desconectado en resultados de búsqueda, esperando reconexión...")
+                joystick = show_connect_controller(require_button_press=False)
+                if joystick:
+                    print("Control reconectado, continuando en resultados...")
+                    game_state.joystick = joystick
+                break
+            
+            if event.type != INPUT_ACTION_EVENT:
+                continue
+            action = event.action
+            
+            # Manejar caso sin resultados
+            if not game_state.search_results:
+                if action == ACTION_ACCEPT:
                     game_state.search_active = False
                     return
-            pygame.display.update()
-            time.sleep(0.01)
-            continue
-        
-        # Manejar entrada del D-Pad
-        hat = joystick.get_hat(0)
-        
-        if hat != (0, 0):
-            if hat != last_hat:
-                last_input_time = current_time
-                last_hat = hat
-                should_move = True
-            else:
-                if current_time - last_input_time > repeat_delay:
-                    if current_time - last_input_time > repeat_delay + repeat_rate:
-                        last_input_time = current_time - repeat_rate
-                    should_move = True
-                else:
-                    should_move = False
-        else:
-            last_hat = hat
-            should_move = False
-        
-        # Mover selección en resultados
-        if should_move:
-            if hat[1] == 1:  # Arriba
-                game_state.search_selected = max(0, game_state.search_selected - 1)
-                last_input_time = current_time
-            elif hat[1] == -1:  # Abajo
+                continue
+            
+            # Mover selección en resultados (las repeticiones aceleradas avanzan varios pasos)
+            if action == ACTION_UP:
+                game_state.search_selected = max(0, game_state.search_selected - event.steps)
+            elif action == ACTION_DOWN:
                 game_state.search_selected = min(len(game_state.search_results) - 1, 
-                                               game_state.search_selected + 1)
-                last_input_time = current_time
-        
-        # Manejar eventos de botones
-        for event in pygame.event.get():
-            if event.type == pygame.JOYBUTTONDOWN:
-                if event.button == 0:  # Botón A (Seleccionar)
-                    if game_state.search_results:
-                        selected_rom = game_state.search_results[game_state.search_selected]
-                        _, ext = os.path.splitext(selected_rom[2])
-                        launch_game(selected_rom[2], joystick)
-                        screen = pygame.display.set_mode((640, 480), pygame.FULLSCREEN)
-                        pygame.mouse.set_visible(False)
-                        game_state.search_active = False
-                        return
-                
-                elif event.button == 1:  # Botón B (Volver)
-                    game_state.search_active = False
-                    return
+                                               game_state.search_selected + event.steps)
+            
+            # Manejar botones
+            elif action == ACTION_ACCEPT:  # Botón A (Seleccionar)
+                selected_rom = game_state.search_results[game_state.search_selected]
+                _, ext = os.path.splitext(selected_rom[2])
+                launch_game(selected_rom[2], joystick)
+                screen = pygame.display.set_mode((640, 480), pygame.FULLSCREEN)
+                pygame.mouse.set_visible(False)
+                game_state.search_active = False
+                return
+            
+            elif action == ACTION_BACK:  # Botón B (Volver)
+                game_state.search_active = False
+                return
 
-                elif event.button == 6 or event.button == 7:  # SELECT+START (Apagar)
-                    if joystick.get_button(6) and joystick.get_button(7):
-                        shutdown_raspberry()
-        
-        pygame.display.update()
-        time.sleep(0.01)
+            elif action == ACTION_SHUTDOWN_CHORD:  # SELECT+START (Apagar)
+                shutdown_raspberry()
+
+# =============================================
+# SECCIÓN 4: CATÁLOGO PERSISTENTE DE ROMS
+# =============================================
+
+class RomCatalog:
+    """
+    Catálogo de ROMs persistido en SQLite, indexado por ruta.
+    Guarda consola, tamaño y fecha de modificación de cada ROM, además de
+    la fecha de modificación de cada directorio para revalidar el catálogo
+    de forma incremental sin recorrer todo el árbol de ROMs.
+    También guarda el CRC32 y el SHA-1 del contenido de las ROMs junto con
+    el tamaño y la fecha con que se calcularon, para reconocer ROMs
+    repetidas sin importar su nombre y sin volver a leer las que no cambiaron.
+    """
+    def __init__(self, db_path, root_dir):
+        self.root_dir = root_dir
+        self._lock = Lock()
+        self._conn = self._open(db_path)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS dirs ("
+                "path TEXT PRIMARY KEY, parent TEXT, mtime INTEGER)")
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS dirs_parent ON dirs(parent)")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS roms ("
+                "path TEXT PRIMARY KEY, dir TEXT, name TEXT, console TEXT, "
+                "size INTEGER, mtime INTEGER)")
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS roms_dir ON roms(dir)")
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS roms_console_name ON roms(console, name)")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS hashes ("
+                "path TEXT PRIMARY KEY, size INTEGER, mtime INTEGER, "
+                "crc32 INTEGER, sha1 TEXT)")
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS roms_size ON roms(size)")
+
+    def _open(self, db_path):
+        """Abre la base de datos; si no es posible usa una en memoria."""
+        try:
+            db_dir = os.path.dirname(db_path)
+            if db_dir and not os.path.exists(db_dir):
+                os.makedirs(db_dir)
+            conn = sqlite3.connect(db_path, check_same_thread=False)
+            # WAL reduce las escrituras sincronas sobre la tarjeta SD
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            return conn
+        except (OSError, sqlite3.Error) as e:
+            print(f"No se pudo abrir el catálogo {db_path}, usando memoria: {e}")
+            return sqlite3.connect(":memory:", check_same_thread=False)
+
+    def refresh(self):
+        """
+        Revalida el catálogo contra el sistema de archivos.
+        Solo se vuelven a listar los directorios cuya fecha de modificación
+        cambió; el resto se recorre usando la información guardada.
+        """
+        start = time.time()
+        rescanned = 0
+        with self._lock, self._conn:
+            known = {}
+            children = {}
+            for path, parent, mtime in self._conn.execute(
+                    "SELECT path, parent, mtime FROM dirs"):
+                known[path] = mtime
+                children.setdefault(parent, []).append(path)
+
+            seen = set()
+            pending = [(self.root_dir, None)]
+            while pending:
+                path, parent = pending.pop()
+                try:
+                    mtime = os.stat(path).st_mtime_ns
+                except OSError:
+                    continue
+                seen.add(path)
+
+                if known.get(path) == mtime:
+                    # Directorio sin cambios: reutilizar subdirectorios conocidos
+                    pending.extend((child, path) for child in children.get(path, []))
+                    continue
+
+                rescanned += 1
+                subdirs = self._rescan_dir(path, parent, mtime)
+                pending.extend((child, path) for child in subdirs)
+
+            # Eliminar directorios que ya no existen
+            for path in set(known) - seen:
+                self._conn.execute("DELETE FROM dirs WHERE path = ?", (path,))
+                self._conn.execute("DELETE FROM roms WHERE dir = ?", (path,))
+
+            # Olvidar los hashes de ROMs que ya no están en el catálogo
+            if rescanned:
+                self._conn.execute(
+                    "DELETE FROM hashes WHERE path NOT IN (SELECT path FROM roms)")
+
+        print(f"Catálogo revalidado en {time.time() - start:.2f}s "
+              f"({rescanned} directorios actualizados)")
+
+    def _rescan_dir(self, path, parent, mtime):
+        """
+        Vuelve a listar un directorio y actualiza sus ROMs en el catálogo.
+        Retorna la lista de subdirectorios encontrados.
+        """
+        subdirs = []
+        roms = []
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            subdirs.append(entry.path)
+                            continue
+                        console = CONSOLE_MAP.get(os.path.splitext(entry.name)[1].lower())
+                        if console and entry.is_file():
+                            st = entry.stat()
+                            roms.append((entry.path, path, entry.name, console,
+                                         st.st_size, st.st_mtime_ns))
+                    except OSError:
+                        continue
+        except OSError as e:
+            print(f"Error al listar {path}: {e}")
+            return []
+
+        self._conn.execute(
+            "INSERT OR REPLACE INTO dirs (path, parent, mtime) VALUES (?, ?, ?)",
+            (path, parent, mtime))
+        self._conn.execute("DELETE FROM roms WHERE dir = ?", (path,))
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO roms (path, dir, name, console, size, mtime) "
+            "VALUES (?, ?, ?, ?, ?, ?)", roms)
+        return subdirs
+
+    def list_root(self):
+        """Retorna todas las ROMs como (nombre, ruta, consola) ordenadas por consola y nombre."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT name, path, console FROM roms ORDER BY console, name").fetchall()
+
+    def list_directory(self, path):
+        """
+        Retorna el contenido de un directorio como lista de items
+        ('folder'|'rom', nombre, ruta) ordenada por nombre.
+        Retorna None si el directorio no está en el catálogo.
+        """
+        with self._lock:
+            if self._conn.execute(
+                    "SELECT 1 FROM dirs WHERE path = ?", (path,)).fetchone() is None:
+                return None
+            folders = self._conn.execute(
+                "SELECT path FROM dirs WHERE parent = ?", (path,)).fetchall()
+            roms = self._conn.execute(
+                "SELECT name, path FROM roms WHERE dir = ?", (path,)).fetchall()
+
+        items = [('folder', os.path.basename(p), p) for (p,) in folders]
+        items.extend(('rom', name, p) for name, p in roms)
+        items.sort(key=lambda x: x[1])
+        return items
+
+    def add_rom(self, path):
+        """
+        Registra (o actualiza) una ROM individual en el catálogo.
+        Retorna True si la ruta es una ROM válida.
+        """
+        name = os.path.basename(path)
+        console = CONSOLE_MAP.get(os.path.splitext(name)[1].lower())
+        if not console:
+            return False
+        try:
+            st = os.stat(path)
+        except OSError:
+            return False
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO roms (path, dir, name, console, size, mtime) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (path, os.path.dirname(path), name, console, st.st_size, st.st_mtime_ns))
+        return True
+
+    def add_directory(self, path):
+        """
+        Registra un directorio nuevo junto con todo su contenido.
+        Retorna la lista de ROMs encontradas como (nombre, ruta, consola).
+        """
+        with self._lock, self._conn:
+            pending = [(path, os.path.dirname(path))]
+            while pending:
+                current, parent = pending.pop()
+                try:
+                    mtime = os.stat(current).st_mtime_ns
+                except OSError:
+                    continue
+                subdirs = self._rescan_dir(current, parent, mtime)
+                pending.extend((child, current) for child in subdirs)
+            return self._conn.execute(
+                "SELECT name, path, console FROM roms WHERE path LIKE ? ESCAPE '\\'",
+                (self._subtree_pattern(path),)).fetchall()
+
+    def remove_path(self, path):
+        """
+        Elimina una ROM o un directorio completo del catálogo.
+        Retorna la lista de rutas de ROMs eliminadas.
+        """
+        pattern = self._subtree_pattern(path)
+        with self._lock, self._conn:
+            removed = [p for (p,) in self._conn.execute(
+                "SELECT path FROM roms WHERE path = ? OR path LIKE ? ESCAPE '\\'",
+                (path, pattern))]
+            self._conn.execute(
+                "DELETE FROM roms WHERE path = ? OR path LIKE ? ESCAPE '\\'",
+                (path, pattern))
+            self._conn.execute(
+                "DELETE FROM dirs WHERE path = ? OR path LIKE ? ESCAPE '\\'",
+                (path, pattern))
+            self._conn.execute(
+                "DELETE FROM hashes WHERE path = ? OR path LIKE ? ESCAPE '\\'",
+                (path, pattern))
+        return removed
+
+    def store_hash(self, path, size, mtime, digest):
+        """Guarda el hash (crc32, sha1) del contenido de una ROM con el tamaño y la fecha actuales."""
+        crc32, sha1 = digest
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO hashes (path, size, mtime, crc32, sha1) "
+                "VALUES (?, ?, ?, ?, ?)", (path, size, mtime, crc32, sha1))
+
+    def find_content(self, size, digest):
+        """
+        Busca en la biblioteca una ROM con el contenido indicado.
+        Solo las ROMs del mismo tamaño son candidatas: si no hay ninguna no
+        se calcula nada; digest() calcula el hash buscado solo si hace falta,
+        y los hashes guardados se recalculan únicamente si la ROM cambió.
+        Retorna la ruta de la ROM repetida o None.
+        """
+        with self._lock:
+            candidates = self._conn.execute(
+                "SELECT r.path, h.size, h.mtime, h.crc32, h.sha1 FROM roms r "
+                "LEFT JOIN hashes h ON h.path = r.path WHERE r.size = ?", (size,)).fetchall()
+        if not candidates:
+            return None
+
+        wanted = digest()
+        for path, hashed_size, hashed_mtime, crc32, sha1 in candidates:
+            try:
+                st = os.stat(path)
+                if st.st_size != size:
+                    continue
+                if (hashed_size, hashed_mtime) != (st.st_size, st.st_mtime_ns):
+                    crc32, sha1 = hash_file(path)
+                    self.store_hash(path, st.st_size, st.st_mtime_ns, (crc32, sha1))
+            except OSError:
+                continue
+            if (crc32, sha1) == wanted:
+                return path
+        return None
+
+    @staticmethod
+    def _subtree_pattern(path):
+        """Patrón LIKE que coincide con todo lo que cuelga de un directorio."""
+        escaped = path.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        return escaped.rstrip('/') + '/%'
+
+def get_rom_catalog():
+    """
+    Retorna el catálogo global de ROMs.
+    La primera llamada lo abre y lo revalida contra el disco.
+    """
+    global ROM_CATALOG
+    with ROM_CATALOG_LOCK:
+        if ROM_CATALOG is None:
+            catalog = RomCatalog(CATALOG_DB, ROM_DIR)
+            catalog.refresh()
+            ROM_CATALOG = catalog
+    return ROM_CATALOG
+
+# =============================================
+# SECCIÓN 5: VIGILANCIA DE LA BIBLIOTECA DE ROMS
+# =============================================
+
+# Constantes de inotify (ver <sys/inotify.h>)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_CLOEXEC = 0o2000000
+INOTIFY_WATCH_MASK = (IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO |
+                      IN_CREATE | IN_DELETE)
+INOTIFY_EVENT = struct.Struct('iIII')
+
+class LibraryWatcher(Thread):
+    """
+    Vigila ROM_DIR y los destinos de USB_ROM_DIRS con inotify.
+    Cada cambio se aplica al catálogo y se publica en la cola
+    game_state.library_changes como una tupla (acción, tipo, ruta, ruta_nueva):
+    - ('add', 'rom'|'folder', ruta, None)
+    - ('remove', 'rom'|'folder', ruta, None)
+    - ('rename', 'rom'|'folder', ruta_anterior, ruta_nueva)
+    - ('reload', None, None, None) cuando se perdieron eventos
+    """
+    def __init__(self, game_state):
+        super().__init__(daemon=True)
+        self.game_state = game_state
+        self._fd = None
+        self._libc = None
+        self._watches = {}          # descriptor de vigilancia -> ruta
+        self._lock = Lock()
+
+    def start(self):
+        """Inicializa inotify e inicia el hilo; sin inotify solo acepta notify()."""
+        try:
+            self._libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6',
+                                     use_errno=True)
+            fd = self._libc.inotify_init1(IN_CLOEXEC)
+            if fd < 0:
+                raise OSError(ctypes.get_errno(), "inotify_init1")
+            self._fd = fd
+        except (OSError, AttributeError) as e:
+            print(f"inotify no disponible, sin vigilancia de ROMs: {e}")
+            return
+
+        roots = [ROM_DIR] + sorted(set(USB_ROM_DIRS.values()))
+        for root in roots:
+            try:
+                os.makedirs(root, exist_ok=True)
+            except OSError:
+                pass
+            self._watch_tree(root)
+        # Carátulas: solo el directorio raíz y el de cada consola
+        if os.path.isdir(COVERS_DIR):
+            self._watch_tree(COVERS_DIR, max_depth=1)
+        super().start()
+
+    @property
+    def active(self):
+        """True si inotify está vigilando los directorios."""
+        return self._fd is not None
+
+    def _watch_tree(self, root, max_depth=None):
+        """Agrega vigilancia a un directorio y a sus subdirectorios (hasta max_depth)."""
+        root_depth = root.rstrip('/').count('/')
+        for current, dirs, _ in os.walk(root):
+            if max_depth is not None and current.count('/') - root_depth >= max_depth:
+                dirs[:] = []
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(current),
+                                              INOTIFY_WATCH_MASK)
+            if wd < 0:
+                print(f"No se pudo vigilar {current}: {os.strerror(ctypes.get_errno())}")
+                continue
+            with self._lock:
+                self._watches[wd] = current
+
+    def _unwatch_tree(self, root):
+        """Olvida la vigilancia de un directorio y sus subdirectorios."""
+        prefix = root.rstrip('/') + '/'
+        with self._lock:
+            stale = [wd for wd, path in self._watches.items()
+                     if path == root or path.startswith(prefix)]
+            for wd in stale:
+                del self._watches[wd]
+        for wd in stale:
+            self._libc.inotify_rm_watch(self._fd, wd)
+
+    def run(self):
+        while True:
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except OSError as e:
+                print(f"Error leyendo eventos de inotify: {e}")
+                return
+            self._process(data)
+
+    def _process(self, data):
+        """Traduce un bloque de eventos de inotify a cambios de la biblioteca."""
+        moved_from = {}
+        offset = 0
+        while offset < len(data):
+            wd, mask, cookie, length = INOTIFY_EVENT.unpack_from(data, offset)
+            offset += INOTIFY_EVENT.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                self._reload()
+                continue
+            if mask & IN_IGNORED:
+                with self._lock:
+                    self._watches.pop(wd, None)
+                continue
+
+            with self._lock:
+                parent = self._watches.get(wd)
+            if parent is None or not name:
+                continue
+            path = os.path.join(parent, name)
+            kind = 'folder' if mask & IN_ISDIR else 'rom'
+
+            # Cambios en carátulas: solo invalidan el mapa de carátulas
+            if parent == COVERS_DIR or parent.startswith(COVERS_DIR + '/'):
+                if name.startswith('.'):
+                    continue  # Miniaturas generadas por la propia consola
+                if parent == COVERS_DIR and mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                    self._watch_tree(path, max_depth=0)
+                if COVER_RESOLVER is not None:
+                    COVER_RESOLVER.invalidate()
+                continue
+
+            if mask & IN_MOVED_FROM:
+                moved_from[cookie] = (kind, path)
+            elif mask & IN_MOVED_TO:
+                if cookie in moved_from:
+                    old_kind, old_path = moved_from.pop(cookie)
+                    self.notify('rename', old_path, path, kind=old_kind)
+                else:
+                    self.notify('add', path, kind=kind)
+            elif mask & IN_DELETE:
+                self.notify('remove', path, kind=kind)
+            elif mask & IN_CLOSE_WRITE or (mask & IN_CREATE and mask & IN_ISDIR):
+                self.notify('add', path, kind=kind)
+
+        # Movimientos hacia fuera de la biblioteca equivalen a eliminaciones
+        for kind, path in moved_from.values():
+            self.notify('remove', path, kind=kind)
+
+    def _reload(self):
+        """Se perdieron eventos: revalidar todo el catálogo."""
+        print("Cola de inotify desbordada, revalidando catálogo")
+        get_rom_catalog().refresh()
+        reset_search_index()
+        self.game_state.library_changes.put(('reload', None, None, None))
+        post_event(UI_WAKE_EVENT)
+
+    def notify(self, action, path, new_path=None, kind='rom'):
+        """
+        Aplica un cambio al catálogo y lo publica para el menú.
+        Puede llamarse desde cualquier hilo (por ejemplo, la copia desde USB).
+        """
+        catalog = get_rom_catalog()
+
+        def publish(change):
+            update_search_index(change)
+            self.game_state.library_changes.put(change)
+            post_event(UI_WAKE_EVENT)
+
+        if action == 'rename':
+            self.notify('remove', path, kind=kind)
+            self.notify('add', new_path, kind=kind)
+            return
+
+        if kind == 'folder':
+            if action == 'add':
+                if self._fd is not None:
+                    self._watch_tree(path)
+                publish(('add', 'folder', path, None))
+                for _, rom_path, _ in catalog.add_directory(path):
+                    publish(('add', 'rom', rom_path, None))
+            else:
+                if self._fd is not None:
+                    self._unwatch_tree(path)
+                for rom_path in catalog.remove_path(path):
+                    publish(('remove', 'rom', rom_path, None))
+                publish(('remove', 'folder', path, None))
+        elif action == 'add':
+            if catalog.add_rom(path):
+                publish(('add', 'rom', path, None))
+        elif action == 'remove':
+            if catalog.remove_path(path):
+                publish(('remove', 'rom', path, None))
+
+def start_library_watcher(game_state):
+    """
+    Inicia el hilo que vigila la biblioteca de ROMs.
+    Retorna la referencia al vigilante.
+    """
+    global LIBRARY_WATCHER
+    LIBRARY_WATCHER = LibraryWatcher(game_state)
+    LIBRARY_WATCHER.start()
+    return LIBRARY_WATCHER
+
+def notify_library_change(action, path, new_path=None, kind='rom'):
+    """
+    Informa un cambio conocido en la biblioteca (por ejemplo, una ROM copiada).
+    Si el vigilante no está activo, revalida el catálogo completo.
+    """
+    if LIBRARY_WATCHER is not None:
+        LIBRARY_WATCHER.notify(action, path, new_path, kind=kind)
+    else:
+        get_rom_catalog().refresh()
+        reset_search_index()
+
+# =============================================
+# SECCIÓN 6: ÍNDICE DE BÚSQUEDA EN MEMORIA
+# =============================================
+
+class RomSearchIndex:
+    """
+    Índice invertido de trigramas y palabras sobre los nombres de las ROMs
+    para la búsqueda difusa (rank). Las coincidencias exactas de 3 o más
+    caracteres parten de la lista de trigramas menos frecuente; las
+    consultas más cortas recorren la lista ordenada.
+    Cada entrada es una tupla (consola, nombre, ruta, nombre_minúsculas)
+    y las listas de trigramas guardan el identificador numérico de la entrada.
+    """
+    def __init__(self):
+        self._ids = {}          # ruta -> identificador
+        self._entries = []      # identificador -> entrada (None si se eliminó)
+        self._ordered = []      # entradas ordenadas por consola y nombre
+        self._grams = {}        # trigrama -> lista de identificadores
+        self._words = {}        # palabra -> lista de identificadores
+        self._vocabulary = {}   # inicial -> conjunto de palabras
+        self._expansions = {}   # palabra consultada -> palabras parecidas
+        self._lock = Lock()
+
+    @staticmethod
+    def _trigrams(text):
+        return {text[i:i + 3] for i in range(len(text) - 2)}
+
+    @staticmethod
+    def _split_words(text):
+        return {w for w in re.split(r'[^a-z0-9]+', text) if len(w) >= 2}
+
+    def _insert_locked(self, name, path, console):
+        entry = (console, name, path, name.lower())
+        entry_id = len(self._entries)
+        self._entries.append(entry)
+        self._ids[path] = entry_id
+        grams = self._grams
+        for gram in self._trigrams(entry[3]):
+            postings = grams.get(gram)
+            if postings is None:
+                grams[gram] = [entry_id]
+            else:
+                postings.append(entry_id)
+        for word in self._split_words(entry[3]):
+            postings = self._words.get(word)
+            if postings is None:
+                self._words[word] = [entry_id]
+                self._vocabulary.setdefault(word[0], set()).add(word)
+                self._expansions.clear()
+            else:
+                postings.append(entry_id)
+        return entry
+
+    def add(self, name, path, console):
+        """Agrega o reemplaza una ROM en el índice."""
+        with self._lock:
+            if path in self._ids:
+                self._remove_locked(path)
+            bisect.insort(self._ordered, self._insert_locked(name, path, console))
+
+    def load(self, roms):
+        """Carga de forma masiva una lista de (nombre, ruta, consola)."""
+        with self._lock:
+            for name, path, console in roms:
+                if path not in self._ids:
+                    self._insert_locked(name, path, console)
+            self._ordered = sorted(e for e in self._entries if e is not None)
+
+    def remove(self, path):
+        """Elimina una ROM del índice si existe."""
+        with self._lock:
+            self._remove_locked(path)
+
+    def _remove_locked(self, path):
+        entry_id = self._ids.pop(path, None)
+        if entry_id is None:
+            return
+        entry = self._entries[entry_id]
+        self._entries[entry_id] = None
+        index = bisect.bisect_left(self._ordered, entry)
+        if index < len(self._ordered) and self._ordered[index] == entry:
+            del self._ordered[index]
+        for gram in self._trigrams(entry[3]):
+            postings = self._grams.get(gram)
+            if postings is not None:
+                postings.remove(entry_id)
+                if not postings:
+                    del self._grams[gram]
+        for word in self._split_words(entry[3]):
+            postings = self._words.get(word)
+            if postings is not None:
+                postings.remove(entry_id)
+                if not postings:
+                    del self._words[word]
+                    self._vocabulary[word[0]].discard(word)
+                    self._expansions.clear()
+
+    def _expand(self, word, deadline):
+        """
+        Palabras del vocabulario a pocos errores de escritura de la palabra
+        consultada, como lista de (palabra, distancia). Se buscan entre las
+        palabras que comparten su primera o segunda letra y el resultado se
+        guarda para las siguientes pulsaciones. Retorna None si se agotó el tiempo.
+        """
+        cached = self._expansions.get(word)
+        if cached is not None:
+            return cached
+        allowed = 1 if len(word) <= 4 else 2
+        similar = []
+        for initial in set(word[:2]):
+            for position, candidate in enumerate(self._vocabulary.get(initial, ())):
+                if position % 16 == 0 and time.perf_counter() > deadline:
+                    return None
+                if abs(len(candidate) - len(word)) > allowed or candidate == word:
+                    continue
+                distance = _edit_distance(word, candidate, allowed)
+                if distance <= allowed:
+                    similar.append((candidate, distance))
+        self._expansions[word] = similar
+        return similar
+
+    def __len__(self):
+        return len(self._ids)
+
+    def rank(self, text, limit, budget, root=None):
+        """
+        Búsqueda difusa ordenada por relevancia con tolerancia a errores.
+        Combina similitud de trigramas, coincidencia exacta, bonos por
+        prefijo y por inicio de palabra, y distancia de edición por palabra.
+        Primero puntúa las coincidencias exactas (baratas) y después los
+        candidatos con más trigramas en común. Respeta un presupuesto de
+        tiempo en segundos: al agotarse retorna los mejores resultados
+        encontrados hasta ese momento. Con root solo considera las ROMs cuya
+        ruta empieza con ese prefijo, antes de elegir las mejores.
+        Retorna (resultados, completo).
+        """
+        deadline = time.perf_counter() + budget
+        query = text.lower().strip()
+        if not query:
+            return [], True
+        query_words = [w for w in re.split(r'[^a-z0-9]+', query) if w]
+        query_grams = set()
+        for word in query_words:
+            query_grams |= self._trigrams(word)
+
+        # La fase de conteo deja tiempo para elegir y puntuar a los mejores
+        # candidatos (elegirlos cuesta casi lo mismo que contarlos)
+        count_deadline = time.perf_counter() + budget * 0.4
+        scored = {}
+        distances = {}
+        complete = True
+        with self._lock:
+            entries = self._entries
+
+            # Fase 1: coincidencias exactas del texto completo
+            if query_grams:
+                postings = min((self._grams.get(g, ()) for g in self._trigrams(query) or query_grams),
+                               key=len)
+                candidates = (entries[i] for i in postings)
+            else:
+                candidates = self._ordered
+            for position, entry in enumerate(candidates):
+                if position % 32 == 0 and time.perf_counter() > count_deadline:
+                    complete = False
+                    break
+                if query in entry[3] and (root is None or entry[2].startswith(root)):
+                    scored[entry] = self._score(entry[3], query, query_words, 1.0, None)
+
+            # Fase 2: candidatos difusos por trigramas compartidos,
+            # empezando por los trigramas más raros
+            if query_grams:
+                counts = collections.Counter()
+                for postings in sorted((self._grams.get(g, ()) for g in query_grams), key=len):
+                    for start in range(0, len(postings), 1024):
+                        if time.perf_counter() > count_deadline:
+                            complete = False
+                            break
+                        counts.update(postings[start:start + 1024])
+                    else:
+                        continue
+                    break
+                # Palabras con errores de escritura sin trigramas en común
+                for word in query_words:
+                    if len(word) < 3 or not complete:
+                        continue
+                    similar = self._expand(word, count_deadline)
+                    if similar is None:
+                        complete = False
+                        break
+                    weight = len(self._trigrams(word))
+                    for candidate, distance in similar:
+                        bonus = max(1, weight - distance)
+                        postings = self._words.get(candidate, ())
+                        for start in range(0, len(postings), 1024):
+                            if time.perf_counter() > count_deadline:
+                                complete = False
+                                break
+                            for entry_id in postings[start:start + 1024]:
+                                counts[entry_id] += bonus
+                        if not complete:
+                            break
+
+                if root is not None:
+                    counts = collections.Counter({entry_id: count for entry_id, count in counts.items()
+                                                  if entries[entry_id][2].startswith(root)})
+                pool = max(limit * 4, 100)
+                for position, (entry_id, shared) in enumerate(counts.most_common(pool)):
+                    # Puntuar siempre al menos tantos candidatos como el límite
+                    if position >= limit and time.perf_counter() > deadline:
+                        complete = False
+                        break
+                    entry = entries[entry_id]
+                    if entry not in scored:
+                        scored[entry] = self._score(entry[3], query, query_words,
+                                                    min(1.0, shared / len(query_grams)), distances)
+
+        best = heapq.nsmallest(limit, ((-score, entry) for entry, score in scored.items()
+                                       if score >= FUZZY_MIN_SCORE))
+        return [('rom', e[1], e[2], e[0]) for _, e in best], complete
+
+    @staticmethod
+    def _score(name, query, query_words, shared, distances):
+        """
+        Puntuación de relevancia de un nombre (en minúsculas) para la consulta.
+        Si distances es un diccionario se toleran errores de escritura por
+        palabra y se usa como caché de distancias de edición.
+        """
+        score = shared
+        position = name.find(query)
+        if position == 0:
+            score += 3.0
+        elif position > 0:
+            score += 2.0
+            if not name[position - 1].isalnum():
+                score += 0.5
+
+        # Crédito por palabra: prefijo exacto o con pocos errores de escritura
+        if query_words:
+            name_words = [w for w in re.split(r'[^a-z0-9]+', name) if w]
+            credit = 0.0
+            for word in query_words:
+                best = 0.0
+                for candidate in name_words:
+                    if candidate.startswith(word):
+                        best = 1.0
+                        break
+                    if distances is None or len(word) < 3:
+                        continue
+                    key = (word, candidate)
+                    distance = distances.get(key)
+                    if distance is None:
+                        allowed = 1 if len(word) <= 4 else 2
+                        distance = _edit_distance(word, candidate[:len(word) + 1], allowed)
+                        distances[key] = distance
+                        if distance > allowed:
+                            distance = distances[key] = 99
+                    if distance < 99:
+                        best = max(best, 0.8 - 0.25 * distance)
+                credit += best
+            score += 1.5 * credit / len(query_words)
+
+        # Preferir títulos más cortos ante puntuaciones similares
+        return score - 0.002 * len(name)
+
+def _edit_distance(a, b, max_distance):
+    """
+    Distancia de Damerau-Levenshtein (alineamiento óptimo de cadenas: una
+    transposición de letras vecinas cuesta 1) entre a y b, comparando a
+    contra b o su versión sin el último carácter. Se detiene en cuanto
+    supera max_distance y en ese caso retorna max_distance + 1.
+    """
+    if abs(len(a) - len(b)) > max_distance + 1:
+        return max_distance + 1
+    before = None
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            distance = min(previous[j] + 1, current[j - 1] + 1,
+                           previous[j - 1] + (char_a != char_b))
+            if i > 1 and j > 1 and char_a == b[j - 2] and a[i - 2] == char_b:
+                distance = min(distance, before[j - 2] + 1)
+            current.append(distance)
+        if min(current) > max_distance:
+            return max_distance + 1
+        before, previous = previous, current
+    # b puede incluir un carácter extra para tolerar omisiones en a
+    return min(previous[-1], previous[-2] if len(b) > 0 else previous[-1])
+
+# Índice global de búsqueda (se construye bajo demanda)
+SEARCH_INDEX = None
+SEARCH_INDEX_LOCK = Lock()
+
+def get_search_index():
+    """
+    Retorna el índice de búsqueda global.
+    La primera llamada lo construye a partir del catálogo.
+    """
+    global SEARCH_INDEX
+    with SEARCH_INDEX_LOCK:
+        if SEARCH_INDEX is None:
+            start = time.time()
+            index = RomSearchIndex()
+            index.load(get_rom_catalog().list_root())
+            print(f"Índice de búsqueda construido en {time.time() - start:.2f}s "
+                  f"({len(index)} ROMs)")
+            SEARCH_INDEX = index
+    return SEARCH_INDEX
+
+def update_search_index(change):
+    """Aplica un cambio de la biblioteca al índice, si ya fue construido."""
+    action, kind, path, _ = change
+    # Esperar a que termine una construcción en curso
+    with SEARCH_INDEX_LOCK:
+        index = SEARCH_INDEX
+    if index is None or kind != 'rom':
+        return
+    if action == 'add':
+        console = CONSOLE_MAP.get(os.path.splitext(path)[1].lower())
+        if console:
+            index.add(os.path.basename(path), path, console)
+    elif action == 'remove':
+        index.remove(path)
+
+def reset_search_index():
+    """Descarta el índice para reconstruirlo en la siguiente búsqueda."""
+    global SEARCH_INDEX
+    with SEARCH_INDEX_LOCK:
+        SEARCH_INDEX = None
 
 # =============================================
 # FUNCIÓN PRINCIPAL Y DE APAGADO
@@ -1384,11 +4741,12 @@ def shutdown_raspberry():
     try:
         pygame.display.init()
         screen = pygame.display.set_mode((640, 480), pygame.FULLSCREEN)
-        font = pygame.font.Font(None, 36)
         screen.fill((0, 0, 0))
-        text = font.render("Apagando el sistema...", True, (255, 255, 255))
+        text = render_text("Apagando el sistema...", 36, (255, 255, 255))
         screen.blit(text, (320 - text.get_width()//2, 240 - text.get_height()//2))
+        RetainedRenderer.invalidate_screen()
         pygame.display.update()
+        dump_diagnostics()
         time.sleep(5)
         pygame.quit()
 
@@ -1402,6 +4760,9 @@ def main():
     Coordina la secuencia de inicialización y el bucle principal.
     """
     try:
+        # Informe de latencia bajo demanda (antes de crear otros hilos)
+        start_latency_dump_listener()
+        
         # Verificar y crear directorio de ROMs si no existe
         if not os.path.exists(ROM_DIR):
             os.makedirs(ROM_DIR)
@@ -1410,11 +4771,19 @@ def main():
         pygame.init()
         pygame.joystick.init()
         
+        # Revalidar el catálogo, construir el índice de búsqueda y
+        # preparar las miniaturas de carátulas mientras se muestra el splash
+        Thread(target=get_search_index, daemon=True).start()
+        Thread(target=pregenerate_cover_thumbnails, daemon=True).start()
+        
         # Mostrar pantalla de inicio
         show_splash()
         
-        # Inicializar estado del juego y monitor USB
+        # Inicializar estado del juego, perfil, grabación de sesión y monitor USB
         game_state = GameState()
+        start_profile_exporter()
+        start_session_recorder()
+        start_library_watcher(game_state)
         usb_thread = start_usb_monitor(game_state)
         
         # Bucle principal
@@ -1425,6 +4794,7 @@ def main():
     except Exception as e:
         print(f"Error en el programa: {e}")
     finally:
+        dump_diagnostics()
         pygame.quit()
         sys.exit()
 
@@ -0,0 +1,355 @@
+"""
+Banco de pruebas de rendimiento sin pantalla para la RetroConsole ccjpmmGaming.
+
+Genera una biblioteca sintética de ROMs y carátulas (GBA/NES/SNES, carpetas
+anidadas y extensiones con mayúsculas mezcladas) y mide, con el driver de
+video dummy de SDL, el tiempo y la memoria máxima de:
+- load_roms_and_folders (vista raíz en frío y en caliente, y una subcarpeta)
+- search_roms (coincidencia común, poco común y con errores de escritura;
+  las consultas con error deben encontrar el título esperado o el programa
+  termina con código 1)
+- load_game_cover (con y sin carátula)
+- draw_menu (desplazamiento por la vista raíz)
+
+El resultado se imprime (o se guarda) como JSON. Puede medir otra versión
+del programa (--code o --git-rev) y comparar contra un resultado anterior
+(--compare), por ejemplo:
+
+    python benchmark.py --git-rev ba7c7ee --output base.json
+    python benchmark.py --compare base.json
+
+La memoria es el pico de asignaciones de Python (tracemalloc) durante una
+ejecución adicional de cada operación; las superficies de SDL no se cuentan.
+"""
+
+import os
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import argparse
+import contextlib
+import importlib.util
+import json
+import platform
+import random
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import pygame
+
+# =============================================
+# CONFIGURACIÓN
+# =============================================
+DEFAULT_SCALES = (1000, 10000, 100000)
+DEFAULT_COVER_RATIO = 0.1       # Fracción de ROMs con carátula
+COVER_IMAGE_SIZE = (256, 224)   # Tamaño de las carátulas generadas
+FOLDERS_PER_CONSOLE = 8         # Carpetas de primer nivel por consola
+SUBFOLDERS_PER_FOLDER = 4       # Subcarpetas dentro de cada carpeta
+SEED = 1234                     # Semilla para que la biblioteca sea reproducible
+
+CONSOLE_EXTENSIONS = {
+    'GBA': ('.gba', '.GBA', '.Gba'),
+    'NES': ('.nes', '.NES', '.Nes'),
+    'SNES': ('.smc', '.SMC', '.sfc', '.SFC'),
+}
+NAME_WORDS = ("super", "mega", "zelda", "mario", "metroid", "castle", "dragon", "quest",
+              "kart", "racing", "fighter", "star", "fox", "kirby", "pokemon", "tetris",
+              "contra", "ninja", "turtles", "street", "soccer", "golf", "tennis", "dungeon",
+              "legend", "world", "island", "donkey", "kong", "final", "fantasy", "chrono")
+
+# Consultas de búsqueda: (nombre, texto, palabra que debe aparecer en los
+# resultados o None si no se verifica)
+SEARCH_QUERIES = (
+    ('common', "mario", None),
+    ('rare', "chrono fantasy 7", None),
+    ('typo', "zedla", "zelda"),
+    ('transposition', "mraio", "mario"),
+)
+
+# =============================================
+# GENERACIÓN DE LA BIBLIOTECA SINTÉTICA
+# =============================================
+
+def generate_library(base_dir, rom_count, cover_ratio=DEFAULT_COVER_RATIO, seed=SEED):
+    """
+    Crea base_dir/roms y base_dir/covers con rom_count ROMs repartidas entre
+    consolas, en la raíz de cada consola y en dos niveles de carpetas.
+    Retorna un diccionario con las rutas y los nombres de muestra.
+    """
+    rng = random.Random(seed)
+    rom_dir = os.path.join(base_dir, "roms")
+    covers_dir = os.path.join(base_dir, "covers")
+    consoles = sorted(CONSOLE_EXTENSIONS)
+
+    cover_surface = pygame.Surface(COVER_IMAGE_SIZE)
+    covered, uncovered, subfolder = [], [], None
+
+    for index in range(rom_count):
+        console = consoles[index % len(consoles)]
+        extension = rng.choice(CONSOLE_EXTENSIONS[console])
+        words = rng.sample(NAME_WORDS, rng.randint(2, 4))
+        name = " ".join(words).title() + f" {index}"
+
+        # Un tercio en la raíz de la consola, el resto en carpetas anidadas
+        folder = os.path.join(rom_dir, console)
+        depth = index % 3
+        if depth >= 1:
+            folder = os.path.join(folder, f"Serie {rng.randrange(FOLDERS_PER_CONSOLE):02d}")
+        if depth == 2:
+            folder = os.path.join(folder, f"Parte {rng.randrange(SUBFOLDERS_PER_FOLDER):02d}")
+            subfolder = subfolder or folder
+        os.makedirs(folder, exist_ok=True)
+        with open(os.path.join(folder, name + extension), 'wb') as rom:
+            rom.write(index.to_bytes(4, 'little'))
+
+        if rng.random() < cover_ratio:
+            cover_folder = os.path.join(covers_dir, console)
+            os.makedirs(cover_folder, exist_ok=True)
+            cover_surface.fill((index % 256, (index // 256) % 256, 128))
+            pygame.image.save(cover_surface, os.path.join(cover_folder, name + ".png"))
+            covered.append(name + extension)
+        else:
+            uncovered.append(name + extension)
+
+    for console in consoles:
+        os.makedirs(os.path.join(covers_dir, console), exist_ok=True)
+
+    return {
+        'rom_dir': rom_dir,
+        'covers_dir': covers_dir,
+        'subfolder': subfolder or os.path.join(rom_dir, consoles[0]),
+        'covered': rng.sample(covered, min(25, len(covered))),
+        'uncovered': rng.sample(uncovered, min(25, len(uncovered))),
+    }
+
+# =============================================
+# CARGA DEL PROGRAMA A MEDIR
+# =============================================
+
+def load_code(path, library, work_dir):
+    """
+    Importa una copia nueva del programa desde path (sin estado previo) y
+    redirige sus rutas a la biblioteca sintética. Las versiones anteriores
+    que no tienen alguna de las rutas simplemente la ignoran.
+    """
+    spec = importlib.util.spec_from_file_location(f"retroconsole_{time.monotonic_ns()}", path)
+    code = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(code)
+
+    code.ROM_DIR = library['rom_dir']
+    if hasattr(code, 'CATALOG_DB'):
+        code.CATALOG_DB = os.path.join(work_dir, "catalog.db")
+    if hasattr(code, 'COVERS_DIR'):
+        code.COVERS_DIR = library['covers_dir']
+    code.USB_ROM_DIRS = {
+        ext: os.path.join(library['rom_dir'], console)
+        for console, extensions in CONSOLE_EXTENSIONS.items() for ext in extensions
+    }
+    return code
+
+def git_revision_code(revision, work_dir):
+    """Extrae src/Code.py de una revisión de git a un archivo temporal."""
+    repo_dir = os.path.dirname(os.path.abspath(__file__))
+    source = subprocess.run(["git", "show", f"{revision}:src/Code.py"], cwd=repo_dir,
+                            check=True, capture_output=True).stdout
+    path = os.path.join(work_dir, f"Code_{revision}.py")
+    with open(path, 'wb') as output:
+        output.write(source)
+    return path
+
+# =============================================
+# MEDICIÓN
+# =============================================
+
+def measure(operation, repeat):
+    """
+    Ejecuta operation() repeat veces midiendo el tiempo y una vez más con
+    tracemalloc para obtener el pico de memoria de Python.
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        operation()
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        operation()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'runs': repeat,
+        'mean_ms': statistics.fmean(timings) * 1000,
+        'min_ms': min(timings) * 1000,
+        'max_ms': max(timings) * 1000,
+        'peak_python_kib': peak / 1024,
+    }
+
+def measure_once(operation):
+    """Mide una operación que solo tiene sentido la primera vez (arranque en frío)."""
+    tracemalloc.start()
+    try:
+        start = time.perf_counter()
+        operation()
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {'runs': 1, 'mean_ms': elapsed * 1000, 'min_ms': elapsed * 1000,
+            'max_ms': elapsed * 1000, 'peak_python_kib': peak / 1024}
+
+def run_scale(code_path, rom_count, cover_ratio, repeat, keep=False):
+    """Genera la biblioteca de rom_count ROMs y mide todas las operaciones."""
+    work_dir = tempfile.mkdtemp(prefix=f"retroconsole_bench_{rom_count}_")
+    results = {}
+    try:
+        start = time.perf_counter()
+        library = generate_library(work_dir, rom_count, cover_ratio)
+        generation_s = time.perf_counter() - start
+
+        code = load_code(code_path, library, work_dir)
+        rom_dir = library['rom_dir']
+
+        # Listado de la vista raíz y de una subcarpeta
+        results['load_roms_and_folders.root_cold'] = measure_once(
+            lambda: code.load_roms_and_folders(rom_dir))
+        results['load_roms_and_folders.root_warm'] = measure(
+            lambda: code.load_roms_and_folders(rom_dir), repeat)
+        results['load_roms_and_folders.subfolder'] = measure(
+            lambda: code.load_roms_and_folders(library['subfolder']), repeat)
+
+        # Búsqueda (la primera consulta incluye construir el índice, si existe)
+        results['search_roms.cold'] = measure_once(
+            lambda: code.search_roms(SEARCH_QUERIES[0][1], rom_dir))
+        for name, text, expected in SEARCH_QUERIES:
+            results[f'search_roms.{name}'] = measure(lambda: code.search_roms(text, rom_dir), repeat)
+            if expected is not None:
+                found = any(expected in item[1].lower() for item in code.search_roms(text, rom_dir))
+                results[f'search_roms.{name}']['found_expected'] = found
+
+        # Carátulas (la versión original busca en una ruta fija fuera de la biblioteca)
+        if hasattr(code, 'COVERS_DIR'):
+            samples = library['covered']
+            results['load_game_cover.cold'] = measure_once(
+                lambda: code.load_game_cover(samples[0]) if samples else None)
+            results['load_game_cover.found'] = measure(
+                lambda: [code.load_game_cover(name) for name in samples], repeat)
+            results['load_game_cover.missing'] = measure(
+                lambda: [code.load_game_cover(name) for name in library['uncovered']], repeat)
+        else:
+            results['load_game_cover'] = {'skipped': "COVERS_DIR no configurable en esta versión"}
+
+        # Dibujo del menú desplazando la selección por la vista raíz
+        screen = pygame.display.set_mode((640, 480))
+        items, _ = code.load_roms_and_folders(rom_dir)
+        game_state = code.GameState()
+        frames = min(100, len(items))
+        position = [0]
+
+        def draw_frames():
+            for _ in range(frames):
+                position[0] = (position[0] + 1) % len(items)
+                code.draw_menu(screen, items, position[0], rom_dir, game_state)
+        draw = measure(draw_frames, repeat)
+        draw['frames'] = frames
+        draw['frame_mean_ms'] = draw['mean_ms'] / frames
+        results['draw_menu.scroll'] = draw
+
+        prefetcher = getattr(code, 'COVER_PREFETCHER', None)
+        if prefetcher is not None:
+            prefetcher._executor.shutdown(wait=True, cancel_futures=True)
+
+        return {'roms': rom_count, 'generation_s': generation_s, 'operations': results}
+    finally:
+        if keep:
+            print(f"Biblioteca conservada en {work_dir}", file=sys.stderr)
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+# =============================================
+# COMPARACIÓN E INTERFAZ DE LÍNEA DE COMANDOS
+# =============================================
+
+def compare(baseline, current):
+    """Imprime, por escala y operación, el tiempo medio anterior, el actual y la mejora."""
+    for scale, run in current['scales'].items():
+        base_run = baseline['scales'].get(scale)
+        if base_run is None:
+            continue
+        print(f"\n{scale} ROMs")
+        for operation, stats in run['operations'].items():
+            base_stats = base_run['operations'].get(operation)
+            if not base_stats or 'mean_ms' not in base_stats or 'mean_ms' not in stats:
+                continue
+            speedup = base_stats['mean_ms'] / stats['mean_ms'] if stats['mean_ms'] else float('inf')
+            print(f"  {operation:36s} {base_stats['mean_ms']:10.2f} ms -> "
+                  f"{stats['mean_ms']:10.2f} ms  x{speedup:.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Banco de pruebas de rendimiento sin pantalla")
+    parser.add_argument("--scales", type=int, nargs="+", default=list(DEFAULT_SCALES),
+                        help="Número de ROMs de cada biblioteca sintética")
+    parser.add_argument("--cover-ratio", type=float, default=DEFAULT_COVER_RATIO,
+                        help="Fracción de ROMs con carátula")
+    parser.add_argument("--repeat", type=int, default=5, help="Repeticiones por operación")
+    parser.add_argument("--code", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "Code.py"),
+                        help="Archivo del programa a medir")
+    parser.add_argument("--git-rev", help="Medir src/Code.py de esta revisión de git")
+    parser.add_argument("--output", help="Guardar el resultado JSON en este archivo")
+    parser.add_argument("--compare", help="Resultado JSON anterior contra el cual comparar")
+    parser.add_argument("--keep", action="store_true", help="Conservar las bibliotecas generadas")
+    args = parser.parse_args()
+
+    pygame.init()
+    scratch_dir = tempfile.mkdtemp(prefix="retroconsole_bench_")
+    # La salida estándar queda solo para el informe JSON: los mensajes del
+    # programa medido van a la salida de error
+    try:
+        with contextlib.redirect_stdout(sys.stderr):
+            code_path = git_revision_code(args.git_rev, scratch_dir) if args.git_rev else args.code
+            report = {
+                'code': args.git_rev or os.path.abspath(code_path),
+                'python': platform.python_version(),
+                'pygame': pygame.version.ver,
+                'machine': platform.machine(),
+                'scales': {},
+            }
+            for rom_count in args.scales:
+                print(f"Midiendo {rom_count} ROMs...", file=sys.stderr)
+                report['scales'][str(rom_count)] = run_scale(code_path, rom_count, args.cover_ratio,
+                                                             args.repeat, args.keep)
+        report['max_rss_kib'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    finally:
+        shutil.rmtree(scratch_dir, ignore_errors=True)
+        pygame.quit()
+
+    missing = [f"{scale}:{operation}" for scale, run in report['scales'].items()
+               for operation, stats in run['operations'].items()
+               if stats.get('found_expected') is False]
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as result_file:
+            result_file.write(output + "\n")
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            compare(json.load(baseline_file), report)
+
+    if missing:
+        print(f"Búsquedas que no encontraron el título esperado: {', '.join(missing)}", file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,280 @@
+"""
+Reproducción de sesiones del control para pruebas de rendimiento de extremo a extremo.
+
+Ejecuta la interfaz real con el driver de video dummy de SDL sobre una
+biblioteca sintética (la misma de benchmark.py) y le inyecta los eventos
+de un control simulado con los tiempos de la sesión. La sesión puede ser
+una grabación hecha en la consola (RETROCONSOLE_RECORD=sesion.jsonl) o la
+sesión guionizada incluida, que recorre:
+
+    conexión del control → folder_menu → handle_search_menu
+    → show_search_results_menu → launch_game → folder_menu
+
+El emulador se sustituye por un script que solo espera unos instantes.
+Al terminar imprime un informe JSON con el tiempo total, los cuadros
+presentados por pantalla y la latencia entrada → pantalla por pantalla.
+
+    python replay.py
+    python replay.py --session sesion.jsonl --speed 2
+    python replay.py --max-p95-ms 25      # código de salida 1 si se excede
+"""
+
+import os
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import argparse
+import collections
+import contextlib
+import json
+import shutil
+import stat
+import sys
+import tempfile
+import time
+
+import pygame
+
+from benchmark import generate_library, load_code
+
+# =============================================
+# CONFIGURACIÓN
+# =============================================
+DEFAULT_ROMS = 1000          # ROMs de la biblioteca sintética
+DEFAULT_QUERY = "mario"      # Texto que escribe la sesión guionizada
+EMULATOR_SECONDS = 0.5       # Duración del emulador sustituto
+STEP = 0.15                  # Segundos entre acciones de la sesión guionizada
+PRESS = 0.05                 # Duración de cada pulsación
+SETTLE = 1.0                 # Espera tras el último evento antes de terminar
+
+BUTTON_A = 0
+BUTTON_START = 7
+
+class ReplayFinished(BaseException):
+    """Termina la reproducción (hereda de BaseException para no quedar atrapada en la interfaz)."""
+
+# =============================================
+# CONTROL SIMULADO
+# =============================================
+
+class FakeJoystick:
+    """Control simulado cuyo estado refleja los eventos reproducidos."""
+    def __init__(self):
+        self.buttons = set()
+        self.hat = (0, 0)
+
+    def init(self):
+        pass
+
+    def get_name(self):
+        return "Control de reproducción"
+
+    def get_button(self, button):
+        return int(button in self.buttons)
+
+    def get_hat(self, hat):
+        return self.hat
+
+    def apply(self, entry):
+        """Actualiza el estado con una entrada de la sesión."""
+        if entry['type'] == 'JOYBUTTONDOWN':
+            self.buttons.add(entry['button'])
+        elif entry['type'] == 'JOYBUTTONUP':
+            self.buttons.discard(entry['button'])
+        elif entry['type'] == 'JOYHATMOTION':
+            self.hat = tuple(entry['value'])
+
+def install_fake_joystick(joystick):
+    """Hace que pygame reporte un único control: el simulado."""
+    pygame.joystick.get_count = lambda: 1
+    pygame.joystick.Joystick = lambda index: joystick
+
+# =============================================
+# SESIÓN GUIONIZADA
+# =============================================
+
+def scripted_session(keyboard_layout, query=DEFAULT_QUERY):
+    """
+    Genera la sesión de referencia: aceptar la conexión del control, bajar
+    por el menú, abrir la búsqueda, escribir query en el teclado virtual,
+    buscar, elegir el segundo resultado, confirmar la pantalla de controles
+    y, tras volver del emulador, moverse de nuevo por el menú.
+    """
+    entries = []
+    clock = [0.5]
+
+    def press(button):
+        entries.append({'t': clock[0], 'type': 'JOYBUTTONDOWN', 'button': button})
+        entries.append({'t': clock[0] + PRESS, 'type': 'JOYBUTTONUP', 'button': button})
+        clock[0] += STEP
+
+    def move(value, times=1):
+        for _ in range(times):
+            entries.append({'t': clock[0], 'type': 'JOYHATMOTION', 'hat': 0, 'value': list(value)})
+            entries.append({'t': clock[0] + PRESS, 'type': 'JOYHATMOTION', 'hat': 0, 'value': [0, 0]})
+            clock[0] += STEP
+
+    press(BUTTON_A)                      # Pantalla de conexión del control
+    move((0, -1), 3)                     # Bajar en folder_menu
+    move((-1, 0))                        # Abrir el teclado de búsqueda
+
+    # Escribir el texto recorriendo el teclado desde la tecla (0, 0)
+    row, col = 0, 0
+    for char in query.upper():
+        target = next((r, c) for r, keys in enumerate(keyboard_layout)
+                      for c, key in enumerate(keys) if key == char)
+        while row != target[0]:
+            step = 1 if target[0] > row else -1
+            move((0, -step))
+            row += step
+            col = min(col, len(keyboard_layout[row]) - 1)
+        while col != target[1]:
+            step = 1 if target[1] > col else -1
+            move((step, 0))
+            col += step
+        press(BUTTON_A)
+
+    press(BUTTON_START)                  # Buscar
+    move((0, -1))                        # Segundo resultado
+    press(BUTTON_A)                      # Lanzar el juego
+    clock[0] += 0.3
+    press(BUTTON_A)                      # Confirmar la pantalla de controles
+    clock[0] += EMULATOR_SECONDS + 0.5   # Esperar a que el emulador termine
+    move((0, -1), 2)                     # Volver a navegar el menú
+    return entries
+
+# =============================================
+# REPRODUCCIÓN
+# =============================================
+
+def make_stand_in_emulator(work_dir, seconds=EMULATOR_SECONDS):
+    """
+    Crea el script que sustituye a EMULATOR_CMD. Tras un breve arranque
+    abre la ROM, que hace las veces de su "primer cuadro" (ver main).
+    """
+    path = os.path.join(work_dir, "emulador_sustituto.sh")
+    with open(path, 'w') as script:
+        script.write(f"#!/bin/sh\nsleep 0.05\nexec 3<\"$1\"\nsleep {seconds}\n")
+    os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR)
+    return path
+
+def make_mapping_image(work_dir):
+    """Crea la imagen que muestra la pantalla de controles."""
+    path = os.path.join(work_dir, "controles.png")
+    image = pygame.Surface((640, 480))
+    image.fill((40, 40, 40))
+    pygame.image.save(image, path)
+    return path
+
+def replay(code, entries, speed=1.0):
+    """
+    Programa los eventos de la sesión en la rueda de temporizadores del
+    bucle de eventos y ejecuta la interfaz hasta el final de la sesión.
+    Retorna el informe de la ejecución.
+    """
+    joystick = FakeJoystick()
+    install_fake_joystick(joystick)
+
+    # Contar cuadros presentados por pantalla y lanzamientos del emulador
+    frames = collections.Counter()
+    present_frame = code.present_frame
+    def counting_present_frame(screen_name, dirty):
+        if dirty:
+            frames[screen_name] += 1
+        present_frame(screen_name, dirty)
+    code.present_frame = counting_present_frame
+
+    launches = [0]
+    launch_game = code.launch_game
+    def counting_launch_game(rom_path, joystick):
+        launches[0] += 1
+        launch_game(rom_path, joystick)
+    code.launch_game = counting_launch_game
+
+    def inject(entry):
+        joystick.apply(entry)
+        pygame.event.post(code.session_event(entry))
+
+    def finish():
+        raise ReplayFinished()
+
+    timers = code.EVENT_LOOP.timers
+    for entry in entries:
+        timers.schedule(entry['t'] / speed, lambda entry=entry: inject(entry))
+    timers.schedule((entries[-1]['t'] if entries else 0) / speed + SETTLE, finish)
+
+    game_state = code.GameState()
+    start = time.monotonic()
+    try:
+        while True:
+            game_state.joystick = code.show_connect_controller()
+            code.folder_menu(game_state.joystick, game_state)
+    except ReplayFinished:
+        pass
+    wall = time.monotonic() - start
+
+    return {
+        'wall_s': wall,
+        'events': len(entries),
+        'speed': speed,
+        'frames': dict(frames),
+        'frames_total': sum(frames.values()),
+        'emulator_launches': launches[0],
+        'latency_ms': code.INPUT_LATENCY.summary(),
+        'launch_ms': code.LAUNCH_TIMER.summary(),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Reproducción de sesiones del control sin pantalla")
+    parser.add_argument("--session", help="Sesión grabada (JSON por línea); por omisión, la guionizada")
+    parser.add_argument("--roms", type=int, default=DEFAULT_ROMS, help="ROMs de la biblioteca sintética")
+    parser.add_argument("--query", default=DEFAULT_QUERY, help="Texto de búsqueda de la sesión guionizada")
+    parser.add_argument("--speed", type=float, default=1.0, help="Factor de velocidad de la reproducción")
+    parser.add_argument("--code", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "Code.py"),
+                        help="Archivo del programa a ejecutar")
+    parser.add_argument("--output", help="Guardar el informe JSON en este archivo")
+    parser.add_argument("--max-p95-ms", type=float,
+                        help="Falla si el p95 de latencia de alguna pantalla supera este valor")
+    args = parser.parse_args()
+
+    pygame.init()
+    work_dir = tempfile.mkdtemp(prefix="retroconsole_replay_")
+    # La salida estándar queda solo para el informe JSON: los mensajes de
+    # la interfaz van a la salida de error
+    try:
+        with contextlib.redirect_stdout(sys.stderr):
+            library = generate_library(work_dir, args.roms)
+            code = load_code(args.code, library, work_dir)
+            code.EMULATOR_CMD = make_stand_in_emulator(work_dir)
+            code.EMULATOR_FIRST_FRAME_DEVICES = (library['rom_dir'],)
+            mapping_image = make_mapping_image(work_dir)
+            code.MAPPING_CONTROL_IMAGES = {ext: mapping_image for ext in code.MAPPING_CONTROL_IMAGES}
+            code.LATENCY_REPORT_FILE = os.path.join(work_dir, "latency.json")
+
+            if args.session:
+                entries = code.load_session(args.session)
+            else:
+                entries = scripted_session(code.GameState().keyboard_layout, args.query)
+
+            report = replay(code, entries, args.speed)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+        pygame.quit()
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as report_file:
+            report_file.write(output + "\n")
+    else:
+        print(output)
+
+    if args.max_p95_ms is not None:
+        slow = {screen: stats['p95_ms'] for screen, stats in report['latency_ms'].items()
+                if stats['p95_ms'] is not None and stats['p95_ms'] > args.max_p95_ms}
+        if slow:
+            print(f"Latencia p95 por encima de {args.max_p95_ms} ms: {slow}", file=sys.stderr)
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()